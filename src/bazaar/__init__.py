@@ -36,6 +36,7 @@ Features:
         - add, update, delete
         - get and reload
         - easy object finding with support for SQL queries
+        - composable query expressions compiled to cached SQL queries
         - association data load and reload
 
     - application class relationships:
@@ -46,6 +47,9 @@ Features:
       garbage collector:
         - full - load all rows at once from relation
         - lazy - load one row from relation
+        - LRU - lazy cache bounded by amount of entries or memory budget
+        - invalidation bus synchronizing caches of many processes
+        - snapshots of loaded objects for fast start of processes
 
     - configurable - connection string, DB API module, class relations, object
       and association data cache types, etc.
@@ -368,6 +368,33 @@ class OneToOne(AssociationReferenceProxy):
         return referenced
 
 
+    def getMany(self, objects):
+        """
+        Return list of objects referenced by application objects.
+
+        Referenced objects missing in lazy cache are loaded with one query
+        per batch of keys, so use the method instead of getting referenced
+        object of every application object, i.e.::
+
+            articles = OrderItem.article.getMany(list(order.items))
+
+        @param objects: List of application objects.
+
+        @return: List of referenced objects in order of C{objects}.
+        """
+        keys = [getattr(obj, self.col.col) for obj in objects
+            if obj not in self.ref_buf]
+        values = iter(self.vbroker.getMany(keys))
+
+        referenced = []
+        for obj in objects:
+            if obj in self.ref_buf:
+                referenced.append(self.ref_buf[obj])
+            else:
+                referenced.append(values.next())
+        return referenced
+
+
     def saveForeignKey(self, obj, vkey):
         """
         Save referenced object's primary key value.
@@ -472,6 +499,26 @@ class BiDirOneToOne(OneToOne):
         assert getattr(obj, self.col.col) is None
 
 
+    def relinkKey(self, obj, vkey):
+        """
+        Move application object's primary key value between association
+        data of referenced objects after foreign key value of application
+        object is changed in database.
+
+        Method is used when objects are reloaded in place, only for
+        associations with one-to-many association on the other side.
+
+        @param obj: Application object.
+        @param vkey: Previous foreign key value, C{None} for new object.
+
+        @see: L{bazaar.core.Broker.mergeRows} L{List.moveKey}
+        """
+        cache = self.vbroker.cache
+        old = cache.dicttype.get(cache, vkey)
+        new = cache.dicttype.get(cache, getattr(obj, self.col.col))
+        self.association.moveKey(obj.uuid, old, new)
+
+
 
 class List(AssociationReferenceProxy):
     """
@@ -579,6 +626,111 @@ class List(AssociationReferenceProxy):
 
 
 
+    def delObjects(self, objects):
+        """
+        Remove association data of application objects from memory.
+
+        The method is used when application objects are deleted.
+
+        @param objects: List of application objects.
+        """
+        for obj in objects:
+            if obj in self.cache:
+                del self.cache[obj]
+            for data in (self.ref_buf, self.appended, self.removed):
+                if obj in data:
+                    weakref.WeakKeyDictionary.__delitem__(data, obj)
+
+
+    def delKeys(self, keys):
+        """
+        Remove referenced objects' primary key values from association data
+        of all application objects.
+
+        The method is used when referenced objects are deleted.
+
+        @param keys: Set of referenced objects' primary key values.
+        """
+        for vkeys in self.cache.dicttype.values(self.cache):
+            vkeys -= keys
+
+
+    def moveKey(self, vkey, old, new):
+        """
+        Move referenced object's primary key value from association data of
+        one application object to association data of another one.
+
+        Association data, which are not loaded yet, are not changed.
+
+        @param vkey: Referenced object's primary key value.
+        @param old: Application object or C{None}.
+        @param new: Application object or C{None}.
+
+        @see: L{BiDirOneToOne.relinkKey}
+        """
+        full = isinstance(self.cache, bazaar.cache.Full)
+        if full and self.reload:
+            return
+
+        if old is not None and old in self.cache:
+            self.cache.dicttype.__getitem__(self.cache, old).discard(vkey)
+
+        if new is not None:
+            if new in self.cache:
+                self.cache.dicttype.__getitem__(self.cache, new).add(vkey)
+            elif full:
+                # there are no data of the object in full cache
+                self.cache.dicttype.__setitem__(self.cache, new, set([vkey]))
+
+
+    def getSnapshot(self):
+        """
+        Get snapshot of loaded association data.
+
+        Snapshot is created only for full association data cache and if
+        there are no association data modifications, which are not stored
+        in database.
+
+        @return: List of pairs of application object's primary key value
+            and tuple of referenced objects' primary key values or C{None}.
+
+        @see: L{restoreSnapshot}
+        """
+        if self.reload or not isinstance(self.cache, bazaar.cache.Full) \
+                or len(self.ref_buf) > 0:
+            return None
+
+        for data in (self.appended, self.removed):
+            for values in data.values():
+                if values:
+                    return None
+
+        return [(obj.uuid, tuple(keys))
+            for obj, keys in self.cache.dicttype.items(self.cache)]
+
+
+    def restoreSnapshot(self, data):
+        """
+        Restore association data from snapshot.
+
+        Association data of application objects missing in cache are
+        skipped.
+
+        @param data: Association data snapshot.
+
+        @see: L{getSnapshot}
+        """
+        # do not request reloading of referenced objects, see
+        # OneToMany.reloadData
+        List.reloadData(self)
+        cache = self.broker.cache
+        for okey, vkeys in data:
+            obj = cache.dicttype.get(cache, okey)
+            if obj is not None:
+                self.cache.dicttype.__setitem__(self.cache, obj, set(vkeys))
+        self.reload = False
+
+
     def getAllKeys(self):
         """
         Return tuple of application object's and referenced object's
@@ -640,12 +792,13 @@ class List(AssociationReferenceProxy):
 
         @return: Iterator of all referenced objects.
         """
-        # return all objects with defined primary key value
+        # return all objects with defined primary key value, referenced
+        # objects missing in lazy cache are loaded at once
         def get_objects():
             keys = self.cache[obj]
             if keys:
-                for vkey in keys.copy():
-                    yield self.vbroker.get(vkey)
+                for value in self.vbroker.getMany(list(keys)):
+                    yield value
         
 
         assert None not in get_objects(), \
@@ -662,6 +815,32 @@ class List(AssociationReferenceProxy):
         return objects
 
 
+    def getMany(self, objects):
+        """
+        Return list of all objects referenced by application objects.
+
+        Association data and referenced objects missing in lazy caches are
+        loaded with one query per batch of objects.
+
+        @param objects: List of application objects.
+
+        @return: List of referenced objects.
+        """
+        keys = set()
+        for vkeys in self.cache.getMany(objects):
+            if vkeys:
+                keys.update(vkeys)
+
+        values = [value for value in self.vbroker.getMany(list(keys))
+            if value is not None]
+
+        for obj in objects:
+            if obj in self.ref_buf:
+                values.extend(self.ref_buf[obj])
+
+        return values
+
+
     def delAscData(self, pairs):
         """
         Remove pair of application object's and referenced object's primary
@@ -699,17 +878,93 @@ class List(AssociationReferenceProxy):
         Update in database relational data of association of given
         application object.
 
+        If Bazaar ORM layer defers database modifications, then the update
+        is performed on flush of pending modifications.
+
         @param obj: Application object.
 
         @see: L{bazaar.assoc.OneToMany.updateReferencedObjects}
             L{bazaar.assoc.OneToMany.addReferencedObjects}
             L{bazaar.assoc.OneToMany.delReferencedObjects}
+            L{bazaar.core.UnitOfWork}
+        """
+        if self.col.is_many_to_many:
+            self.record(obj)
+
+        if self.broker.uow is None:
+            self.updateMany([obj])
+        else:
+            self.broker.uow.updateAsc(self, obj)
+
+
+    def record(self, obj):
+        """
+        Record modification of association data of application object with
+        cache invalidation bus.
+
+        Modification of association data of referenced objects is recorded
+        for bi-directional association.
+
+        @param obj: Application object.
+
+        @see: L{bazaar.core.Broker.record}
+        """
+        self.broker.record([obj], 'asc:' + self.col.attr)
+        if self.col.is_bidir:
+            values = set()
+            for data in (self.appended, self.removed):
+                if obj in data:
+                    values.update([value for value in data[obj]
+                        if value.uuid is not None])
+            self.vbroker.record(values, 'asc:' + self.col.vattr)
+
+
+    def refreshData(self, obj):
+        """
+        Reload association data of application object from database.
+
+        Association data are not reloaded if they are not loaded yet or
+        if they are modified and the modifications are not sent to
+        database.
+
+        @param obj: Application object.
+
+        @see: L{bazaar.core.Broker.invalidate}
+        """
+        if self.appended.get(obj) or self.removed.get(obj):
+            return
+
+        full = isinstance(self.cache, bazaar.cache.Full)
+        if full and self.reload:
+            return
+
+        keys = set(self.broker.convertor.getAscData(self, obj))
+        if self.cache.dicttype.__contains__(self.cache, obj):
+            data = self.cache.dicttype.__getitem__(self.cache, obj)
+            data.clear()
+            data.update(keys)
+        elif full:
+            self.cache.dicttype.__setitem__(self.cache, obj, keys)
+
+
+    def updateMany(self, objects):
+        """
+        Update in database relational data of association of given
+        application objects.
+
+        Removed and appended association data of all objects are sent to
+        database with one batch query each.
+
+        @param objects: List of application objects.
+
+        @see: L{update}
         """
         def get_asc_data(obj_set):
-            if obj in obj_set:
-                for value in obj_set[obj]:
-                    yield self.updateableAscData(obj, value)
-                obj_set[obj].clear()
+            for obj in objects:
+                if obj in obj_set:
+                    for value in obj_set[obj]:
+                        yield self.updateableAscData(obj, value)
+                    obj_set[obj].clear()
 
         self.delAscData(get_asc_data(self.removed))
         self.addAscData(get_asc_data(self.appended))
@@ -756,11 +1011,8 @@ class List(AssociationReferenceProxy):
         """
         Return amount of all referenced objects by application object.
         """
-        size = 0
-        keys = self.cache[obj]
-        if keys is not None:
-            # amount of objects with defined primary key value
-            size += len(self.cache[obj])
+        # amount of objects with defined primary key value
+        size = self.cache.count(obj)
         if obj in self.ref_buf:
             # amount of objects with undefined primary key value
             size += len(self.ref_buf[obj])
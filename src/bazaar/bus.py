@@ -0,0 +1,490 @@
+# $Id$
+#
+# Bazaar ORM - an easy to use and powerful abstraction layer between
+# relational database and object oriented application.
+#
+# Copyright (C) 2000-2005 by Artur Wroblewski <wrobell@pld-linux.org>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+"""
+Cache invalidation bus.
+
+Bazaar ORM layers running in different processes share the database, but
+every one of them has its own object and association data caches. The
+invalidation bus sends information about committed database modifications
+between the processes, so modified objects can be refreshed and deleted
+objects can be evicted from caches of other processes, i.e.::
+
+    bus = bazaar.bus.Bus(bazaar.bus.FileTransport('/var/run/app/bazaar.bus'))
+    bzr.setBus(bus)
+
+    art.price = 2.5
+    bzr.update(art)
+    bzr.commit()        # modification is published
+
+    # in other process
+    bzr.sync()          # the article is reloaded in place
+
+Event is a tuple of class name, object's primary key value and operation.
+Operation is one of C{add}, C{update}, C{delete} or C{asc:<attr>} for
+modified association data of C{attr} association. Integer and string
+primary key values are supported, their types are kept in published
+events (see L{encodeKey}).
+
+Bus is configurable with C{bus} parameter, see L{bazaar.config}.
+
+Transport of events is pluggable, see L{Transport} class. This module
+contains L{FileTransport} class, which uses shared, append-only file
+rotated when it grows too big.
+
+@see: L{bazaar.core.Bazaar.sync} L{bazaar.core.Broker.invalidate}
+"""
+
+import fcntl
+import os
+import threading
+import urllib
+import uuid
+
+import bazaar
+
+log = bazaar.Log('bazaar.bus')
+
+
+def encodeKey(key):
+    """
+    Encode object's primary key value for bus message.
+
+    Encoded key starts with type tag, so its type is restored when the
+    message is received. Strings are quoted, so encoded key contains no
+    white space characters.
+
+    @param key: Object's primary key value.
+
+    @return: Encoded key.
+
+    @raise TypeError: If type of key is not supported.
+
+    @see: L{decodeKey}
+    """
+    if isinstance(key, bool):
+        raise TypeError('key %r is not supported' % key)
+    elif isinstance(key, (int, long)):
+        return 'i%d' % key
+    elif isinstance(key, str):
+        return 's' + urllib.quote(key, '')
+    elif isinstance(key, unicode):
+        return 'u' + urllib.quote(key.encode('utf-8'), '')
+    else:
+        raise TypeError('key %r is not supported' % (key, ))
+
+
+def decodeKey(data):
+    """
+    Decode object's primary key value of bus message.
+
+    @param data: Encoded key.
+
+    @return: Object's primary key value.
+
+    @raise ValueError: If encoded key is not valid.
+
+    @see: L{encodeKey}
+    """
+    tag, value = data[:1], data[1:]
+    if tag == 'i':
+        return int(value)
+    elif tag == 's':
+        return urllib.unquote(value)
+    elif tag == 'u':
+        try:
+            return urllib.unquote(value).decode('utf-8')
+        except UnicodeDecodeError:
+            raise ValueError('invalid key: "%s"' % data)
+    else:
+        raise ValueError('invalid key: "%s"' % data)
+
+
+class Transport(object):
+    """
+    Abstract, basic class of invalidation bus transports.
+
+    Transport sends messages to all other transports of the same bus.
+    Message is a string without new line characters.
+    """
+    def send(self, messages):
+        """
+        Send messages.
+
+        @param messages: List of messages.
+        """
+        raise NotImplementedError
+
+
+    def receive(self):
+        """
+        Receive messages sent since last call of the method.
+
+        Method does not block if there are no messages.
+
+        @return: List of messages.
+        """
+        raise NotImplementedError
+
+
+    def close(self):
+        """
+        Release transport resources.
+        """
+        pass
+
+
+
+class FileTransport(Transport):
+    """
+    Invalidation bus transport using shared, append-only file.
+
+    Messages are appended to the file as lines while exclusive lock of
+    the file is held, so lines written by different processes are not
+    mixed. Every transport reads lines appended since its last read.
+    Messages appended before the transport is created are not received.
+
+    When size of the file exceeds C{maxsize} bytes, then the file is
+    rotated, i.e. renamed to C{<path>.old}, and messages are appended to
+    new file. Every file starts with header line containing unique
+    identifier of the file, so transport detects rotation and reads rest
+    of rotated file before reading the new one. Messages are lost only if
+    the file is rotated more than once between two reads.
+
+    If the file is truncated, then it is read from its beginning.
+
+    @ivar path: File path.
+    @ivar maxsize: Maximum size of the file in bytes, the file is not
+        rotated if C{None}.
+    @ivar fd: File descriptor of file opened for appending.
+    @ivar header: Header line of the file read by the transport.
+    @ivar offset: Position of first unread line.
+    @ivar partial: Partially read line.
+    """
+    def __init__(self, path, maxsize = 1048576):
+        """
+        Create transport and open the file, which is created if it does not
+        exist.
+
+        @param path: File path.
+        @param maxsize: Maximum size of the file in bytes.
+        """
+        self.path = path
+        self.maxsize = maxsize
+        self.fd = self.open()
+        self.partial = ''
+
+        self.lock()
+        try:
+            self.offset = os.fstat(self.fd).st_size
+            f = self.openRead(path)
+            try:
+                self.header = self.getHeader(f)
+            finally:
+                f.close()
+        finally:
+            self.unlock()
+
+
+    def open(self):
+        """
+        Open the file for appending, the file is created if it does not
+        exist.
+
+        @return: File descriptor.
+        """
+        return os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+            0666)
+
+
+    def openRead(self, path):
+        """
+        Open file for reading.
+
+        @param path: File path.
+
+        @return: File object or C{None} if the file does not exist.
+        """
+        try:
+            return open(path, 'rb')
+        except IOError:
+            return None
+
+
+    def getHeader(self, f):
+        """
+        Read header line of the file.
+
+        @param f: File object.
+
+        @return: Header line or C{None} if the file has no header.
+        """
+        f.seek(0)
+        line = f.readline(64)
+        if line.startswith('#') and line.endswith('\n'):
+            return line
+        else:
+            return None
+
+
+    def lock(self):
+        """
+        Acquire exclusive lock of the file.
+
+        If the file is rotated by other process, then it is reopened.
+        Header line is written into new, empty file.
+        """
+        while True:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                ino = os.stat(self.path).st_ino
+            except OSError:
+                ino = None
+            if ino == os.fstat(self.fd).st_ino:
+                break
+            # file is rotated, append to new one
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = self.open()
+
+        if os.fstat(self.fd).st_size == 0:
+            self.write('#%s\n' % uuid.uuid4().hex)
+
+
+    def unlock(self):
+        """
+        Release lock of the file.
+        """
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+
+    def write(self, data):
+        """
+        Append data to the file.
+
+        Lock of the file should be acquired before calling the method.
+
+        @param data: Data to append.
+        """
+        # write can be partial, i.e. when interrupted by signal
+        while data:
+            data = data[os.write(self.fd, data):]
+
+
+    def send(self, messages):
+        """
+        Append messages to the file and rotate the file if it is too big.
+
+        @param messages: List of messages.
+        """
+        self.lock()
+        try:
+            self.write(''.join([msg + '\n' for msg in messages]))
+
+            if self.maxsize is not None \
+                    and os.fstat(self.fd).st_size > self.maxsize:
+                os.rename(self.path, self.path + '.old')
+                log.info('bus file %s rotated' % self.path)
+        finally:
+            self.unlock()
+
+
+    def read(self, f):
+        """
+        Read data appended to the file since last read.
+
+        @param f: File object.
+
+        @return: Read data.
+        """
+        if os.fstat(f.fileno()).st_size < self.offset:
+            log.info('bus file %s truncated' % self.path)
+            self.offset = 0
+            self.partial = ''
+        f.seek(self.offset)
+        data = f.read()
+        self.offset += len(data)
+        return data
+
+
+    def receive(self):
+        """
+        Read messages appended to the file since last read.
+
+        If the file is rotated since last read, then rest of rotated file
+        is read first.
+
+        @return: List of messages.
+        """
+        data = ''
+        f = self.openRead(self.path)
+        try:
+            header = None
+            if f is not None:
+                header = self.getHeader(f)
+
+            if self.header is not None and header != self.header:
+                old = self.openRead(self.path + '.old')
+                try:
+                    if old is not None \
+                            and self.getHeader(old) == self.header:
+                        data = self.read(old)
+                    else:
+                        log.warning('bus file %s truncated or rotated more' \
+                            ' than once, messages lost' % self.path)
+                        self.partial = ''
+                finally:
+                    if old is not None:
+                        old.close()
+                self.offset = 0
+
+            self.header = header
+            if f is not None:
+                data += self.read(f)
+        finally:
+            if f is not None:
+                f.close()
+
+        lines = (self.partial + data).split('\n')
+        # last line is empty or it is not written completely yet
+        self.partial = lines.pop()
+        # skip header lines
+        return [line for line in lines if not line.startswith('#')]
+
+
+    def close(self):
+        """
+        Close the file.
+        """
+        os.close(self.fd)
+
+
+
+class Bus(object):
+    """
+    Cache invalidation bus.
+
+    Database modifications are recorded as events, which are published on
+    commit or discarded on rollback. Events published by the bus are not
+    received by the bus.
+
+    Bus is shared by all threads using Bazaar ORM layer. Events are
+    recorded per thread, because every thread commits its own transaction
+    when database connections are pooled (see
+    L{bazaar.motor.PooledMotor}), so commit of one thread publishes only
+    its own events.
+
+    @ivar transport: Transport of events.
+    @ivar id: Identifier of the bus, which marks published events.
+    @ivar local: Thread local data with C{events} list of events recorded
+        since last publishing.
+    """
+    def __init__(self, transport):
+        """
+        Create invalidation bus.
+
+        @param transport: Transport of events.
+        """
+        self.transport = transport
+        self.id = uuid.uuid4().hex
+        self.local = threading.local()
+
+
+    def getEvents(self):
+        """
+        Return list of events recorded by current thread.
+        """
+        try:
+            return self.local.events
+        except AttributeError:
+            self.local.events = []
+            return self.local.events
+
+
+    def record(self, cls, key, op):
+        """
+        Record database modification event.
+
+        @param cls: Application class.
+        @param key: Object's primary key value.
+        @param op: Operation, i.e. C{update}.
+
+        @raise TypeError: If type of key is not supported, see
+            L{encodeKey}.
+        """
+        self.getEvents().append((cls, encodeKey(key), op))
+
+
+    def publish(self):
+        """
+        Send events recorded by current thread.
+        """
+        events = self.getEvents()
+        self.local.events = []
+
+        if events:
+            self.transport.send(['%s %s.%s %s %s' % (self.id, cls.__module__,
+                cls.__name__, key, op) for cls, key, op in events])
+
+            if __debug__:
+                log.debug('bus %s published %d events' \
+                    % (self.id, len(events)))
+
+
+    def discard(self):
+        """
+        Discard events recorded by current thread.
+        """
+        self.local.events = []
+
+
+    def receive(self):
+        """
+        Receive events published by other buses.
+
+        @return: List of events - tuples of class name, object's primary
+            key value and operation.
+        """
+        events = []
+        for msg in self.transport.receive():
+            items = msg.split()
+            if len(items) != 4:
+                log.warning('invalid bus message: "%s"' % msg)
+            elif items[0] != self.id:
+                try:
+                    key = decodeKey(items[2])
+                except ValueError:
+                    log.warning('invalid bus message: "%s"' % msg)
+                else:
+                    events.append((items[1], key, items[3]))
+
+        if __debug__:
+            log.debug('bus %s received %d events' % (self.id, len(events)))
+
+        return events
+
+
+    def close(self):
+        """
+        Close transport of the bus.
+        """
+        self.transport.close()
@@ -24,7 +24,7 @@
 Cache and reference buffer classes.
 
 Cache classes are used to buffer objects and association data loaded from
-database. There are two types of cache:
+database. There are four types of cache:
     - full:
         - objects - all objects of their class are loaded from database at
           once
@@ -34,6 +34,14 @@ database. There are two types of cache:
     - lazy:
         - objects - only one object is loaded from database
         - association data - data are loaded for given application object
+    - LRU (least recently used):
+        - objects - lazy cache keeping strong references to most recently
+          used objects
+        - association data - lazy cache keeping association data of most
+          recently used application objects
+    - expiring:
+        - objects - lazy cache reloading objects, which are older than
+          their time to live
 
 Cache and buffer classes are dictionaries. A dictionary contains pairs of
 primary key value and object identified by the primary key (object cache)
@@ -47,12 +55,47 @@ Every class and association has its own cache, which is configurable, see
 L{bazaar.config} module documentation.
 """
 
+import collections
+import sys
+import time
 import weakref
 
 import bazaar
 
 log = bazaar.Log('bazaar.cache')
 
+try:
+    sizeof = sys.getsizeof
+except AttributeError:
+    # rough estimation for Python versions without sys.getsizeof
+    def sizeof(value):
+        return 32
+
+
+def getSize(value):
+    """
+    Return approximate amount of memory used by application object or
+    association data.
+
+    @param value: Application object or set of primary key values.
+    """
+    if isinstance(value, set):
+        size = sizeof(value)
+        items = value
+    else:
+        state = getattr(value, '__dict__', None)
+        if state is None:
+            size = sizeof(value)
+            items = [getattr(value, name)
+                for name in value.__class__.getMapping().slots]
+        else:
+            size = sizeof(value) + sizeof(state)
+            items = state.values()
+
+    for item in items:
+        size += sizeof(item)
+    return size
+
 
 
 class ReferenceBuffer(weakref.WeakKeyDictionary):
@@ -90,6 +133,60 @@ class ReferenceBuffer(weakref.WeakKeyDictionary):
 
 
 
+class ObjectSet(weakref.WeakKeyDictionary):
+    """
+    Set of application objects, which does not keep the objects alive.
+
+    Only set operations used by brokers are implemented.
+
+    @see: L{bazaar.core.Broker}
+    """
+    def add(self, obj):
+        """
+        Add application object to the set.
+        """
+        self[obj] = None
+
+
+    def discard(self, obj):
+        """
+        Remove application object from the set if it is a member.
+        """
+        self.pop(obj, None)
+
+
+    def difference_update(self, objects):
+        """
+        Remove application objects from the set.
+        """
+        for obj in objects:
+            self.pop(obj, None)
+
+
+
+class KeyRef(weakref.ref):
+    """
+    Weak reference to application object remembering object's primary key
+    value, which is needed by reference callback after the object is
+    garbage collected.
+
+    @ivar key: Object's primary key value.
+
+    @see: L{bazaar.cache.TTLObject}
+    """
+    __slots__ = ('key', )
+
+    def __new__(cls, obj, callback, key):
+        ref = weakref.ref.__new__(cls, obj, callback)
+        ref.key = key
+        return ref
+
+
+    def __init__(self, obj, callback, key):
+        weakref.ref.__init__(self, obj, callback)
+
+
+
 class ListReferenceBuffer(ReferenceBuffer):
     """
     Reference buffer for set of objects.
@@ -171,6 +268,133 @@ class ListReferenceBuffer(ReferenceBuffer):
 
 
 
+class LRU(object):
+    """
+    Bounded dictionary removing least recently used items.
+
+    Items are removed when amount of items exceeds C{size} or total cost
+    of items exceeds C{budget}. There is no limit if C{size} or C{budget}
+    is C{None}.
+
+    @ivar size: Maximum amount of items.
+    @ivar budget: Maximum total cost of items, i.e. amount of memory.
+    @ivar cost: Total cost of items.
+    @ivar links: Dictionary of keys and links of list of items.
+    @ivar root: Root link of circular, doubly linked list of items ordered
+        by usage, the least recently used item is last.
+    """
+    def __init__(self, size = None, budget = None):
+        """
+        Create bounded dictionary.
+
+        @param size: Maximum amount of items.
+        @param budget: Maximum total cost of items.
+        """
+        self.size = size
+        self.budget = budget
+        self.cost = 0
+        self.links = {}
+        self.root = []
+        self.root[:] = [self.root, self.root, None, None, 0]
+
+
+    def get(self, key, default = None):
+        """
+        Get item value and mark the item as most recently used.
+
+        @param key: Item key.
+        @param default: Value returned if there is no item.
+        """
+        link = self.links.get(key)
+        if link is None:
+            return default
+
+        # move the link to the front of the list
+        link[0][1] = link[1]
+        link[1][0] = link[0]
+        first = self.root[1]
+        link[0] = self.root
+        link[1] = first
+        first[0] = link
+        self.root[1] = link
+        return link[3]
+
+
+    def put(self, key, value, cost = 0):
+        """
+        Put item as most recently used one.
+
+        Least recently used items are removed if limits are exceeded.
+
+        @param key: Item key.
+        @param value: Item value.
+        @param cost: Item cost, i.e. amount of memory used by item value.
+
+        @return: List of removed items' keys and values.
+        """
+        self.discard(key)
+
+        first = self.root[1]
+        link = [self.root, first, key, value, cost]
+        first[0] = link
+        self.root[1] = link
+        self.links[key] = link
+        self.cost += cost
+
+        removed = []
+        while len(self.links) > 1 and (
+                self.size is not None and len(self.links) > self.size
+                or self.budget is not None and self.cost > self.budget):
+            last = self.root[0]
+            removed.append((last[2], last[3]))
+            self.discard(last[2])
+        return removed
+
+
+    def __setitem__(self, key, value):
+        """
+        Put item as most recently used one.
+        """
+        self.put(key, value)
+
+
+    def discard(self, key):
+        """
+        Remove item if it exists.
+
+        @param key: Item key.
+        """
+        link = self.links.pop(key, None)
+        if link is not None:
+            link[0][1] = link[1]
+            link[1][0] = link[0]
+            self.cost -= link[4]
+
+
+    def __contains__(self, key):
+        """
+        Check if there is an item without marking it as used.
+        """
+        return key in self.links
+
+
+    def __len__(self):
+        """
+        Return amount of items.
+        """
+        return len(self.links)
+
+
+    def clear(self):
+        """
+        Remove all items.
+        """
+        self.links.clear()
+        self.root[:] = [self.root, self.root, None, None, 0]
+        self.cost = 0
+
+
+
 class Cache(object):
     """
     Abstract, basic class for different data caches.
@@ -202,6 +426,31 @@ class Cache(object):
         raise NotImplementedError
 
 
+    def count(self, obj):
+        """
+        Return amount of referenced objects' primary key values of
+        application object.
+
+        @param obj: Application object.
+        """
+        data = self[obj]
+        if data is None:
+            return 0
+        return len(data)
+
+
+    def getMany(self, keys):
+        """
+        Return list of referenced objects.
+
+        @param keys: List of referenced objects' primary key values.
+
+        @return: List of referenced objects in order of C{keys}, C{None}
+            is put in place of an object, which is not found.
+        """
+        return [self[key] for key in keys]
+
+
 
 class Full(Cache, dict):
     """
@@ -248,6 +497,23 @@ class FullObject(Full):
         self.owner.loadObjects()
 
 
+    def merge(self, obj):
+        """
+        Merge object loaded from database into cache.
+
+        If object with the same primary key value exists in cache, then the
+        cached instance is returned.
+
+        @param obj: Application object.
+
+        @return: Cached application object.
+        """
+        cached = self[obj.uuid]
+        if cached is None:
+            self[obj.uuid] = cached = obj
+        return cached
+
+
 
 class FullAssociation(Full):
     """
@@ -287,6 +553,48 @@ class Lazy(Cache):
         return data
 
 
+    def loadMany(self, params):
+        """
+        Load referenced objects or association data from database at once.
+
+        @param params: List of referenced objects' primary key values or
+            list of application objects.
+
+        @return: Dictionary of loaded data.
+        """
+        raise NotImplementedError
+
+
+    def getMany(self, params):
+        """
+        Return list of referenced objects or association data.
+
+        Data missing in cache are loaded from database at once.
+
+        @param params: List of referenced objects' primary key values or
+            list of application objects.
+
+        @return: List of referenced objects or association data in order
+            of C{params}, C{None} is put in place of data, which are not
+            found.
+
+        @see: L{loadMany}
+        """
+        # keep strong references to data until returned
+        found = {}
+        missing = []
+        for param in params:
+            if param not in found:
+                found[param] = data = self.dicttype.get(self, param)
+                if data is None and param is not None:
+                    missing.append(param)
+
+        if missing:
+            found.update(self.loadMany(missing))
+
+        return [found[param] for param in params]
+
+
 
 class LazyObject(Lazy, weakref.WeakValueDictionary):
     """
@@ -313,6 +621,24 @@ class LazyObject(Lazy, weakref.WeakValueDictionary):
         return obj
 
 
+    def loadMany(self, keys):
+        """
+        Load referenced objects with primary key values C{keys} with one
+        query per batch of keys.
+
+        @param keys: List of primary key values.
+
+        @return: Dictionary of loaded objects.
+
+        @see: L{bazaar.motor.Convertor.getMany}
+        """
+        assert self.owner is not None
+        loaded = {}
+        for obj in self.owner.convertor.getMany(keys):
+            self[obj.uuid] = loaded[obj.uuid] = obj
+        return loaded
+
+
     def itervalues(self):
         """
         Return all application class objects from database.
@@ -322,13 +648,25 @@ class LazyObject(Lazy, weakref.WeakValueDictionary):
         instead of object from database.
         """
         for obj in self.owner.convertor.getObjects():
-            if obj.uuid in self:
-                obj = self[obj.uuid] # get existing instance
-            else:
-                # there is no object instance, so add it to cache
-                self[obj.uuid] = obj
+            yield self.merge(obj)
 
-            yield obj
+
+    def merge(self, obj):
+        """
+        Merge object loaded from database into cache.
+
+        If object with the same primary key value exists in cache, then the
+        cached instance is returned.
+
+        @param obj: Application object.
+
+        @return: Cached application object.
+        """
+        cached = self.dicttype.get(self, obj.uuid)
+        if cached is None:
+            # there is no object instance, so add it to cache
+            self[obj.uuid] = cached = obj
+        return cached
 
 
 
@@ -362,3 +700,497 @@ class LazyAssociation(Lazy, weakref.WeakKeyDictionary):
             data.add(vkey)
         self[obj] = data
         return data
+
+
+    def count(self, obj):
+        """
+        Return amount of referenced objects' primary key values of
+        application object.
+
+        If association data are not loaded yet, then they are counted in
+        database without loading.
+
+        @param obj: Application object.
+
+        @see: L{bazaar.motor.Convertor.countAscData}
+        """
+        if obj in self:
+            return len(self.dicttype.__getitem__(self, obj))
+        else:
+            return self.owner.broker.convertor.countAscData(self.owner, obj)
+
+
+    def loadMany(self, objects):
+        """
+        Load association data from database for application objects with
+        one query per batch of objects.
+
+        @param objects: List of application objects.
+
+        @return: Dictionary of loaded association data.
+
+        @see: L{bazaar.motor.Convertor.getManyAscData}
+        """
+        assert self.owner is not None
+        data = {}
+        for obj in objects:
+            if obj.uuid is not None:
+                data[obj.uuid] = set()
+
+        convertor = self.owner.broker.convertor
+        for key, vkey in convertor.getManyAscData(self.owner, data.keys()):
+            data[key].add(vkey)
+
+        loaded = {}
+        for obj in objects:
+            self[obj] = loaded[obj] = data.get(obj.uuid) or set()
+        return loaded
+
+
+
+class LRUObject(LazyObject):
+    """
+    Lazy cache keeping strong references to most recently used objects.
+
+    Objects are loaded lazily like with L{LazyObject} cache. Strong
+    references are kept to C{size} most recently used objects or to most
+    recently used objects, which occupy about C{budget} bytes of memory.
+    Other objects stay in cache as long as they are referenced by
+    application.
+
+    Limits are configured with C{cachesize} and C{cachebudget} attributes
+    of application class (see L{bazaar.config}). Class defaults are used
+    if none of them is set.
+
+    @ivar size: Default maximum amount of strongly referenced objects.
+    @ivar budget: Default memory budget of strongly referenced objects.
+    @ivar lru: Strongly referenced objects.
+    @ivar hits: Amount of objects found in cache.
+    @ivar misses: Amount of objects loaded from database.
+    """
+    size = 1000
+    budget = None
+
+    def __init__(self, owner):
+        """
+        Create LRU object cache.
+
+        @param owner: Owner of the cache - object broker.
+        """
+        LazyObject.__init__(self, owner)
+        size = getattr(owner.cls, 'cachesize', None)
+        budget = getattr(owner.cls, 'cachebudget', None)
+        if size is None and budget is None:
+            size, budget = self.size, self.budget
+        self.lru = LRU(size, budget)
+        self.hits = 0
+        self.misses = 0
+
+
+    def hold(self, key, obj):
+        """
+        Keep strong reference to most recently used object.
+
+        @param key: Object's primary key value.
+        @param obj: Application object.
+        """
+        if self.lru.get(key) is None:
+            self.keep(key, obj)
+
+
+    def keep(self, key, obj):
+        """
+        Put object into strongly referenced objects.
+
+        @param key: Object's primary key value.
+        @param obj: Application object.
+        """
+        if self.lru.budget is None:
+            self.lru.put(key, obj)
+        else:
+            self.lru.put(key, obj, getSize(obj))
+
+
+    def __getitem__(self, key):
+        """
+        Return referenced object, load it from database if necessary.
+
+        @param key: Referenced object's primary key value.
+        """
+        obj = self.dicttype.get(self, key)
+        if obj is None:
+            self.misses += 1
+            obj = self.load(key)
+        else:
+            self.hits += 1
+            self.hold(key, obj)
+        return obj
+
+
+    def __setitem__(self, key, obj):
+        self.dicttype.__setitem__(self, key, obj)
+        self.keep(key, obj)
+
+
+    def __delitem__(self, key):
+        self.dicttype.__delitem__(self, key)
+        self.lru.discard(key)
+
+
+    def update(self, items):
+        for key, obj in items:
+            self[key] = obj
+
+
+    def load(self, key):
+        """
+        Load referenced object with primary key value C{key}.
+        """
+        assert self.owner is not None
+        obj = self.owner.convertor.get(key)
+        if obj is not None:
+            self[key] = obj
+        return obj
+
+
+    def loadMany(self, keys):
+        self.misses += len(keys)
+        return LazyObject.loadMany(self, keys)
+
+
+    def getMany(self, keys):
+        misses = self.misses
+        objects = LazyObject.getMany(self, keys)
+        self.hits += len([key for key in keys if key is not None]) \
+            - (self.misses - misses)
+        for obj in objects:
+            if obj is not None:
+                self.hold(obj.uuid, obj)
+        return objects
+
+
+    def merge(self, obj):
+        cached = LazyObject.merge(self, obj)
+        self.hold(cached.uuid, cached)
+        return cached
+
+
+    def clear(self):
+        """
+        Remove all objects from cache.
+        """
+        self.dicttype.clear(self)
+        self.lru.clear()
+
+
+
+class LRUAssociation(LazyAssociation):
+    """
+    Lazy cache keeping association data of most recently used application
+    objects.
+
+    Association data are loaded lazily like with L{LazyAssociation}
+    cache. Data of C{size} most recently used application objects or data
+    occupying about C{budget} bytes of memory are kept in cache, data of
+    other objects are removed from cache and loaded again when needed.
+    Data with pending modifications (see L{bazaar.assoc.List.update}) are
+    never removed.
+
+    Limits are configured with C{cachesize} and C{cachebudget} attributes
+    of association column (see L{bazaar.config}). Class defaults are used
+    if none of them is set.
+
+    @ivar size: Default maximum amount of cached association data.
+    @ivar budget: Default memory budget of cached association data.
+    @ivar lru: Recently used association data, keys are weak references to
+        application objects.
+    @ivar hits: Amount of association data found in cache.
+    @ivar misses: Amount of association data loaded from database.
+    """
+    size = 1000
+    budget = None
+
+    def __init__(self, owner):
+        """
+        Create LRU association data cache.
+
+        @param owner: Owner of the cache - association object.
+        """
+        LazyAssociation.__init__(self, owner)
+        size = getattr(owner.col, 'cachesize', None)
+        budget = getattr(owner.col, 'cachebudget', None)
+        if size is None and budget is None:
+            size, budget = self.size, self.budget
+        self.lru = LRU(size, budget)
+        self.hits = 0
+        self.misses = 0
+
+
+    def hold(self, obj, data):
+        """
+        Mark association data of application object as most recently used.
+
+        @param obj: Application object.
+        @param data: Association data.
+        """
+        if self.lru.get(weakref.ref(obj)) is None:
+            self.keep(obj, data)
+
+
+    def keep(self, obj, data):
+        """
+        Put association data into recently used data and remove least
+        recently used ones from cache.
+
+        @param obj: Application object.
+        @param data: Association data.
+        """
+        if self.lru.budget is None:
+            cost = 0
+        else:
+            cost = getSize(data)
+
+        for ref, old_data in self.lru.put(weakref.ref(obj), data, cost):
+            old_obj = ref()
+            if old_obj is None \
+                    or not self.dicttype.__contains__(self, old_obj):
+                continue
+            # keep data with pending modifications
+            if self.owner.appended.get(old_obj) \
+                    or self.owner.removed.get(old_obj):
+                continue
+            self.dicttype.__delitem__(self, old_obj)
+
+
+    def __getitem__(self, obj):
+        """
+        Return association data, load them from database if necessary.
+
+        @param obj: Application object.
+        """
+        data = self.dicttype.get(self, obj)
+        if data is None:
+            self.misses += 1
+            data = self.load(obj)
+        else:
+            self.hits += 1
+            self.hold(obj, data)
+        return data
+
+
+    def __setitem__(self, obj, data):
+        self.dicttype.__setitem__(self, obj, data)
+        self.keep(obj, data)
+
+
+    def __delitem__(self, obj):
+        self.dicttype.__delitem__(self, obj)
+        self.lru.discard(weakref.ref(obj))
+
+
+    def loadMany(self, objects):
+        self.misses += len(objects)
+        return LazyAssociation.loadMany(self, objects)
+
+
+    def getMany(self, objects):
+        misses = self.misses
+        values = LazyAssociation.getMany(self, objects)
+        self.hits += len([obj for obj in objects if obj is not None]) \
+            - (self.misses - misses)
+        for obj, data in zip(objects, values):
+            if obj is not None and data is not None:
+                self.hold(obj, data)
+        return values
+
+
+    def clear(self):
+        """
+        Remove all association data from cache.
+        """
+        self.dicttype.clear(self)
+        self.lru.clear()
+
+
+
+class TTLObject(LazyObject):
+    """
+    Lazy cache reloading objects, which are older than their time to live.
+
+    Objects are loaded lazily like with L{LazyObject} cache. When a stale
+    object is accessed, then it is reloaded from database in place
+    together with other stale objects, up to batch size of database
+    access object, with one query (see L{bazaar.core.Broker.refresh}).
+    The cache does not reload stale objects in background by itself, but
+    application can call L{refresh} method periodically, i.e. from its
+    own maintenance thread.
+
+    Time to live is configured with C{ttl} attribute of application class
+    (see L{bazaar.config}). Class default is used if it is not set.
+
+    @ivar ttl: Default time to live of objects in seconds.
+    @ivar stamps: Dictionary of primary key values and times of objects'
+        loading.
+    @ivar refs: Dictionary of primary key values and weak references to
+        stamped objects (see L{KeyRef}).
+    @ivar queue: Queue of pairs of loading time and primary key value
+        ordered by loading time, so stale objects are found without
+        scanning all objects. Pairs with loading time different from the
+        one in C{stamps} are outdated and skipped.
+
+    Loading times of garbage collected objects are removed from C{stamps}
+    by callbacks of weak references in C{refs} and outdated pairs are
+    removed from the queue when objects are stamped, so memory used by
+    the cache is bounded by amount of cached objects.
+    """
+    ttl = 300
+
+    def __init__(self, owner):
+        """
+        Create expiring object cache.
+
+        @param owner: Owner of the cache - object broker.
+        """
+        LazyObject.__init__(self, owner)
+        if getattr(owner.cls, 'ttl', None) is not None:
+            self.ttl = owner.cls.ttl
+        self.stamps = {}
+        self.refs = {}
+        self.queue = collections.deque()
+
+        # forget loading time of garbage collected object; the callback
+        # does not keep the cache alive
+        selfref = weakref.ref(self)
+        def forget(ref):
+            cache = selfref()
+            if cache is not None and cache.refs.get(ref.key) is ref:
+                del cache.refs[ref.key]
+                cache.stamps.pop(ref.key, None)
+        self.forget = forget
+
+
+    def __getitem__(self, key):
+        """
+        Return referenced object, load or reload it from database if
+        necessary.
+
+        @param key: Referenced object's primary key value.
+        """
+        obj = self.dicttype.get(self, key)
+        if obj is None:
+            obj = self.load(key)
+        elif self.stamps.get(key, 0) < time.time() - self.ttl:
+            self.refresh([key])
+            obj = self.dicttype.get(self, key)
+        return obj
+
+
+    def __setitem__(self, key, obj):
+        self.dicttype.__setitem__(self, key, obj)
+        ref = self.refs.get(key)
+        if ref is None or ref() is not obj:
+            self.refs[key] = KeyRef(obj, self.forget, key)
+        self.stamp(key, time.time())
+
+
+    def __delitem__(self, key):
+        self.dicttype.__delitem__(self, key)
+        self.stamps.pop(key, None)
+        self.refs.pop(key, None)
+
+
+    def update(self, items):
+        for key, obj in items:
+            self[key] = obj
+
+
+    def stamp(self, key, now):
+        """
+        Set loading time of object.
+
+        Outdated pairs are removed from head of the queue. The queue is
+        compacted if most of its pairs are outdated.
+
+        @param key: Object's primary key value.
+        @param now: Loading time.
+        """
+        stamps = self.stamps
+        queue = self.queue
+        stamps[key] = now
+        queue.append((now, key))
+
+        while stamps.get(queue[0][1]) != queue[0][0]:
+            queue.popleft()
+
+        if len(queue) > 2 * len(stamps):
+            self.queue = collections.deque([(stamp, k) for stamp, k in queue
+                if stamps.get(k) == stamp])
+
+
+    def getMany(self, keys):
+        deadline = time.time() - self.ttl
+        stale = [key for key in keys
+            if self.stamps.get(key, deadline) < deadline]
+        if stale:
+            self.refresh(stale)
+        return LazyObject.getMany(self, keys)
+
+
+    def refresh(self, keys = ()):
+        """
+        Reload stale objects from database.
+
+        Objects with primary key values C{keys} are reloaded with other
+        stale objects up to batch size of database access object.
+        Objects, which do not exist in database, are removed from cache.
+        Objects, which are not reloaded because they are modified, get new
+        loading time, so they are not checked on every access.
+
+        @param keys: Primary key values of objects to reload.
+
+        @return: List of reloaded objects.
+        """
+        assert self.owner is not None
+        now = time.time()
+        deadline = now - self.ttl
+        batchsize = self.owner.convertor.motor.batchsize
+
+        keys = list(keys)
+        selected = set(keys)
+        queue = self.queue
+        while queue and len(keys) < batchsize and queue[0][0] < deadline:
+            stamp, key = queue.popleft()
+            if self.stamps.get(key) == stamp and key not in selected:
+                keys.append(key)
+                selected.add(key)
+
+        objects = []
+        for key in keys:
+            obj = self.dicttype.get(self, key)
+            if obj is None:
+                # object was garbage collected
+                self.stamps.pop(key, None)
+                self.refs.pop(key, None)
+            else:
+                objects.append(obj)
+
+        if __debug__:
+            log.debug('class %s stale objects: %d' \
+                % (self.owner.cls, len(objects)))
+
+        refreshed = self.owner.refresh(objects)
+        for obj in objects:
+            # evicted objects have no primary key value
+            if obj.uuid is not None:
+                self.stamp(obj.uuid, now)
+        return refreshed
+
+
+    def clear(self):
+        """
+        Remove all objects from cache.
+        """
+        self.dicttype.clear(self)
+        self.stamps.clear()
+        self.refs.clear()
+        self.queue.clear()
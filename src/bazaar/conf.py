@@ -213,6 +213,31 @@ its bi-directionality::
     ...     vcol = 'order_fkey', vattr = 'order')
     >>> OrderItem.addColumn('order', 'order_fkey', Order, vattr = 'items')
 
+Compact objects
+===============
+Application objects store their attributes in dictionaries. Objects of
+classes with C{slots} attribute set to true store them in slots, which
+saves a lot of memory when many objects are cached. Slots are created
+from columns declared in class definition, including foreign key columns
+of one-to-one associations::
+
+    >>> article = bazaar.conf.Column('article', 'article_fkey')
+    >>> article.vcls = Article
+
+    >>> class OrderItem(bazaar.core.PersistentObject):
+    ...     __metaclass__ = bazaar.conf.Persistence
+    ...     relation      = 'order_item'
+    ...     slots         = True
+    ...     columns       = {
+    ...         'pos'      : bazaar.conf.Column('pos'),
+    ...         'quantity' : bazaar.conf.Column('quantity'),
+    ...         'article'  : article,
+    ...     }
+
+Compact objects cannot have attributes other than declared columns and
+columns cannot be added to compact class with
+L{bazaar.conf.Persistence.addColumn} method unless they have slots.
+
 Inheritance
 ===========
 There are two classes defined above. C{Boss} class is very similar to
@@ -261,6 +286,14 @@ class Column:
     @ivar vattr: Attribute name of referenced object(s). 
 
     @ivar association: Association descriptor of given column.
+    @ivar arraysize: Amount of association data rows fetched from database
+        at once, database access object default if C{None}.
+    @ivar stream: If true, then association data are loaded from database
+        with server-side cursor or page by page.
+    @ivar cachesize: Maximum amount of entries of bounded association
+        cache, cache class default if C{None}.
+    @ivar cachebudget: Memory budget in bytes of bounded association
+        cache, cache class default if C{None}.
 
     @ivar update: Used with 1-n associations. If true, then update
         referenced objects on relationship update, otherwise add appended
@@ -294,6 +327,10 @@ class Column:
         self.vcol = None
         self.vattr = None
         self.association = None
+        self.arraysize = None
+        self.stream = False
+        self.cachesize = None
+        self.cachebudget = None
         self.update = True
 
         self.default = None
@@ -325,6 +362,249 @@ class Column:
 
 
 
+def createLoader(cls, cols):
+    """
+    Create function, which creates application object from relation row.
+
+    Function source code is generated for given application class, i.e.
+    for C{Article} class::
+
+        def load(data):
+            obj = new(cls)
+            state = obj.__dict__
+            state.update(defaults)
+            state['uuid'], state['name'], state['price'], = data
+            return obj
+
+    Object constructor is not called and relation row is assigned to
+    object's attributes with one statement. Modifications of the object
+    are not tracked.
+
+    Attributes of compact objects (see L{Persistence}) are set with slot
+    descriptors, i.e.::
+
+        def load(data):
+            obj = new(cls)
+            d0, d1, d2, = data
+            s0(obj, d0)
+            s1(obj, d1)
+            s2(obj, d2)
+            s3(obj, None)
+            return obj
+
+    @param cls: Application class.
+    @param cols: Names of loaded relation columns.
+
+    @return: Loader function.
+    """
+    env = {'new': object.__new__, 'cls': cls, 'defaults': cls.defaults}
+    if cls.slots:
+        names = list(cols) + [name for name in getSlots(cls)
+            if name not in cols]
+        code = ['    %s, = data' \
+            % ', '.join(['d%d' % i for i in range(len(cols))])]
+        for i, name in enumerate(names):
+            env['s%d' % i] = getattr(cls, name).__set__
+            if i < len(cols):
+                code.append('    s%d(obj, d%d)' % (i, i))
+            else:
+                env['v%d' % i] = cls.defaults.get(name)
+                code.append('    s%d(obj, v%d)' % (i, i))
+        code = '\n'.join(code)
+    else:
+        code = '    state = obj.__dict__\n' \
+            '    state.update(defaults)\n' \
+            '    %s, = data' % ', '.join(['state[%r]' % col for col in cols])
+
+    source = 'def load(data):\n' \
+        '    obj = new(cls)\n' \
+        '%s\n' \
+        '    return obj\n' % code
+
+    if __debug__:
+        log.debug('class "%s" loader:\n%s' % (cls.__name__, source))
+
+    exec source in env
+    return env['load']
+
+
+def createUpdater(cls, cols):
+    """
+    Create function, which updates existing application object with
+    relation row.
+
+    Function source code is generated for given application class, i.e.
+    for C{Article} class::
+
+        def update(obj, data):
+            state = obj.__dict__
+            state['uuid'], state['name'], state['price'], = data
+
+    Attributes of compact objects are set with slot descriptors like in
+    loader function (see L{createLoader}).
+
+    @param cls: Application class.
+    @param cols: Names of loaded relation columns.
+
+    @return: Updater function.
+    """
+    env = {}
+    if cls.slots:
+        code = ['    %s, = data' \
+            % ', '.join(['d%d' % i for i in range(len(cols))])]
+        for i, name in enumerate(cols):
+            env['s%d' % i] = getattr(cls, name).__set__
+            code.append('    s%d(obj, d%d)' % (i, i))
+        code = '\n'.join(code)
+    else:
+        code = '    state = obj.__dict__\n' \
+            '    %s, = data' % ', '.join(['state[%r]' % col for col in cols])
+
+    source = 'def update(obj, data):\n%s\n' % code
+
+    if __debug__:
+        log.debug('class "%s" updater:\n%s' % (cls.__name__, source))
+
+    exec source in env
+    return env['update']
+
+
+def getSlots(cls):
+    """
+    Return names of attributes stored in slots of compact application
+    object.
+
+    Slots of base classes are included, C{__weakref__} slot is omitted.
+
+    @param cls: Application class.
+    """
+    names = []
+    for klass in reversed(cls.__mro__):
+        for name in klass.__dict__.get('__slots__', ()):
+            if name != '__weakref__' and name not in names:
+                names.append(name)
+    return names
+
+
+def createSlots(columns, bases):
+    """
+    Create C{__slots__} layout of compact application class.
+
+    Slots are created for primary key value, set of modified attributes
+    and attributes of simple columns and foreign keys of one-to-one
+    associations. Slots existing in base classes are skipped.
+
+    @param columns: Dictionary of columns declared in the class.
+    @param bases: Base classes of application class.
+
+    @return: Tuple of slot names.
+    """
+    inherited = set()
+    for base in bases:
+        inherited.update(getSlots(base))
+
+    names = ['uuid', '__dirty__']
+    for col in columns.values():
+        if col.vcls is None:
+            names.extend((col.attr, col.col))
+        elif col.is_one_to_one:
+            names.append(col.col)
+
+    slots = []
+    for name in names:
+        if name not in inherited and name not in slots:
+            slots.append(name)
+
+    # weak references to application objects are used by caches
+    if not [base for base in bases if base.__weakrefoffset__]:
+        slots.append('__weakref__')
+
+    return tuple(slots)
+
+
+
+class Mapping(object):
+    """
+    Precomputed mapping of application class to database relation.
+
+    Mapping is created once per application class and it is read only. It
+    is recreated when column is added to the class or to one of its base
+    classes.
+
+    @ivar cls: Application class.
+    @ivar columns: Dictionary of all defined columns including inherited.
+    @ivar simple: Columns, which do not describe associations.
+    @ivar one_to_one: One-to-one association columns.
+    @ivar one_to_many: One-to-many association columns.
+    @ivar many_to_many: Many-to-many association columns.
+    @ivar many: One-to-many and many-to-many association columns.
+    @ivar bidir: Bi-directional association columns.
+    @ivar data: Columns stored in class relation - simple columns and
+        one-to-one association columns.
+    @ivar load_cols: Names of relation columns loaded from database,
+        primary key column is first.
+    @ivar save_cols: Names of relation columns saved in database.
+    @ivar index: Dictionary of loaded relation column names and their
+        positions in C{load_cols}.
+    @ivar load: Function creating application object from relation row,
+        see L{createLoader}.
+    @ivar update: Function updating existing application object with
+        relation row, see L{createUpdater}.
+    @ivar slots: Names of attributes stored in slots of compact objects,
+        C{None} if class is not compact.
+
+    @see: L{bazaar.conf.Persistence.getMapping}
+    """
+    def __init__(self, cls):
+        """
+        Create mapping of application class.
+
+        @param cls: Application class.
+        """
+        columns = {}
+        for base in cls.__bases__:
+            if isinstance(base, Persistence):
+                columns.update(base.getMapping().columns)
+        columns.update(cls.columns)
+        values = columns.values()
+
+        d = self.__dict__
+        d['cls'] = cls
+        d['columns'] = columns
+        d['simple'] = tuple([col for col in values if col.vcls is None])
+        d['one_to_one'] = tuple([col for col in values if col.is_one_to_one])
+        d['one_to_many'] = \
+            tuple([col for col in values if col.is_one_to_many])
+        d['many_to_many'] = \
+            tuple([col for col in values if col.is_many_to_many])
+        d['many'] = tuple([col for col in values if col.is_many])
+        d['bidir'] = tuple([col for col in values if col.is_bidir])
+        d['data'] = self.simple + self.one_to_one
+        d['load_cols'] = ('uuid', ) \
+            + tuple([col.col for col in self.data if col.readable])
+        d['save_cols'] = tuple([col.col for col in self.data if col.writable])
+        d['index'] = dict([(col, i) for i, col in enumerate(self.load_cols)])
+        d['load'] = createLoader(cls, self.load_cols)
+        d['update'] = createUpdater(cls, self.load_cols)
+        if cls.slots:
+            d['slots'] = tuple([name for name in getSlots(cls)
+                if name != '__dirty__'])
+        else:
+            d['slots'] = None
+
+        if __debug__:
+            log.debug('class "%s" mapping created, loaded columns: %s' \
+                % (cls.__name__, self.load_cols))
+
+
+    def __setattr__(self, name, value):
+        """
+        Mapping is read only.
+        """
+        raise AttributeError('mapping of class %s is read only' % self.cls)
+
+
+
 class Persistence(type):
     """
     Application class metaclass.
@@ -337,11 +617,29 @@ class Persistence(type):
     @ivar sequencer: Name of primary key values generator sequencer.
     @ivar columns: List of application class attribute descriptions.
     @ivar cache: Object cache class.
+    @ivar cachesize: Maximum amount of objects of bounded object cache,
+        cache class default if C{None}.
+    @ivar cachebudget: Memory budget in bytes of bounded object cache,
+        cache class default if C{None}.
+    @ivar marker: Name of relation column marking changes of rows, i.e.
+        modification time, C{None} if there is no such column.
+    @ivar ttl: Time to live in seconds of objects in expiring object
+        cache, cache class default if C{None}.
+    @ivar arraysize: Amount of rows fetched from database at once, database
+        access object default if C{None}.
+    @ivar stream: If true, then objects are loaded from database with
+        server-side cursor or page by page.
+    @ivar tracked: If true, then modifications of objects are tracked,
+        see L{setTracked}.
     @ivar defaults: Default values for class attributes.
+    @ivar mapping: Precomputed mapping of the class, C{None} if it is not
+        created yet.
+    @ivar slots: If true, then objects of the class are compact - their
+        attributes are stored in slots instead of dictionary.
     """
 
     def __new__(self, name, relation, data, sequencer = None,
-            bases = (bazaar.core.PersistentObject, )):
+            bases = (bazaar.core.PersistentObject, ), slots = None):
         """
         Create application class.
 
@@ -350,6 +648,7 @@ class Persistence(type):
         @param data: Application class module globals.
         @param sequencer: Name of primary key values generator sequencer.
         @param bases: Application class base classes.
+        @param slots: If true, then objects of the class are compact.
         """
         # check method parameters to detect if it was called via class
         # declaration
@@ -385,14 +684,52 @@ class Persistence(type):
         if 'cache' not in data:
             data['cache'] = bazaar.cache.FullObject
 
+        if 'cachesize' not in data:
+            data['cachesize'] = None
+
+        if 'cachebudget' not in data:
+            data['cachebudget'] = None
+
+        if 'ttl' not in data:
+            data['ttl'] = None
+
+        if 'marker' not in data:
+            data['marker'] = None
+
+        if 'arraysize' not in data:
+            data['arraysize'] = None
+
+        if 'stream' not in data:
+            data['stream'] = False
+
+        # subclasses of classes without tracking are not tracked
+        if 'tracked' not in data:
+            data['tracked'] = not [cls for cls in bases
+                if not getattr(cls, 'tracked', True)]
+
         if 'defaults' not in data:
             data['defaults'] = {}
 
+        if slots is not None:
+            data['slots'] = slots
+
+        # subclasses of compact classes are compact
+        if 'slots' not in data:
+            data['slots'] = bool([cls for cls in bases
+                if getattr(cls, 'slots', False)])
+
+        if data['slots']:
+            data['__slots__'] = createSlots(data['columns'], bases)
+
+        # every class has its own mapping
+        data['mapping'] = None
+
         for cls in bases:
             if hasattr(cls, 'defaults'):
                 data['defaults'].update(cls.defaults)
 
         cls = type.__new__(self, name, bases, data)
+        cls.setTracked(cls.tracked)
 
         if __debug__:
             log.debug('new class "%s" for relation "%s"' \
@@ -403,7 +740,9 @@ class Persistence(type):
         if not cls.relation:
             raise bazaar.exc.RelationMappingError('wrong relation name', cls)
 
-        setattr(cls, 'uuid', None)
+        # compact objects store primary key value in a slot
+        if not cls.slots:
+            setattr(cls, 'uuid', None)
 
         return cls
 
@@ -461,25 +800,81 @@ class Persistence(type):
         if attr in self.columns:
             raise bazaar.exc.ColumnMappingError('column is defined', self, col)
 
+        if self.slots:
+            if col.vcls is None:
+                names = set((col.attr, col.col))
+            elif col.is_one_to_one:
+                names = set((col.col, ))
+            else:
+                names = set()
+            if not names.issubset(getSlots(self)):
+                raise bazaar.exc.ColumnMappingError(
+                    'no slot for column of compact class', self, col)
+
         self.columns[col.attr] = col
+        self.resetMapping()
 
         if __debug__:
             log.debug('column "%s" is added to class "%s"' \
                 % (attr, self.__name__))
 
 
+    def setTracked(self, tracked):
+        """
+        Enable or disable tracking of modifications of objects of the
+        class.
+
+        Tracking C{__setattr__} method (see
+        L{bazaar.core.setTrackedAttr}) is installed only if modifications
+        are tracked, so attribute assignment of objects of class without
+        tracking is as fast as of plain Python objects. Objects of such
+        class are not updated by L{bazaar.core.Bazaar.flushDirty} and all
+        writable columns are updated by L{bazaar.core.Bazaar.update}.
+
+        @param tracked: If true, then modifications are tracked.
+        """
+        self.tracked = tracked
+        if tracked:
+            self.__setattr__ = bazaar.core.setTrackedAttr
+        else:
+            self.__setattr__ = object.__setattr__
+
+
     def getColumns(self):
         """
-        Return list of all defined columns including inherited.
+        Return dictionary of all defined columns including inherited.
+
+        The dictionary is copy of the one of class mapping, so it can be
+        modified by caller.
+
+        @see: L{getMapping}
         """
-        cols = {}
+        return dict(self.getMapping().columns)
 
-        for cls in self.__bases__:
-            if isinstance(cls, Persistence):
-                cols.update(cls.getColumns())
-        cols.update(self.columns)
 
-        return cols
+    def getMapping(self):
+        """
+        Return precomputed mapping of the class.
+
+        Mapping is created on first call.
+
+        @see: L{bazaar.conf.Mapping}
+        """
+        if self.mapping is None:
+            self.mapping = Mapping(self)
+        return self.mapping
+
+
+    def resetMapping(self):
+        """
+        Forget mapping of the class and mappings of its subclasses.
+
+        Mappings are recreated on next request.
+        """
+        self.mapping = None
+        for cls in self.__subclasses__():
+            if isinstance(cls, Persistence):
+                cls.resetMapping()
 
 
     def cut(self, name, relation, data,
@@ -35,26 +35,112 @@ All parameters are presented in table below::
     | basic        | bazaar      | module          |          ---                 |
     |              |             | dsn             |          ---                 |
     |              |             | seqpattern      | select nextval for %s        |
+    |              |             | pool.minsize    | 1                            |
+    |              |             | pool.maxsize    | 10                           |
+    |              |             | pool.idle       | 300                          |
+    |              |             | pool.timeout    | ---                          |
+    |              |             | arraysize       | 1000                         |
+    |              |             | batchsize       | 1000                         |
+    |              |             | deferred        | no                           |
+    |              |             | autoupdate      | no                           |
+    |              |             | querycache      | 128                          |
+    |              |             | bus             | ---                          |
     +-----------------------------------------------------------------------------+
     | classes      | bazaar.cls  | <cls>.relation  | application class name       |
     |              |             | <cls>.sequencer | <cls>.relation + '_seq'      |
     |              |             | <cls>.cache     | bazaar.cache.FullObject      |
+    |              |             | <cls>.ttl       | 300                          |
+    |              |             | <cls>.marker    | ---                          |
+    |              |             | <cls>.arraysize | bazaar.arraysize             |
+    |              |             | <cls>.stream    | no                           |
+    |              |             | <cls>.tracked   | yes                          |
     +-----------------------------------------------------------------------------+
     | associations | bazaar.asc  | <attr>.cache    | bazaar.cache.FullAssociation |
+    |              |             | <attr>.arraysize| bazaar.arraysize             |
+    |              |             | <attr>.stream   | no                           |
     +-----------------------------------------------------------------------------+
 
+If any of C{pool.*} parameters is specified, then database connections
+are shared between threads with pool of connections (see
+L{bazaar.motor.PooledMotor}). Pool idle connections are closed after
+C{pool.idle} seconds. When pool is exhausted, then thread waits
+C{pool.timeout} seconds for a connection (forever, by default).
+
+Rows are fetched from database in chunks of C{arraysize} rows. The chunk
+size can be tuned per class and per association, i.e. large chunks speed up
+loading of huge relations into full cache.
+
+Relations of classes and associations with C{stream} parameter set are
+loaded into full cache with server-side cursors if DB API module supports
+them (i.e. psycopg 2). Otherwise, relation is loaded page by page, i.e.::
+
+    select ... from order_item where uuid > %(k0)s order by uuid limit 1000
+
+This way database client never buffers all relation rows at once.
+
+Bulk operations (i.e. L{bazaar.core.Bazaar.addMany}) send C{batchsize}
+rows to database with one batch query.
+
+If C{deferred} is set, then database modifications are recorded and sent
+to database with batch queries on commit or explicit flush (see
+L{bazaar.core.UnitOfWork}).
+
+If C{autoupdate} is set, then all objects modified since they were loaded
+from database are updated on commit (see
+L{bazaar.core.Bazaar.flushDirty}).
+
+Modifications of objects are tracked unless C{tracked} parameter of their
+class is unset. Attribute assignment of objects of class without tracking
+is faster, but all writable columns of the objects are updated and they
+are not updated automatically on commit (see
+L{bazaar.conf.Persistence.setTracked}).
+
+Cache option of class or association can limit size of L{LRU
+caches<bazaar.cache.LRUObject>} with amount of entries and/or memory
+budget with C{K}, C{M} or C{G} suffix, i.e.::
+
+    app.OrderItem.cache: bazaar.cache.LRUObject 10000
+    app.Article.cache:   bazaar.cache.LRUObject 64M
+    app.Order.items.cache: bazaar.cache.LRUAssociation 5000 16M
+
+Objects older than C{ttl} seconds are reloaded from database in place by
+L{expiring cache<bazaar.cache.TTLObject>}.
+
+Objects of a class with change marker column, i.e. modification time
+column, can be refreshed incrementally with only rows changed since last
+load or refresh (see L{bazaar.core.Bazaar.refreshObjects}).
+
+Find queries translated to parameter style of DB API module and queries
+compiled from query expressions are cached. Least recently used queries
+are removed from the cache if there are more than C{querycache} of them.
+Cache hits and misses are counted (see L{bazaar.motor.QueryCache}).
+
+If C{bus} file path is set, then committed database modifications are
+published with L{cache invalidation bus<bazaar.bus>} using the shared file.
+Caches are synchronized with modifications made by other processes with
+L{bazaar.core.Bazaar.sync} method.
+
 Sample configuration file using L{bazaar.config.CPConfig} class::
 
     [bazaar]
     dsn:        dbname = ord port = 5433
     module:     psycopg
     seqpattern: select nextval('%s');
+    pool.maxsize: 16
+    pool.timeout: 30
+    deferred:     yes
 
     [bazaar.cls]
     app.Article.sequencer: article_seq
     app.Article.relation:  article
     app.Article.cache:     bazaar.cache.FullObject
     app.OrderItem.cache:   bazaar.cache.LazyObject
+    app.Customer.cache:    bazaar.cache.LRUObject 10000
+    app.Price.cache:       bazaar.cache.TTLObject
+    app.Price.ttl:         60
+    app.Order.marker:      modified
+    app.Order.arraysize:   10000
+    app.OrderItem.stream:  yes
 
     [bazaar.asc]
     app.Department.boss.cache: bazaar.cache.FullAssociation
@@ -76,9 +162,39 @@ from ConfigParser import NoSectionError, NoOptionError
 import bazaar
 log = bazaar.Log('bazaar.config')
 
+UNITS = {'B': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+def getCacheLimit(value):
+    """
+    Parse cache option limits.
+
+    Cache option value is cache class name followed by amount of entries
+    and/or memory budget, i.e. C{bazaar.cache.LRUObject 10000 64M}.
+
+    @param value: Cache option value.
+
+    @return: Tuple of amount of entries and memory budget in bytes or
+        C{None} if there are no limits.
+    """
+    size = budget = None
+    for limit in value.split()[1:]:
+        unit = limit[-1].upper()
+        if unit in UNITS:
+            budget = int(limit[:-1]) * UNITS[unit]
+        else:
+            size = int(limit)
+
+    if size is None and budget is None:
+        return None
+    return size, budget
+
+
 class Config(object):
     """
     Basic, abstract configuration class.
+
+    Methods returning optional parameters return C{None} by default, which
+    means that parameter is not configured and its default value is used.
     """
     def getDBModule(self):
         """
@@ -101,8 +217,63 @@ class Config(object):
         Return Python DB API data source name.
         """
         raise NotImplementedError
+
+
+    def getPool(self):
+        """
+        Return dictionary of database connection pool parameters or
+        C{None} if connection pool is not configured.
+
+        @see: L{bazaar.motor.ConnectionPool}
+        """
+        return None
     
 
+    def getArraySize(self):
+        """
+        Return default amount of rows fetched from database at once or
+        C{None} if not configured.
+        """
+        return None
+
+
+    def getBatchSize(self):
+        """
+        Return default amount of rows sent to database with one batch query
+        or C{None} if not configured.
+        """
+        return None
+
+
+    def getDeferred(self):
+        """
+        Check if database modifications should be deferred until commit.
+        """
+        return None
+
+
+    def getAutoUpdate(self):
+        """
+        Check if modified objects should be updated on commit.
+        """
+        return None
+
+
+    def getQueryCache(self):
+        """
+        Return maximum amount of cached find queries.
+        """
+        return None
+
+
+    def getBus(self):
+        """
+        Return file path of cache invalidation bus or C{None} if the bus is
+        not used.
+        """
+        return None
+
+
     def getObjectCache(self, cls):
         """
         Get name of application objects cache class.
@@ -112,6 +283,66 @@ class Config(object):
         raise NotImplementedError
 
 
+    def getObjectCacheLimit(self, cls):
+        """
+        Get limits of application objects cache.
+
+        @param cls: Class name of application objects.
+
+        @return: Tuple of amount of objects and memory budget in bytes or
+            C{None}.
+        """
+        return None
+
+
+    def getClassTTL(self, cls):
+        """
+        Get time to live in seconds of application objects in expiring
+        cache.
+
+        @param cls: Class name of application objects.
+        """
+        return None
+
+
+    def getClassMarker(self, cls):
+        """
+        Get name of application class relation column marking changes of
+        rows.
+
+        @param cls: Class name of application objects.
+        """
+        return None
+
+
+    def getClassArraySize(self, cls):
+        """
+        Get amount of application class relation rows fetched from database
+        at once.
+
+        @param cls: Class name of application objects.
+        """
+        return None
+
+
+    def getClassStream(self, cls):
+        """
+        Check if application class relation should be streamed from database.
+
+        @param cls: Class name of application objects.
+        """
+        return None
+
+
+    def getClassTracked(self, cls):
+        """
+        Check if modifications of application objects should be tracked.
+
+        @param cls: Class name of application objects.
+        """
+        return None
+
+
     def getClassSequencer(self, cls):
         """
         Get name of sequencer used to get application objects primary key
@@ -140,6 +371,36 @@ class Config(object):
         raise NotImplementedError
 
 
+    def getAssociationCacheLimit(self, attr):
+        """
+        Get limits of association cache.
+
+        @param attr: Association attribute name, i.e. C{Order.items}.
+
+        @return: Tuple of amount of association data entries and memory
+            budget in bytes or C{None}.
+        """
+        return None
+
+
+    def getAssociationArraySize(self, attr):
+        """
+        Get amount of association data rows fetched from database at once.
+
+        @param attr: Association attribute name, i.e. C{Order.items}.
+        """
+        return None
+
+
+    def getAssociationStream(self, attr):
+        """
+        Check if association data should be streamed from database.
+
+        @param attr: Association attribute name, i.e. C{Order.items}.
+        """
+        return None
+
+
 class CPConfig(Config):
     """
     Bazaar ORM configuration using C{ConfigParser} module.
@@ -197,8 +458,121 @@ class CPConfig(Config):
             dsn = None
 
         return dsn
+
+
+    def getPool(self):
+        """
+        Return dictionary of database connection pool parameters or
+        C{None} if connection pool is not configured.
+
+        @see: L{bazaar.motor.ConnectionPool}
+        """
+        params = (
+            ('minsize', int),
+            ('maxsize', int),
+            ('idle', float),
+            ('timeout', float),
+        )
+
+        pool = {}
+        for param, conv in params:
+            try:
+                pool[param] = conv(self.cfg.get('bazaar', 'pool.%s' % param))
+            except NoOptionError:
+                pass
+            except NoSectionError:
+                pass
+
+        if not pool:
+            pool = None
+
+        return pool
     
 
+    def getArraySize(self):
+        """
+        Return default amount of rows fetched from database at once.
+        """
+        try:
+            arraysize = self.cfg.getint('bazaar', 'arraysize')
+        except NoOptionError:
+            arraysize = None
+        except NoSectionError:
+            arraysize = None
+
+        return arraysize
+
+
+    def getBatchSize(self):
+        """
+        Return default amount of rows sent to database with one batch query.
+        """
+        try:
+            batchsize = self.cfg.getint('bazaar', 'batchsize')
+        except NoOptionError:
+            batchsize = None
+        except NoSectionError:
+            batchsize = None
+
+        return batchsize
+
+
+    def getDeferred(self):
+        """
+        Check if database modifications should be deferred until commit.
+        """
+        try:
+            deferred = self.cfg.getboolean('bazaar', 'deferred')
+        except NoOptionError:
+            deferred = None
+        except NoSectionError:
+            deferred = None
+
+        return deferred
+
+
+    def getAutoUpdate(self):
+        """
+        Check if modified objects should be updated on commit.
+        """
+        try:
+            autoupdate = self.cfg.getboolean('bazaar', 'autoupdate')
+        except NoOptionError:
+            autoupdate = None
+        except NoSectionError:
+            autoupdate = None
+
+        return autoupdate
+
+
+    def getQueryCache(self):
+        """
+        Return maximum amount of cached find queries.
+        """
+        try:
+            size = self.cfg.getint('bazaar', 'querycache')
+        except NoOptionError:
+            size = None
+        except NoSectionError:
+            size = None
+
+        return size
+
+
+    def getBus(self):
+        """
+        Return file path of cache invalidation bus.
+        """
+        try:
+            path = self.cfg.get('bazaar', 'bus')
+        except NoOptionError:
+            path = None
+        except NoSectionError:
+            path = None
+
+        return path
+
+
     def getObjectCache(self, cls):
         """
         Get name of application objects cache class.
@@ -206,7 +580,7 @@ class CPConfig(Config):
         @param cls: Class name of application objects.
         """
         try:
-            cache = self.cfg.get('bazaar.cls', '%s.cache' % cls)
+            cache = self.cfg.get('bazaar.cls', '%s.cache' % cls).split()[0]
         except NoOptionError:
             cache = None
         except NoSectionError:
@@ -215,6 +589,109 @@ class CPConfig(Config):
         return cache
 
 
+    def getObjectCacheLimit(self, cls):
+        """
+        Get limits of application objects cache.
+
+        @param cls: Class name of application objects.
+
+        @return: Tuple of amount of objects and memory budget in bytes.
+
+        @see: L{getCacheLimit}
+        """
+        try:
+            limit = getCacheLimit(self.cfg.get('bazaar.cls', '%s.cache' % cls))
+        except NoOptionError:
+            limit = None
+        except NoSectionError:
+            limit = None
+
+        return limit
+
+
+    def getClassTTL(self, cls):
+        """
+        Get time to live in seconds of application objects in expiring
+        cache.
+
+        @param cls: Class name of application objects.
+        """
+        try:
+            ttl = self.cfg.getfloat('bazaar.cls', '%s.ttl' % cls)
+        except NoOptionError:
+            ttl = None
+        except NoSectionError:
+            ttl = None
+
+        return ttl
+
+
+    def getClassMarker(self, cls):
+        """
+        Get name of application class relation column marking changes of
+        rows.
+
+        @param cls: Class name of application objects.
+        """
+        try:
+            marker = self.cfg.get('bazaar.cls', '%s.marker' % cls)
+        except NoOptionError:
+            marker = None
+        except NoSectionError:
+            marker = None
+
+        return marker
+
+
+    def getClassArraySize(self, cls):
+        """
+        Get amount of application class relation rows fetched from database
+        at once.
+
+        @param cls: Class name of application objects.
+        """
+        try:
+            arraysize = self.cfg.getint('bazaar.cls', '%s.arraysize' % cls)
+        except NoOptionError:
+            arraysize = None
+        except NoSectionError:
+            arraysize = None
+
+        return arraysize
+
+
+    def getClassStream(self, cls):
+        """
+        Check if application class relation should be streamed from database.
+
+        @param cls: Class name of application objects.
+        """
+        try:
+            stream = self.cfg.getboolean('bazaar.cls', '%s.stream' % cls)
+        except NoOptionError:
+            stream = None
+        except NoSectionError:
+            stream = None
+
+        return stream
+
+
+    def getClassTracked(self, cls):
+        """
+        Check if modifications of application objects should be tracked.
+
+        @param cls: Class name of application objects.
+        """
+        try:
+            tracked = self.cfg.getboolean('bazaar.cls', '%s.tracked' % cls)
+        except NoOptionError:
+            tracked = None
+        except NoSectionError:
+            tracked = None
+
+        return tracked
+
+
     def getClassSequencer(self, cls):
         """
         Get name of sequencer used to get application objects primary key
@@ -255,10 +732,63 @@ class CPConfig(Config):
         @param attr: Association attribute name, i.e. C{Order.items}.
         """
         try:
-            cache = self.cfg.get('bazaar.asc', '%s.cache' % attr)
+            cache = self.cfg.get('bazaar.asc', '%s.cache' % attr).split()[0]
         except NoOptionError:
             cache = None
         except NoSectionError:
             cache = None
 
         return cache
+
+
+    def getAssociationCacheLimit(self, attr):
+        """
+        Get limits of association cache.
+
+        @param attr: Association attribute name, i.e. C{Order.items}.
+
+        @return: Tuple of amount of association data entries and memory
+            budget in bytes.
+
+        @see: L{getCacheLimit}
+        """
+        try:
+            limit = getCacheLimit(self.cfg.get('bazaar.asc', '%s.cache' % attr))
+        except NoOptionError:
+            limit = None
+        except NoSectionError:
+            limit = None
+
+        return limit
+
+
+    def getAssociationArraySize(self, attr):
+        """
+        Get amount of association data rows fetched from database at once.
+
+        @param attr: Association attribute name, i.e. C{Order.items}.
+        """
+        try:
+            arraysize = self.cfg.getint('bazaar.asc', '%s.arraysize' % attr)
+        except NoOptionError:
+            arraysize = None
+        except NoSectionError:
+            arraysize = None
+
+        return arraysize
+
+
+    def getAssociationStream(self, attr):
+        """
+        Check if association data should be streamed from database.
+
+        @param attr: Association attribute name, i.e. C{Order.items}.
+        """
+        try:
+            stream = self.cfg.getboolean('bazaar.asc', '%s.stream' % attr)
+        except NoOptionError:
+            stream = None
+        except NoSectionError:
+            stream = None
+
+        return stream
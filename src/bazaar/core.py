@@ -32,18 +32,232 @@ Brokers (L{Broker} class) are responsible for operations on objects of
 specific application class.
 """
 
+import datetime
+import decimal
+import itertools
+import marshal
+import os
+import tempfile
+import threading
+
 import bazaar.assoc
+import bazaar.bus
 import bazaar.cache
+import bazaar.exc
 import bazaar.motor
 
 log = bazaar.Log('bazaar.core')
 
+# version of format of cache snapshot file
+SNAPSHOT_VERSION = 2
+
+# types of values stored in snapshot file with marshal module
+SNAPSHOT_TYPES = (type(None), bool, int, long, float, str, unicode)
+
+# date and time types stored in snapshot file as tuples of their fields
+SNAPSHOT_TIME_TYPES = {
+    'datetime': datetime.datetime,
+    'date': datetime.date,
+    'time': datetime.time,
+    'timedelta': datetime.timedelta,
+}
+
+
+def encodeValue(value):
+    """
+    Encode relation column value for snapshot file.
+
+    Values of types supported by marshal module are not encoded. Decimal
+    values and naive date and time values are encoded as pairs of type
+    name and value's string or tuple of its fields.
+
+    @param value: Relation column value.
+
+    @return: Value, which can be written with marshal module.
+
+    @raise TypeError: If type of value is not supported.
+
+    @see: L{decodeValue}
+    """
+    if isinstance(value, SNAPSHOT_TYPES):
+        return value
+    elif isinstance(value, decimal.Decimal):
+        return ('decimal', str(value))
+    elif isinstance(value, datetime.datetime) and value.tzinfo is None:
+        return ('datetime', (value.year, value.month, value.day,
+            value.hour, value.minute, value.second, value.microsecond))
+    elif isinstance(value, datetime.date) \
+            and not isinstance(value, datetime.datetime):
+        return ('date', (value.year, value.month, value.day))
+    elif isinstance(value, datetime.time) and value.tzinfo is None:
+        return ('time', (value.hour, value.minute, value.second,
+            value.microsecond))
+    elif isinstance(value, datetime.timedelta):
+        return ('timedelta', (value.days, value.seconds,
+            value.microseconds))
+    else:
+        raise TypeError('value of type %s is not supported' % type(value))
+
+
+def decodeValue(value):
+    """
+    Decode relation column value read from snapshot file.
+
+    Only values encoded with L{encodeValue} are accepted, so no other
+    objects are created.
+
+    @param value: Value read from snapshot file.
+
+    @return: Relation column value.
+
+    @raise ValueError: If value is not valid.
+
+    @see: L{encodeValue}
+    """
+    if isinstance(value, SNAPSHOT_TYPES):
+        return value
+    elif not isinstance(value, tuple) or len(value) != 2:
+        raise ValueError('invalid snapshot value %r' % (value, ))
+
+    name, fields = value
+    if name == 'decimal' and isinstance(fields, str):
+        try:
+            return decimal.Decimal(fields)
+        except decimal.InvalidOperation:
+            raise ValueError('invalid decimal value %r' % fields)
+    elif name in SNAPSHOT_TIME_TYPES and isinstance(fields, tuple) \
+            and not [f for f in fields if type(f) not in (int, long)]:
+        try:
+            return SNAPSHOT_TIME_TYPES[name](*fields)
+        except (TypeError, ValueError, OverflowError):
+            pass
+    raise ValueError('invalid snapshot value %r' % (value, ))
+
+
+def decodeRows(rows, size):
+    """
+    Decode relation rows read from snapshot file.
+
+    @param rows: List of rows read from snapshot file.
+    @param size: Number of values in a row.
+
+    @return: List of tuples of relation column values.
+
+    @raise ValueError: If rows are not valid.
+
+    @see: L{decodeValue}
+    """
+    if not isinstance(rows, list):
+        raise ValueError('invalid snapshot rows')
+    result = []
+    for row in rows:
+        if not isinstance(row, tuple) or len(row) != size:
+            raise ValueError('invalid snapshot row %r' % (row, ))
+        result.append(tuple([decodeValue(value) for value in row]))
+    return result
+
+
+def groupByClass(objects):
+    """
+    Group objects by their classes.
+
+    @param objects: Iterable of objects.
+
+    @return: Tuple of list of classes (in order of first appearance in
+        C{objects}) and dictionary of lists of objects per class.
+    """
+    groups = {}
+    order = []
+    for obj in objects:
+        cls = obj.__class__
+        if cls not in groups:
+            groups[cls] = []
+            order.append(cls)
+        groups[cls].append(obj)
+    return order, groups
+
+
+def sortClasses(cls_list):
+    """
+    Sort application classes by foreign key dependencies.
+
+    Class referenced with one-to-one association is put before the class
+    referencing it. Dependency cycles are broken in order of C{cls_list}.
+
+    @param cls_list: List of application classes.
+
+    @return: List of application classes.
+    """
+    deps = {}
+    for cls in cls_list:
+        deps[cls] = [col.vcls for col in cls.getMapping().one_to_one
+            if col.vcls in cls_list]
+
+    order = []
+    visited = set()
+    def visit(cls):
+        if cls in visited:
+            return
+        visited.add(cls)
+        for vcls in deps[cls]:
+            visit(vcls)
+        order.append(cls)
+
+    for cls in cls_list:
+        visit(cls)
+    return order
+
+
+def setTrackedAttr(obj, attr, value):
+    """
+    Set attribute value of application object and mark the attribute as
+    modified.
+
+    The function is C{__setattr__} method of application classes, which
+    objects' modifications are tracked (see L{PersistentObject}).
+
+    @param obj: Application object.
+    @param attr: Attribute name.
+    @param value: Attribute value.
+    """
+    object.__setattr__(obj, attr, value)
+    dirty = obj.__dirty__
+    if dirty is not None:
+        dirty.add(attr)
+        dirty.modified.add(obj)
+
+
+
 class PersistentObject(object):
     """
     Parent class of an application class.
 
+    Names of attributes modified since object was loaded from database (or
+    added or updated) are tracked with C{__dirty__} set. The set does not
+    exist for objects not stored in database yet.
+
+    Modifications are tracked with L{setTrackedAttr} function installed as
+    C{__setattr__} method of application classes with C{tracked}
+    attribute set (see L{bazaar.conf.Persistence.setTracked}). Attribute
+    assignment of objects of other classes is not slowed down, but all
+    writable columns of their objects are always updated.
+
+    Modified objects are registered in set of modified objects of the
+    broker, which loaded (or added or updated) them. The set is reached
+    with C{__dirty__} set (see L{DirtySet}), so modifications of objects
+    are tracked by their Bazaar ORM layer instance, even if there are more
+    instances per process.
+
+    Attributes of compact objects are stored in slots (see L{bazaar.conf}).
+
     @ivar uuid: Object's key.
+    @ivar __dirty__: Set of names of modified attributes.
     """
+    __slots__ = ()
+
+    slots = False
+    __dirty__ = None
+
     def __init__(self, **data):
         """
         Create persistent object with attributes set to C{None} value until
@@ -51,7 +265,14 @@ class PersistentObject(object):
 
         @param data: Initial values of object attributes.
         """
-        self.__dict__.update(self.__class__.defaults)
+        cls = self.__class__
+        if cls.slots:
+            for attr in cls.getMapping().slots:
+                object.__setattr__(self, attr, cls.defaults.get(attr))
+            object.__setattr__(self, '__dirty__', None)
+        else:
+            self.__dict__.update(cls.defaults)
+
         if data != {}:
             for attr in data:
                 # set object attributes
@@ -62,6 +283,28 @@ class PersistentObject(object):
 
 
 
+class DirtySet(set):
+    """
+    Set of names of modified attributes of application object.
+
+    @ivar modified: Set of modified objects of broker tracking the
+        application object.
+
+    @see: L{PersistentObject} L{Broker}
+    """
+    __slots__ = ('modified', )
+
+    def __init__(self, modified):
+        """
+        Create empty set of names of modified attributes.
+
+        @param modified: Set of modified objects of broker.
+        """
+        set.__init__(self)
+        self.modified = modified
+
+
+
 class Broker(object):
     """
     Application class broker.
@@ -76,9 +319,24 @@ class Broker(object):
     @ivar convertor: Relational and object data convertor.
     @ivar reload: If true, then application object's reload has been
         requested.
+    @ivar ascs: List of one-to-many and many-to-many associations of
+        application class.
+    @ivar vascs: List of one-to-many and many-to-many associations
+        referencing application class.
+    @ivar uow: Unit of work recording database modifications, C{None}
+        if modifications are not deferred.
+    @ivar modified: Set of objects modified since they were loaded from
+        database (or added or updated) by the broker, the set is shared
+        with convertor and referenced by objects' C{__dirty__} sets. The
+        set holds weak references, so it does not keep objects in lazy
+        caches alive.
+    @ivar mark: High-water mark of relation changes read when objects were
+        loaded or refreshed, see L{refreshObjects}.
+    @ivar bus: Cache invalidation bus recording database modifications,
+        C{None} if modifications are not published.
 
     @see: L{bazaar.motor.Motor} L{bazaar.motor.Convertor}
-          L{bazaar.cache}
+          L{bazaar.cache} L{bazaar.core.UnitOfWork}
     """
     def __init__(self, cls, mtr, seqpattern = None):
         """
@@ -92,12 +350,18 @@ class Broker(object):
         """
         self.reload = True
         self.cls = cls
-        
+        self.ascs = []
+        self.vascs = []
+        self.uow = None
+        self.modified = bazaar.cache.ObjectSet()
+        self.mark = None
+        self.bus = None
+
         log.info('class "%s" using cache "%s"' \
             % (self.cls, self.cls.cache))
         self.cache = self.cls.cache(self)
 
-        self.convertor = bazaar.motor.Convertor(cls, mtr)
+        self.convertor = bazaar.motor.Convertor(cls, mtr, self.modified)
 
         log.info('class "%s" broker initialized' % cls)
 
@@ -108,6 +372,10 @@ class Broker(object):
 
         @see: L{bazaar.core.Broker.getObjects} L{bazaar.core.Broker.reloadObjects}
         """
+        if self.cls.marker is not None:
+            # rows changed during loading are loaded again on refresh
+            self.mark = self.convertor.getMark()
+
         for obj in self.convertor.getObjects():
             self.cache[obj.uuid] = obj
 
@@ -133,27 +401,251 @@ class Broker(object):
             yield obj
 
 
-    def reloadObjects(self, now = False):
+    def iterObjects(self, arraysize = None, cached = False):
+        """
+        Iterate over application objects loaded from database page by page.
+
+        If C{cached} is false, then loaded objects are not put into cache
+        and their modifications are not tracked. Objects existing in cache
+        are returned instead of loaded ones in both cases.
+
+        @param arraysize: Amount of objects loaded at once.
+        @param cached: Put loaded objects into cache.
+
+        @see: L{bazaar.motor.Convertor.iterObjects}
+        """
+        for obj in self.convertor.iterObjects(arraysize, cached):
+            if cached:
+                obj = self.cache.merge(obj)
+            else:
+                obj = self.cache.dicttype.get(self.cache, obj.uuid) or obj
+            yield obj
+
+
+    def reloadObjects(self, now = False, refresh = False):
         """
         Request reloading objects from database.
 
-        All objects are removed from cache. If C{now} is set to true, then
-        objects are loaded from database immediately.
+        All objects are removed from cache and their modifications are
+        forgotten. If C{now} is set to true, then objects are loaded from
+        database immediately.
+
+        If C{refresh} is set to true and objects are loaded, then objects
+        are reloaded immediately in place instead. Attributes of cached
+        objects are updated and their modifications are forgotten (see
+        L{mergeRows}), objects are created only for new rows and objects
+        of rows deleted from database are evicted. Objects keep their
+        identity, so association data stay valid.
 
         If objects immediate reload is requested, then method returns iterator
         of objects being loaded from database.
         
         @param now: Reload objects immediately.
+        @param refresh: Reload objects in place.
 
         @see: L{bazaar.core.Broker.loadObjects} L{bazaar.core.Broker.getObjects}
         """
+        if refresh and not self.reload:
+            if self.cls.marker is not None:
+                self.mark = self.convertor.getMark()
+            updated, added = self.mergeRows(self.convertor.getRows(), True)
+            removed = self.evictRemoved(set([obj.uuid
+                for obj in itertools.chain(updated, added)]))
+
+            log.info('class %s objects reloaded in place: updated %d,' \
+                ' added %d, removed %d' \
+                % (self.cls, len(updated), len(added), len(removed)))
+            return self.cache.itervalues()
+
         self.reload = True
         self.cache.clear()
+        self.modified.clear()
+        self.mark = None
         if now:
             return self.loadObjects()
 
 
-    def find(self, query, param = None, field = 0):
+    def refreshObjects(self):
+        """
+        Reload objects changed in database since they were loaded or
+        refreshed.
+
+        Only relation rows with change marker column (C{marker} attribute
+        of application class) greater than high-water mark are loaded.
+        Cached objects are updated in place (see L{mergeRows}) and objects
+        of new rows are put into cache.
+
+        Objects of rows deleted from database are removed from cache (see
+        L{evict}). Deletions are detected by comparing amount of relation
+        rows with amount of cached objects. Only if they differ, then all
+        primary key values are loaded and compared with cached ones.
+
+        The method is intended for full object cache. If objects are not
+        loaded yet, then they are loaded from database. If application
+        class has no change marker column, then all objects are reloaded
+        (see L{reloadObjects}).
+
+        @return: Tuple of lists of updated, added and removed objects.
+
+        @see: L{bazaar.motor.Convertor.getDelta}
+        """
+        if self.cls.marker is None:
+            log.warning('class %s has no change marker column,' \
+                ' reloading all objects' % self.cls)
+            self.reloadObjects()
+
+        if self.reload:
+            objects = list(self.loadObjects())
+            return [], objects, []
+
+        mark = self.convertor.getMark()
+        updated, added = self.mergeRows(self.convertor.getDelta(self.mark))
+        self.mark = mark
+
+        removed = []
+        if self.convertor.count() != len(self.cache):
+            keys = set(self.convertor.getKeys())
+            missing = [key for key in keys if key not in self.cache]
+            added.extend(self.mergeRows(
+                self.convertor.getManyRows(missing))[1])
+            removed = self.evictRemoved(keys)
+
+        log.info('class %s objects refreshed: updated %d, added %d,' \
+            ' removed %d' % (self.cls, len(updated), len(added), len(removed)))
+
+        return updated, added, removed
+
+
+    def mergeRows(self, rows, overwrite = False):
+        """
+        Merge relation rows into cache.
+
+        Cached objects are updated in place, so they keep their identity.
+        Objects with database modifications recorded by unit of work are
+        not updated. Objects modified since they were loaded from database
+        are updated only if C{overwrite} is true. Objects are created for
+        rows, which are not cached.
+
+        If foreign key of bi-directional one-to-one association is changed,
+        then primary key value of the object is moved between association
+        data of referenced objects (see
+        L{bazaar.assoc.BiDirOneToOne.relinkKey}). Association data of
+        objects with unchanged foreign keys are left intact.
+
+        @param rows: Iterator of relation rows.
+        @param overwrite: Update modified objects and forget their
+            modifications.
+
+        @return: Tuple of lists of updated and added objects.
+
+        @see: L{bazaar.motor.Convertor.updateObject}
+        """
+        # one-to-one associations with one-to-many association on the
+        # other side
+        ascs = [col.association for col in self.cls.getMapping().one_to_one
+            if col.is_bidir and col.association.association.col.is_many]
+
+        updated = []
+        added = []
+        for data in rows:
+            obj = self.cache.dicttype.get(self.cache, data[0])
+            if obj is None:
+                obj = self.convertor.createObject(data)
+                self.cache[obj.uuid] = obj
+                added.append(obj)
+                for asc in ascs:
+                    asc.relinkKey(obj, None)
+            elif (overwrite or obj not in self.modified) \
+                    and not (self.uow and self.uow.pending(self, obj)):
+                vkeys = [getattr(obj, asc.col.col) for asc in ascs]
+                self.convertor.updateObject(obj, data)
+                updated.append(obj)
+                for asc, vkey in zip(ascs, vkeys):
+                    if getattr(obj, asc.col.col) != vkey:
+                        asc.relinkKey(obj, vkey)
+
+        return updated, added
+
+
+    def evictRemoved(self, keys):
+        """
+        Evict cached objects of rows deleted from database.
+
+        Objects with database modifications recorded by unit of work are
+        not evicted.
+
+        @param keys: Set of primary key values of all relation rows.
+
+        @return: List of evicted objects.
+
+        @see: L{evict}
+        """
+        removed = [obj for key, obj in self.cache.items() if key not in keys
+            and not (self.uow and self.uow.pending(self, obj))]
+        self.evict(removed)
+        return removed
+
+
+    def getSnapshot(self):
+        """
+        Get snapshot of loaded objects.
+
+        Snapshot is created only for full object cache of application
+        class with change marker column. Snapshot is not created if there
+        are objects modified since they were loaded or objects with
+        database modifications recorded by unit of work, as it would not
+        match relation rows.
+
+        @return: Tuple of high-water mark and list of relation rows or
+            C{None}.
+
+        @see: L{restoreSnapshot} L{bazaar.motor.Convertor.getRow}
+        """
+        if self.cls.marker is None or self.reload \
+                or not isinstance(self.cache, bazaar.cache.Full) \
+                or self.modified \
+                or (self.uow and self.uow.hasPending(self)):
+            return None
+
+        return self.mark, [self.convertor.getRow(obj)
+            for obj in self.cache.itervalues()]
+
+
+    def restoreSnapshot(self, mark, rows):
+        """
+        Restore objects from snapshot.
+
+        Snapshot is fresh if high-water mark of relation changes and
+        amount of relation rows did not change since the snapshot was
+        created. Objects are created from relation rows of fresh snapshot
+        and put into cache without querying relation. Otherwise, objects
+        reload is requested (see L{reloadObjects}).
+
+        @param mark: High-water mark of snapshot.
+        @param rows: List of relation rows of snapshot.
+
+        @return: True if objects are restored.
+
+        @see: L{getSnapshot}
+        """
+        self.reloadObjects()
+        if self.convertor.getMark() != mark \
+                or self.convertor.count() != len(rows):
+            log.info('class %s snapshot is stale' % self.cls)
+            return False
+
+        for data in rows:
+            obj = self.convertor.createObject(data)
+            self.cache[obj.uuid] = obj
+        self.mark = mark
+        self.reload = False
+
+        log.info('class %s objects restored from snapshot: %d' \
+            % (self.cls, len(rows)))
+        return True
+
+
+    def find(self, query, param = None, field = 0, full = False):
         """
         Find objects in database.
 
@@ -161,11 +653,40 @@ class Broker(object):
         @param param: SQL query parameters.
         @param field: SQL column number which describes found objects' primary
             key values.
+        @param full: Load relation rows of found objects.
+
+        @see: L{bazaar.core.Bazaar.find} L{getMany}
+        """
+        if full:
+            for obj in self.convertor.findObjects(query, param):
+                yield self.cache.merge(obj)
+            return
+
+        keys = self.convertor.find(query, param, field)
+        batchsize = self.convertor.motor.batchsize
+        while True:
+            batch = list(itertools.islice(keys, batchsize))
+            if not batch:
+                break
+            for obj in self.getMany(batch):
+                yield obj
+
+
+    def select(self, where = None, order = (), limit = None, offset = None):
+        """
+        Find objects in database with query expression.
 
-        @see: L{bazaar.core.Bazaar.find}
+        Objects existing in cache are not replaced.
+
+        @param where: Query expression or C{None}.
+        @param order: List of orders.
+        @param limit: Maximum amount of objects or C{None}.
+        @param offset: Amount of objects to skip or C{None}.
+
+        @see: L{bazaar.core.Bazaar.select} L{bazaar.motor.Convertor.select}
         """
-        for key in self.convertor.find(query, param, field):
-            yield self.cache[key]
+        for obj in self.convertor.select(where, order, limit, offset):
+            yield self.cache.merge(obj)
 
 
     def get(self, key):
@@ -183,6 +704,23 @@ class Broker(object):
         return self.cache[key]
 
 
+    def getMany(self, keys):
+        """
+        Get list of application objects.
+
+        Objects are returned from cache. Objects missing in lazy cache are
+        loaded from database with one query per batch of keys.
+
+        @param keys: List of objects' primary key values.
+
+        @return: List of objects in order of C{keys}, C{None} is put in
+            place of an object, which is not found.
+
+        @see: L{bazaar.cache.Cache.getMany} L{bazaar.cache.LazyObject.getMany}
+        """
+        return self.cache.getMany(keys)
+
+
     def reload(self, key):
         """
         Reload application object of given key from database.
@@ -193,6 +731,10 @@ class Broker(object):
         If reloaded object exists in database and in cache, then application
         object will be replaced with new instance in cache.
         """
+        if key in self.cache:
+            old_obj = self.cache.dicttype.__getitem__(self.cache, key)
+            self.modified.discard(old_obj)
+
         obj = self.convertor.get(key)
         if obj is None:
             # object is no more in database, remove it from cache
@@ -204,36 +746,567 @@ class Broker(object):
         # fixme: what about associations?
 
 
+    def refresh(self, objects):
+        """
+        Reload application objects from database and update them in place.
+
+        Objects keep their identity, so references held by application and
+        association data stay valid. Objects modified since they were
+        loaded from database and objects with database modifications
+        recorded by unit of work are not reloaded. Objects, which do not
+        exist in database anymore, are evicted (see L{evict}).
+
+        @param objects: List of application objects.
+
+        @return: List of reloaded objects.
+
+        @see: L{mergeRows} L{bazaar.motor.Convertor.getManyRows}
+        """
+        objects = [obj for obj in objects if obj not in self.modified
+            and not (self.uow and self.uow.pending(self, obj))]
+
+        rows = self.convertor.getManyRows([obj.uuid for obj in objects])
+        updated, added = self.mergeRows(rows)
+
+        found = set([obj.uuid for obj in updated])
+        self.evict([obj for obj in objects if obj.uuid not in found])
+        return updated
+
+
     def add(self, obj):
         """
         Add object into database.
 
-        @param obj: Object to add.
+        If database modifications are deferred, then object gets primary
+        key value and is put into cache, but it is inserted on flush of
+        unit of work.
+
+        @param obj: Object to add.
+        """
+        if self.uow is None:
+            self.convertor.add(obj)
+        else:
+            self.uow.add(self, obj)
+        self.cache[obj.uuid] = obj
+        self.record([obj], 'add')
+
+
+    def addMany(self, objects, batchsize = None):
+        """
+        Add objects into database.
+
+        @param objects: List of objects to add.
+        @param batchsize: Amount of objects inserted at once.
+
+        @see: L{bazaar.motor.Convertor.addMany}
+        """
+        if self.uow is None:
+            self.convertor.addMany(objects, batchsize)
+        else:
+            for obj in objects:
+                self.uow.add(self, obj)
+        self.cache.update([(obj.uuid, obj) for obj in objects])
+        self.record(objects, 'add')
+
+
+    def update(self, obj):
+        """
+        Update object in database.
+
+        Only modified columns are written. Object is not updated at all
+        if it is not modified, and then the update is not recorded with
+        cache invalidation bus.
+
+        @param obj: Object to update.
+
+        @see: L{bazaar.motor.Convertor.update}
+        """
+        if self.uow is None:
+            if self.convertor.update(obj):
+                self.record([obj], 'update')
+        else:
+            if self.convertor.getChanged(obj):
+                self.record([obj], 'update')
+            self.uow.update(self, obj)
+
+
+    def delete(self, obj):
+        """
+        Delete object from database.
+
+        Object's primary key value is set to C{None}. If database
+        modifications are deferred, then it happens on flush of unit of
+        work.
+
+        @param obj: Object to delete.
+        """
+        self.record([obj], 'delete')
+        if self.uow is None:
+            self.convertor.delete(obj)
+            del self.cache[obj.uuid]
+            self.modified.discard(obj)
+            # do not track primary key reset of deleted object
+            object.__setattr__(obj, 'uuid', None)
+        else:
+            self.uow.delete(self, obj)
+
+
+    def updateMany(self, objects, batchsize = None):
+        """
+        Update objects in database.
+
+        @param objects: List of objects to update.
+        @param batchsize: Amount of objects updated at once.
+
+        @see: L{bazaar.motor.Convertor.updateMany}
+        """
+        changed = [obj for obj in objects if self.convertor.getChanged(obj)]
+        if self.uow is None:
+            self.convertor.updateMany(objects, batchsize)
+        else:
+            for obj in objects:
+                self.uow.update(self, obj)
+        self.record(changed, 'update')
+
+
+    def flushDirty(self, batchsize = None):
+        """
+        Update modified objects in database.
+
+        Objects modified only in attributes, which are not stored in
+        relation (i.e. one-to-many associations), are marked as not
+        modified.
+
+        @param batchsize: Amount of objects updated at once.
+
+        @return: Tuple of amount of updated objects and amount of checked
+            objects skipped, because none of their relation columns was
+            modified.
+
+        @see: L{bazaar.motor.Convertor.updateMany}
+        """
+        objects = list(self.modified)
+        changed = [obj for obj in objects if self.convertor.getChanged(obj)]
+        updated = self.convertor.updateMany(objects, batchsize)
+        self.record(changed, 'update')
+        for obj in objects:
+            if obj in self.modified:
+                self.convertor.setClean(obj)
+
+        return updated, len(objects) - updated
+
+
+    def deleteMany(self, objects, batchsize = None):
+        """
+        Delete objects from database.
+
+        Objects are removed from cache and from association data of
+        application class and of classes referencing application class.
+        Objects' primary key values are set to C{None}.
+
+        @param objects: List of objects to delete.
+        @param batchsize: Amount of objects deleted at once.
+
+        @see: L{bazaar.motor.Convertor.deleteMany}
+        """
+        self.record(objects, 'delete')
+        if self.uow is None:
+            self.convertor.deleteMany([obj.uuid for obj in objects], batchsize)
+            self.evict(objects)
+        else:
+            for obj in objects:
+                self.uow.delete(self, obj)
+
+
+    def evict(self, objects):
+        """
+        Remove deleted objects from cache and from association data of
+        application class and of classes referencing application class.
+
+        Objects' primary key values are set to C{None}.
+
+        @param objects: List of deleted objects.
+        """
+        keys = [obj.uuid for obj in objects]
+        for key in keys:
+            if key in self.cache:
+                del self.cache[key]
+
+        for asc in self.ascs:
+            asc.delObjects(objects)
+
+        keys = set(keys)
+        for asc in self.vascs:
+            asc.delKeys(keys)
+
+        self.modified.difference_update(objects)
+
+        # do not track primary key reset of deleted objects
+        for obj in objects:
+            object.__setattr__(obj, 'uuid', None)
+
+
+    def record(self, objects, op):
+        """
+        Record database modification of objects with cache invalidation
+        bus.
+
+        @param objects: List of application objects.
+        @param op: Operation, i.e. C{update}.
+
+        @see: L{bazaar.bus.Bus.record}
+        """
+        if self.bus is not None:
+            for obj in objects:
+                self.bus.record(self.cls, obj.uuid, op)
+
+
+    def invalidate(self, op, keys):
+        """
+        Apply database modifications of objects made by other process.
+
+        Cached objects are refreshed in place on C{add} and C{update}
+        operations (see L{refresh}) and evicted on C{delete} operation
+        (see L{evict}). Added objects are loaded into full cache, which
+        is loaded already. Association data of C{attr} association of
+        cached objects are reloaded on C{asc:<attr>} operation (see
+        L{bazaar.assoc.List.refreshData}).
+
+        @param op: Operation.
+        @param keys: List of objects' primary key values.
+
+        @see: L{bazaar.bus}
+        """
+        objects = [obj for obj in [self.cache.dicttype.get(self.cache, key)
+            for key in keys] if obj is not None]
+
+        if op == 'delete':
+            self.evict(objects)
+        elif op in ('add', 'update'):
+            self.refresh(objects)
+            if op == 'add' and not self.reload \
+                    and isinstance(self.cache, bazaar.cache.Full):
+                missing = [key for key in keys if key not in self.cache]
+                self.mergeRows(self.convertor.getManyRows(missing))
+        elif op.startswith('asc:'):
+            col = self.cls.getMapping().columns.get(op[4:])
+            if col is not None and col.is_many:
+                for obj in objects:
+                    col.association.refreshData(obj)
+        else:
+            log.warning('class %s: unknown operation %s' % (self.cls, op))
+
+
+
+class UnitOfWork(object):
+    """
+    Unit of work recording database modifications of application objects.
+
+    Recorded modifications are sent to database on flush, which is
+    performed in following steps
+
+        1. Insert new objects. Objects of referenced classes are inserted
+           before objects of referencing classes, see L{sortClasses}.
+        2. Update modified objects.
+        3. Update association data.
+        4. Delete objects in reverse order of classes.
+
+    Every step sends batch queries per application class or association.
+    Modifications recorded during flush, i.e. by one-to-many associations,
+    are sent with next round of the steps.
+
+    Unit of work is shared by all threads using Bazaar ORM layer.
+    Modifications are recorded per thread, because every thread commits
+    its own transaction when database connections are pooled (see
+    L{bazaar.motor.PooledMotor}), so flush and rollback of one thread
+    affect only its own modifications.
+
+    @ivar order: Brokers of application classes sorted by foreign key
+        dependencies.
+    @ivar local: Thread local data with groups of recorded modifications.
+    @ivar added: Objects to insert per broker.
+    @ivar updated: Objects to update per broker.
+    @ivar deleted: Objects to delete per broker.
+    @ivar ascs: Objects with modified association data per association.
+
+    @see: L{Bazaar.flush} L{Broker}
+    """
+    def __init__(self, brokers, cls_list):
+        """
+        Create unit of work.
+
+        @param brokers: Dictionary of brokers.
+        @param cls_list: List of application classes.
+        """
+        self.order = [brokers[cls] for cls in sortClasses(cls_list)]
+        self.local = threading.local()
+
+
+    def getGroups(self, name):
+        """
+        Return dictionary of groups of objects recorded by current thread.
+
+        @param name: Name of groups, i.e. C{added}.
+        """
+        try:
+            return getattr(self.local, name)
+        except AttributeError:
+            groups = {}
+            setattr(self.local, name, groups)
+            return groups
+
+
+    added = property(lambda self: self.getGroups('added'),
+        lambda self, groups: setattr(self.local, 'added', groups))
+    updated = property(lambda self: self.getGroups('updated'),
+        lambda self, groups: setattr(self.local, 'updated', groups))
+    deleted = property(lambda self: self.getGroups('deleted'),
+        lambda self, groups: setattr(self.local, 'deleted', groups))
+    ascs = property(lambda self: self.getGroups('ascs'),
+        lambda self, groups: setattr(self.local, 'ascs', groups))
+
+
+    def record(self, groups, key, obj):
+        """
+        Record object in group of objects.
+
+        Object is recorded only once.
+
+        @param groups: Dictionary of groups of objects.
+        @param key: Group key.
+        @param obj: Object to record.
+        """
+        if key not in groups:
+            groups[key] = ([], set())
+        items, members = groups[key]
+        if obj not in members:
+            items.append(obj)
+            members.add(obj)
+
+
+    def discard(self, groups, key, obj):
+        """
+        Discard object from group of objects.
+
+        @param groups: Dictionary of groups of objects.
+        @param key: Group key.
+        @param obj: Object to discard.
+
+        @return: True if object was recorded in the group.
+        """
+        if key in groups and obj in groups[key][1]:
+            groups[key][1].remove(obj)
+            return True
+        else:
+            return False
+
+
+    def getObjects(self, groups, key):
+        """
+        Return list of recorded objects of a group.
+
+        @param groups: Dictionary of groups of objects.
+        @param key: Group key.
+        """
+        if key not in groups:
+            return []
+        items, members = groups[key]
+        return [obj for obj in items if obj in members]
+
+
+    def add(self, broker, obj):
+        """
+        Record object to be inserted.
+
+        Object gets primary key value at once, so it can be cached and
+        referenced by other objects.
+
+        @param broker: Broker of object's class.
+        @param obj: Object to add.
+        """
+        if obj.uuid is None:
+            obj.uuid = broker.convertor.getId()
+        self.record(self.added, broker, obj)
+
+
+    def update(self, broker, obj):
+        """
+        Record object to be updated.
+
+        Objects, which are going to be inserted, are not recorded.
+
+        @param broker: Broker of object's class.
+        @param obj: Object to update.
+        """
+        if not (broker in self.added and obj in self.added[broker][1]):
+            self.record(self.updated, broker, obj)
+
+
+    def delete(self, broker, obj):
+        """
+        Record object to be deleted.
+
+        If object is not inserted yet, then its insertion is cancelled,
+        object is removed from cache and its primary key value is set to
+        C{None}.
+
+        @param broker: Broker of object's class.
+        @param obj: Object to delete.
+        """
+        for asc in self.ascs:
+            self.discard(self.ascs, asc, obj)
+
+        if self.discard(self.added, broker, obj):
+            self.uncache(broker, obj)
+        else:
+            self.discard(self.updated, broker, obj)
+            self.record(self.deleted, broker, obj)
+
+
+    def hasPending(self, broker):
+        """
+        Check if there are recorded database modifications of objects of
+        broker's class.
+
+        @param broker: Broker of application class.
+        """
+        for groups in (self.added, self.updated, self.deleted):
+            if self.getObjects(groups, broker):
+                return True
+        return False
+
+
+    def pending(self, broker, obj):
+        """
+        Check if object has recorded database modifications.
+
+        @param broker: Broker of object's class.
+        @param obj: Application object.
+        """
+        for groups in (self.added, self.updated, self.deleted):
+            if broker in groups and obj in groups[broker][1]:
+                return True
+        return False
+
+
+    def uncache(self, broker, obj):
+        """
+        Remove object, which is not inserted into database, from cache and
+        set its primary key value to C{None}.
+
+        @param broker: Broker of object's class.
+        @param obj: Application object.
+        """
+        if obj.uuid in broker.cache:
+            del broker.cache[obj.uuid]
+        broker.modified.discard(obj)
+        object.__setattr__(obj, 'uuid', None)
+
+
+    def updateAsc(self, asc, obj):
+        """
+        Record object, which association data are modified.
+
+        @param asc: Association object.
+        @param obj: Application object.
+        """
+        self.record(self.ascs, asc, obj)
+
+
+    def flush(self):
+        """
+        Send modifications recorded by current thread to database.
+
+        @see: L{UnitOfWork}
+        """
+        while self.added or self.updated or self.ascs or self.deleted:
+            # modifications recorded while sending the recorded ones are
+            # sent in next iteration
+            added, updated, ascs, deleted = \
+                self.added, self.updated, self.ascs, self.deleted
+            self.clear()
+
+            try:
+                self.send(added, updated, ascs, deleted)
+            except:
+                # keep the modifications, so objects, which were going to
+                # be inserted, are discarded on rollback
+                self.restore(added, updated, ascs, deleted)
+                raise
+
+
+    def send(self, added, updated, ascs, deleted):
+        """
+        Send groups of recorded modifications to database.
+
+        @param added: Objects to insert per broker.
+        @param updated: Objects to update per broker.
+        @param ascs: Objects with modified association data per
+            association.
+        @param deleted: Objects to delete per broker.
+        """
+        for broker in self.order:
+            objects = self.getObjects(added, broker)
+            if objects:
+                broker.convertor.addMany(objects)
+
+        for broker in self.order:
+            objects = self.getObjects(updated, broker)
+            if objects:
+                broker.convertor.updateMany(objects)
+
+        for asc in ascs:
+            objects = self.getObjects(ascs, asc)
+            if objects:
+                asc.updateMany(objects)
+
+        for broker in reversed(self.order):
+            objects = self.getObjects(deleted, broker)
+            if objects:
+                broker.convertor.deleteMany([obj.uuid for obj in objects])
+                broker.evict(objects)
+
+
+    def restore(self, added, updated, ascs, deleted):
         """
-        self.convertor.add(obj)
-        self.cache[obj.uuid] = obj
+        Restore groups of recorded modifications taken for sending to
+        database.
 
+        Modifications recorded since the groups were taken are kept.
 
-    def update(self, obj):
+        @see: L{send}
         """
-        Update object in database.
+        groups = (added, updated, ascs, deleted)
+        current = (self.added, self.updated, self.ascs, self.deleted)
+        for old, new in zip(groups, current):
+            for key in new:
+                for obj in self.getObjects(new, key):
+                    self.record(old, key, obj)
+        self.added, self.updated, self.ascs, self.deleted = groups
 
-        @param obj: Object to update.
+
+    def clear(self):
         """
-        self.convertor.update(obj)
+        Forget modifications recorded by current thread.
+        """
+        self.added = {}
+        self.updated = {}
+        self.deleted = {}
+        self.ascs = {}
 
 
-    def delete(self, obj):
+    def discardAll(self):
         """
-        Delete object from database.
-
-        Object's primary key value is set to C{None}.
+        Discard modifications recorded by current thread.
 
-        @param obj: Object to delete.
+        Objects, which were going to be inserted, are removed from cache
+        and their primary key values are set to C{None}.
         """
-        self.convertor.delete(obj)
-        del self.cache[obj.uuid]
-        obj.uuid = None
+        for broker, (items, members) in self.added.items():
+            for obj in items:
+                if obj in members:
+                    self.uncache(broker, obj)
+        self.clear()
 
 
 
@@ -247,12 +1320,27 @@ class Bazaar(object):
     @ivar dsn: Python DB API database source name.
     @ivar cls_list: List of application classes.
     @ivar dbmod: Python DB API module.
-
-    @see: L{Broker} L{bazaar.motor.Motor}
+    @ivar pool: Database connection pool parameters, connection pool is
+        not used if C{None}.
+    @ivar arraysize: Default amount of rows fetched from database at once.
+    @ivar batchsize: Default amount of rows sent to database with one batch
+        query.
+    @ivar deferred: If true, then database modifications are deferred
+        until commit or flush.
+    @ivar autoupdate: If true, then modified objects are updated in
+        database on commit.
+    @ivar querycache: Maximum amount of cached find and select queries.
+    @ivar uow: Unit of work recording deferred database modifications.
+    @ivar bus: Cache invalidation bus, C{None} if database modifications
+        are not published.
+
+    @see: L{Broker} L{UnitOfWork} L{bazaar.motor.Motor}
+        L{bazaar.motor.PooledMotor} L{bazaar.bus}
     """
 
     def __init__(self, cls_list, config = None, dsn = '', dbmod = None,
-            seqpattern = None):
+            seqpattern = None, pool = None, deferred = None,
+            autoupdate = None):
         """
         Start the Bazaar ORM layer.
 
@@ -264,16 +1352,30 @@ class Bazaar(object):
         @param dsn: Database source name.
         @param dbmod: Python DB API module.
         @param seqpattern: Sequence command pattern.
-
-        @see: L{bazaar.core.Bazaar.connectDB}, L{bazaar.config}
+        @param pool: Database connection pool parameters, i.e.
+            C{{'maxsize': 16, 'timeout': 30}}.
+        @param deferred: Defer database modifications until commit or
+            flush.
+        @param autoupdate: Update modified objects on commit.
+
+        @see: L{bazaar.core.Bazaar.connectDB}, L{bazaar.config},
+            L{bazaar.motor.ConnectionPool}
         """
         self.cls_list = cls_list
         self.config = config
         self.dsn = dsn
         self.dbmod = dbmod
         self.seqpattern = 'select next value for \'%s\''
+        self.pool = None
+        self.arraysize = None
+        self.batchsize = None
+        self.deferred = False
+        self.autoupdate = False
+        self.querycache = None
         self.motor = None
         self.brokers = None
+        self.uow = None
+        self.bus = None
 
         if config is not None:
             self.parseConfig(config)
@@ -281,6 +1383,15 @@ class Bazaar(object):
         if seqpattern is not None:
             self.seqpattern = seqpattern
 
+        if pool is not None:
+            self.pool = pool
+
+        if deferred is not None:
+            self.deferred = deferred
+
+        if autoupdate is not None:
+            self.autoupdate = autoupdate
+
         self.init()
 
         if dsn:
@@ -293,17 +1404,30 @@ class Bazaar(object):
         """
         Initialize the Bazaar ORM layer.
         """
-        self.motor = bazaar.motor.Motor(self.dbmod)
+        if self.pool is None:
+            self.motor = bazaar.motor.Motor(self.dbmod)
+        else:
+            self.motor = bazaar.motor.PooledMotor(self.dbmod, **self.pool)
+
+        if self.arraysize is not None:
+            self.motor.arraysize = self.arraysize
+
+        if self.batchsize is not None:
+            self.motor.batchsize = self.batchsize
+
+        if self.querycache is not None:
+            self.motor.queries.size = self.querycache
+
         self.brokers = {}
 
         # first, kill existing associations
         for c in self.cls_list:
-            for col in c.getColumns().values():
+            for col in c.getMapping().columns.values():
                 col.association = None
 
         # create association objects
         for c in self.cls_list:
-            for col in c.getColumns().values():
+            for col in c.getMapping().columns.values():
                 if col.vcls is None:
                     continue
 
@@ -328,11 +1452,11 @@ class Bazaar(object):
 
                 # bi-directional association
                 if col.is_bidir:
-                    if col.vattr not in col.vcls.getColumns():
+                    if col.vattr not in col.vcls.getMapping().columns:
                         raise bazaar.exc.ColumnMappingError(
                             'column of referenced class is not defined', c, col)
 
-                    vcol = col.vcls.getColumns()[col.vattr]
+                    vcol = col.vcls.getMapping().columns[col.vattr]
                     
                     # specialized classes for bi-directional associations
                     if issubclass(asc_cls, bazaar.assoc.OneToOne):
@@ -383,10 +1507,22 @@ class Bazaar(object):
 
         # again to assign brokers for associations
         for c in self.cls_list:
-            for col in c.getColumns().values():
+            for col in c.getMapping().columns.values():
                 if col.association is not None:
                     col.association.broker = self.brokers[c]
                     col.association.vbroker = self.brokers[col.vcls]
+                    if col.is_many:
+                        self.brokers[c].ascs.append(col.association)
+                        self.brokers[col.vcls].vascs.append(col.association)
+
+        if self.deferred:
+            self.uow = UnitOfWork(self.brokers, self.cls_list)
+        else:
+            self.uow = None
+
+        for broker in self.brokers.values():
+            broker.uow = self.uow
+            broker.bus = self.bus
 
 
     def parseConfig(self, config): #fixme: debug messages
@@ -412,6 +1548,42 @@ class Bazaar(object):
             self.seqpattern = seqpattern
             log.info('sequencer pattern: "%s"' % self.seqpattern)
 
+        pool = config.getPool()
+        if pool is not None:
+            self.pool = pool
+            log.info('connection pool: %s' % self.pool)
+
+        arraysize = config.getArraySize()
+        if arraysize is not None:
+            self.arraysize = arraysize
+            log.info('array size: %d' % self.arraysize)
+
+        batchsize = config.getBatchSize()
+        if batchsize is not None:
+            self.batchsize = batchsize
+            log.info('batch size: %d' % self.batchsize)
+
+        deferred = config.getDeferred()
+        if deferred is not None:
+            self.deferred = deferred
+            log.info('deferred modifications: %s' % self.deferred)
+
+        autoupdate = config.getAutoUpdate()
+        if autoupdate is not None:
+            self.autoupdate = autoupdate
+            log.info('update modified objects on commit: %s' \
+                % self.autoupdate)
+
+        querycache = config.getQueryCache()
+        if querycache is not None:
+            self.querycache = querycache
+            log.info('query cache size: %d' % self.querycache)
+
+        bus = config.getBus()
+        if bus is not None:
+            self.bus = bazaar.bus.Bus(bazaar.bus.FileTransport(bus))
+            log.info('cache invalidation bus: %s' % bus)
+
         def get_class(path): # get class
             items = path.split('.')
             mod = '.'.join(items[:-1])
@@ -442,9 +1614,41 @@ class Bazaar(object):
             else:
                 c.cache = bazaar.cache.FullObject
             log.info('%s cache: %s' % (c, c.cache))
+
+            limit = config.getObjectCacheLimit(fname)
+            if limit is not None:
+                c.cachesize, c.cachebudget = limit
+                log.info('%s cache limit: %s entries, %s bytes' \
+                    % (c, c.cachesize, c.cachebudget))
+
+            marker = config.getClassMarker(fname)
+            if marker is not None:
+                c.marker = marker
+                log.info('%s change marker column: %s' % (c, c.marker))
+
+            ttl = config.getClassTTL(fname)
+            if ttl is not None:
+                c.ttl = ttl
+                log.info('%s objects time to live: %s' % (c, c.ttl))
+
+            arraysize = config.getClassArraySize(fname)
+            if arraysize is not None:
+                c.arraysize = arraysize
+                log.info('%s array size: %d' % (c, c.arraysize))
+
+            stream = config.getClassStream(fname)
+            if stream is not None:
+                c.stream = stream
+                log.info('%s objects are streamed: %s' % (c, c.stream))
+
+            tracked = config.getClassTracked(fname)
+            if tracked is not None:
+                c.setTracked(tracked)
+                log.info('%s objects modifications are tracked: %s' \
+                    % (c, c.tracked))
             
             # check configuration for every attribute
-            for col in c.getColumns().values():
+            for col in c.getMapping().columns.values():
                 aname = fname + '.' + col.attr
                 if __debug__:
                     log.debug('get association %s cache' % aname)
@@ -456,6 +1660,24 @@ class Bazaar(object):
                 else:
                     col.cache = bazaar.cache.FullAssociation
                 log.info('association "%s" cache: %s' % (aname, c.cache))
+
+                limit = config.getAssociationCacheLimit(aname)
+                if limit is not None:
+                    col.cachesize, col.cachebudget = limit
+                    log.info('association "%s" cache limit: %s entries,' \
+                        ' %s bytes' % (aname, col.cachesize, col.cachebudget))
+
+                arraysize = config.getAssociationArraySize(aname)
+                if arraysize is not None:
+                    col.arraysize = arraysize
+                    log.info('association "%s" array size: %d' \
+                        % (aname, col.arraysize))
+
+                stream = config.getAssociationStream(aname)
+                if stream is not None:
+                    col.stream = stream
+                    log.info('association "%s" data are streamed: %s' \
+                        % (aname, col.stream))
             
 
     def setConfig(self, config):
@@ -517,6 +1739,119 @@ class Bazaar(object):
         return self.brokers[cls].get(key)
 
 
+    def getMany(self, cls, keys, missing = 'none'):
+        """
+        Get objects with keys.
+
+        Objects are returned from cache. Objects missing in lazy cache are
+        loaded from database with C{select ... where uuid in (...)} query
+        per C{batchsize} keys, i.e.::
+
+            articles = bazaar.getMany(Article, keys, missing = 'skip')
+
+        Objects not found are handled with C{missing} policy
+            - none: C{None} is put in place of an object
+            - skip: object is omitted
+            - error: L{bazaar.exc.ObjectNotFoundError} exception is raised
+
+        @param cls: Application class.
+        @param keys: Iterable of objects' keys.
+        @param missing: Not found objects policy.
+
+        @return: List of objects in order of C{keys}.
+
+        @see: L{get} L{Broker.getMany}
+        """
+        if missing not in ('none', 'skip', 'error'):
+            raise ValueError('unknown missing objects policy: %s' % missing)
+
+        keys = list(keys)
+        objects = self.brokers[cls].getMany(keys)
+
+        if missing == 'skip':
+            objects = [obj for obj in objects if obj is not None]
+        elif missing == 'error':
+            not_found = [key for key, obj in zip(keys, objects) if obj is None]
+            if not_found:
+                raise bazaar.exc.ObjectNotFoundError('objects not found',
+                    cls, not_found)
+
+        return objects
+
+
+    def preload(self, objects, paths):
+        """
+        Preload association data and referenced objects of application
+        objects.
+
+        Association paths are attribute names separated with dots, i.e.::
+
+            orders = list(bazaar.getObjects(Order))
+            loaded = bazaar.preload(orders, ['items', 'items.article'])
+            for ord in orders:
+                for oi in ord.items:    # no queries are executed
+                    print oi.article
+
+        Every path segment is loaded with one query per batch of objects
+        for association data and one query per batch of referenced objects.
+        Lazy caches keep weak references to objects, so returned objects
+        should be referenced as long as they are used.
+
+        @param objects: Iterable of application objects.
+        @param paths: List of association paths.
+
+        @return: Dictionary of lists of preloaded objects per path and its
+            leading segments.
+
+        @see: L{bazaar.assoc.OneToOne.getMany} L{bazaar.assoc.List.getMany}
+        """
+        objects = list(objects)
+        loaded = {}
+        for path in paths:
+            values = objects
+            name = None
+            for attr in path.split('.'):
+                if name is None:
+                    name = attr
+                else:
+                    name = name + '.' + attr
+
+                if name not in loaded:
+                    loaded[name] = self.getReferenced(values, attr)
+                values = loaded[name]
+
+        return loaded
+
+
+    def getReferenced(self, objects, attr):
+        """
+        Get objects referenced by application objects with association.
+
+        @param objects: List of application objects.
+        @param attr: Association attribute name.
+
+        @return: List of referenced objects without duplicates.
+
+        @see: L{preload}
+        """
+        order, groups = groupByClass(objects)
+
+        values = []
+        for cls in order:
+            col = cls.getMapping().columns.get(attr)
+            if col is None or col.association is None:
+                raise ValueError('%s has no association %s' % (cls, attr))
+            values.extend(col.association.getMany(groups[cls]))
+
+        referenced = []
+        seen = set()
+        for value in values:
+            if value is not None and value not in seen:
+                seen.add(value)
+                referenced.append(value)
+        return referenced
+
+
     def getObjects(self, cls):
         """
         Get list of application objects.
@@ -530,7 +1865,35 @@ class Bazaar(object):
         return self.brokers[cls].getObjects()
 
 
-    def reloadObjects(self, cls, now = False):
+    def iterObjects(self, cls, arraysize = None, cached = False):
+        """
+        Iterate over objects of given class loaded from database page by
+        page.
+
+        Relation is read with keyset pagination, so memory usage is bounded
+        by one page of objects. Loaded objects are not put into cache and
+        their modifications are not tracked unless C{cached} is set, i.e.
+        to walk huge relation once::
+
+            total = 0
+            for oi in bazaar.iterObjects(OrderItem, arraysize = 10000):
+                total += oi.quantity
+
+        Objects existing in cache are returned instead of loaded ones.
+
+        @param cls: Application class.
+        @param arraysize: Amount of objects loaded at once, see C{arraysize}
+            configuration parameter.
+        @param cached: Put loaded objects into cache.
+
+        @return: Iterator of objects.
+
+        @see: L{getObjects}
+        """
+        return self.brokers[cls].iterObjects(arraysize, cached)
+
+
+    def reloadObjects(self, cls, now = False, refresh = False):
         """
         Reload objects from database.
 
@@ -539,13 +1902,251 @@ class Bazaar(object):
 
         @param cls: Application class.
         @param now: Reload objects immediately.
+        @param refresh: Reload objects in place.
 
         @see: L{bazaar.core.Bazaar.getObjects}
+            L{bazaar.core.Broker.reloadObjects}
+        """
+        return self.brokers[cls].reloadObjects(now, refresh)
+
+
+    def refreshObjects(self, cls):
+        """
+        Reload objects changed in database since they were loaded or
+        refreshed.
+
+        @param cls: Application class.
+
+        @return: Tuple of lists of updated, added and removed objects.
+
+        @see: L{bazaar.core.Broker.refreshObjects}
+        """
+        return self.brokers[cls].refreshObjects()
+
+
+    def saveSnapshot(self, path):
+        """
+        Save snapshot of loaded objects and association data to a file.
+
+        Snapshot contains relation rows of loaded objects of application
+        classes with change marker column and full object cache (see
+        L{bazaar.core.Broker.getSnapshot}) and association data of their
+        one-to-many associations. Snapshot is written with marshal module
+        to temporary file, readable only by its owner, in directory of
+        C{path}. The file is renamed to C{path}, so snapshot file is never
+        read partially written.
+
+        Relation column values are encoded with L{encodeValue} function,
+        so snapshot contains only plain values and tuples. Class is not
+        saved if its relation rows contain values of unsupported types.
+
+        Snapshot is loaded with L{loadSnapshot} method, i.e. to speed up
+        start of other process::
+
+            bzr.saveSnapshot('/var/cache/app/bazaar.snapshot')
+
+            # in other process
+            bzr.loadSnapshot('/var/cache/app/bazaar.snapshot')
+
+        @param path: Snapshot file path.
+
+        @return: List of application classes saved in snapshot.
+        """
+        classes = {}
+        saved = []
+        for cls in self.cls_list:
+            data = self.brokers[cls].getSnapshot()
+            if data is None:
+                log.info('class %s is not saved in snapshot' % cls)
+            else:
+                mark, rows = data
+                try:
+                    mark = encodeValue(mark)
+                    rows = [tuple([encodeValue(value) for value in row])
+                        for row in rows]
+                except TypeError, ex:
+                    log.info('class %s is not saved in snapshot: %s' \
+                        % (cls, ex))
+                    continue
+                fname = cls.__module__ + '.' + cls.__name__
+                classes[fname] = (cls.relation, cls.getMapping().load_cols,
+                    mark, rows)
+                saved.append(cls)
+
+        ascs = {}
+        for cls in saved:
+            for col in cls.getMapping().one_to_many:
+                data = col.association.getSnapshot()
+                if col.vcls in saved and data is not None:
+                    fname = '%s.%s.%s' % (cls.__module__, cls.__name__,
+                        col.attr)
+                    ascs[fname] = [(encodeValue(okey),
+                            tuple([encodeValue(vkey) for vkey in vkeys]))
+                        for okey, vkeys in data]
+
+        # temporary file is created with unique name and without
+        # following symbolic links
+        fd, tmp = tempfile.mkstemp(prefix = os.path.basename(path) + '.',
+            dir = os.path.dirname(path) or os.curdir)
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                marshal.dump((SNAPSHOT_VERSION, classes, ascs), f)
+            finally:
+                f.close()
+            os.rename(tmp, path)
+        except:
+            os.remove(tmp)
+            raise
+
+        log.info('snapshot %s saved: %d classes, %d associations' \
+            % (path, len(classes), len(ascs)))
+        return saved
+
+
+    def loadSnapshot(self, path):
+        """
+        Load objects and association data from snapshot file.
+
+        Objects of application classes are restored only if their
+        snapshot is fresh, which is validated with change marker column of
+        the classes (see L{bazaar.core.Broker.restoreSnapshot}). Objects of
+        stale snapshot, of classes with changed relation mapping and of
+        classes missing in snapshot are loaded from database as usual.
+
+        Association data are restored if objects of both associated
+        classes are restored. Other association data of classes with
+        restored or stale snapshot are reloaded, because they refer to
+        objects removed from cache.
+
+        Snapshot version, names of application classes and associations
+        and all values are validated (see L{decodeValue}) before any object
+        is created. Invalid snapshot is ignored.
+
+        @param path: Snapshot file path.
+
+        @return: List of application classes restored from snapshot.
+
+        @see: L{saveSnapshot}
+        """
+        f = open(path, 'rb')
+        try:
+            try:
+                data = marshal.load(f)
+            except (EOFError, ValueError, TypeError), ex:
+                log.warning('snapshot %s is not valid: %s' % (path, ex))
+                return []
+        finally:
+            f.close()
+
+        try:
+            snapshot = self.decodeSnapshot(data)
+        except ValueError, ex:
+            log.warning('snapshot %s is not valid: %s' % (path, ex))
+            return []
+        if snapshot is None:
+            log.warning('snapshot %s version is not supported' % path)
+            return []
+
+        classes, ascs = snapshot
+        restored = []
+        reloaded = []
+        for cls in self.cls_list:
+            if cls not in classes:
+                continue
+
+            relation, cols, mark, rows = classes[cls]
+            if (relation, cols) != (cls.relation, cls.getMapping().load_cols):
+                log.warning('class %s mapping changed, snapshot ignored' \
+                    % cls)
+            elif cls.marker is not None:
+                reloaded.append(cls)
+                if self.brokers[cls].restoreSnapshot(mark, rows):
+                    restored.append(cls)
+
+        for cls in reloaded:
+            for col in cls.getMapping().many:
+                if col.is_one_to_many and cls in restored \
+                        and col.vcls in restored and col in ascs:
+                    col.association.restoreSnapshot(ascs[col])
+                else:
+                    # association data are keyed by objects removed from
+                    # cache; referenced objects are not reloaded, see
+                    # OneToMany.reloadData
+                    bazaar.assoc.List.reloadData(col.association)
+
+        log.info('snapshot %s loaded: %d of %d classes restored' \
+            % (path, len(restored), len(classes)))
+        return restored
+
+
+    def decodeSnapshot(self, data):
+        """
+        Validate and decode snapshot data read from snapshot file.
+
+        Data of application classes and associations unknown to the
+        layer are skipped.
+
+        @param data: Snapshot data read with marshal module.
+
+        @return: Pair of dictionaries of relation name, relation column
+            names, high-water mark and relation rows per application class
+            and association data per one-to-many association column or
+            C{None} if snapshot version is not supported.
+
+        @raise ValueError: If snapshot data are not valid.
+
+        @see: L{loadSnapshot} L{decodeRows}
         """
-        return self.brokers[cls].reloadObjects(now)
+        if not isinstance(data, tuple) or len(data) != 3:
+            raise ValueError('invalid snapshot structure')
+
+        version, classes, ascs = data
+        if version != SNAPSHOT_VERSION:
+            return None
+        if not isinstance(classes, dict) or not isinstance(ascs, dict):
+            raise ValueError('invalid snapshot structure')
+
+        cls_data = {}
+        asc_data = {}
+        for cls in self.cls_list:
+            fname = cls.__module__ + '.' + cls.__name__
+            if fname in classes:
+                entry = classes[fname]
+                if not isinstance(entry, tuple) or len(entry) != 4:
+                    raise ValueError('invalid class %s data' % fname)
+
+                relation, cols, mark, rows = entry
+                if not isinstance(relation, str) \
+                        or not isinstance(cols, tuple) \
+                        or [col for col in cols if not isinstance(col, str)]:
+                    raise ValueError('invalid class %s mapping' % fname)
+
+                cls_data[cls] = (relation, cols, decodeValue(mark),
+                    decodeRows(rows, len(cols)))
+
+            for col in cls.getMapping().one_to_many:
+                fname = '%s.%s.%s' % (cls.__module__, cls.__name__, col.attr)
+                if fname not in ascs:
+                    continue
+                if not isinstance(ascs[fname], list):
+                    raise ValueError('invalid association %s data' % fname)
+
+                values = []
+                for item in ascs[fname]:
+                    if not isinstance(item, tuple) or len(item) != 2 \
+                            or not isinstance(item[1], tuple):
+                        raise ValueError('invalid association %s data' \
+                            % fname)
+                    okey, vkeys = item
+                    values.append((decodeValue(okey),
+                        tuple([decodeValue(vkey) for vkey in vkeys])))
+                asc_data[col] = values
 
+        return cls_data, asc_data
 
-    def find(self, cls, query, param = None, field = 0):
+
+    def find(self, cls, query, param = None, field = 0, full = False):
         """
         Find objects of given class in database.
 
@@ -580,16 +2181,170 @@ class Bazaar(object):
                 for oi in ord.items:          # show order's articles
                     print oi.article
 
+        Found objects are got from cache with their primary key values. If
+        C{full} is set, then objects' relation rows are loaded with the
+        query instead, so lazy cache misses do not cost additional queries.
+        Objects existing in cache are not replaced. SQL query should return
+        only primary key values in such case and order of found objects is
+        not preserved, i.e.::
+
+            query = 'select uuid from order_item where quantity > %(q)s'
+            items = bzr.find(OrderItem, query, {'q': 5}, full = True)
 
         @param   cls: Application class.
         @param query: SQL query or dictionary.
         @param param: SQL query parameters.
         @param field: SQL column number which describes found objects' primary
             key values.
+        @param  full: Load relation rows of found objects.
+
+        @return: Iterator of found objects.
+        """
+        return self.brokers[cls].find(query, param, field, full)
+
+
+    def select(self, cls, where = None, order = (), limit = None,
+            offset = None):
+        """
+        Find objects of given class in database with query expression.
+
+        Query expressions are created with L{bazaar.query.Attr} class, i.e.::
+
+            from bazaar.query import Attr
+
+            # find first 10 order items of apples with quantity greater
+            # than 5 ordered by position
+            items = bzr.select(OrderItem,
+                (Attr('quantity') > 5) & Attr('article.name').like('apple%'),
+                order = [Attr('pos')], limit = 10)
+
+        One-to-one associations are followed with joins, when attribute
+        path is used. SQL query is compiled once per shape of query
+        expression, values are passed as query parameters.
+
+        Relation rows of found objects are loaded with the query. Objects
+        existing in cache are not replaced.
+
+        @param    cls: Application class.
+        @param  where: Query expression or C{None}.
+        @param  order: List of attributes or orders,
+            i.e. C{[Attr('pos').desc()]}.
+        @param  limit: Maximum amount of objects or C{None}.
+        @param offset: Amount of objects to skip or C{None}.
 
         @return: Iterator of found objects.
+
+        @see: L{bazaar.query}
+        """
+        return self.brokers[cls].select(where, order, limit, offset)
+
+
+    def count(self, cls, query = None):
+        """
+        Count objects of given class in database.
+
+        Objects are counted with C{select count(*)} query, they are not
+        loaded. Query is a dictionary like the one used with L{find} method,
+        i.e.::
+
+            bazaar.count(OrderItem, {'order': ord})
+
+        All objects of the class are counted if query is not specified.
+
+        @param   cls: Application class.
+        @param query: Dictionary query.
+
+        @return: Amount of objects.
+
+        @raise ValueError: If query is not a dictionary.
+
+        @see: L{exists} L{aggregate}
+        """
+        return self.brokers[cls].convertor.count(query)
+
+
+    def exists(self, cls, query = None):
+        """
+        Check if any object of given class matching the query exists in
+        database.
+
+        @param   cls: Application class.
+        @param query: Dictionary query.
+
+        @raise ValueError: If query is not a dictionary.
+
+        @see: L{count}
+        """
+        return self.brokers[cls].convertor.exists(query)
+
+
+    def aggregate(self, cls, func, attr, query = None):
+        """
+        Compute aggregate function over attribute of objects of given class
+        in database.
+
+        Supported functions are C{sum}, C{min}, C{max} and C{avg}, i.e.::
+
+            total = bazaar.aggregate(OrderItem, 'sum', 'quantity',
+                {'order': ord})
+
+        @param   cls: Application class.
+        @param  func: Aggregate function name.
+        @param  attr: Attribute name.
+        @param query: Dictionary query.
+
+        @return: Aggregate value, C{None} if there are no objects.
+
+        @raise ValueError: If function is not supported, attribute has no
+            column or query is not a dictionary.
+
+        @see: L{sum} L{min} L{max} L{avg} L{count}
+        """
+        if func not in ('sum', 'min', 'max', 'avg'):
+            raise ValueError('unknown aggregate function: %s' % func)
+
+        cols = cls.getMapping().columns
+        if attr not in cols or cols[attr].is_many:
+            raise ValueError('%s has no column for attribute %s' % (cls, attr))
+
+        return self.brokers[cls].convertor.aggregate('%s("%s")' \
+            % (func, cols[attr].col), query)
+
+
+    def sum(self, cls, attr, query = None):
+        """
+        Compute sum of attribute values of objects in database.
+
+        @see: L{aggregate}
+        """
+        return self.aggregate(cls, 'sum', attr, query)
+
+
+    def min(self, cls, attr, query = None):
+        """
+        Compute minimum of attribute values of objects in database.
+
+        @see: L{aggregate}
         """
-        return self.brokers[cls].find(query, param, field)
+        return self.aggregate(cls, 'min', attr, query)
+
+
+    def max(self, cls, attr, query = None):
+        """
+        Compute maximum of attribute values of objects in database.
+
+        @see: L{aggregate}
+        """
+        return self.aggregate(cls, 'max', attr, query)
+
+
+    def avg(self, cls, attr, query = None):
+        """
+        Compute average of attribute values of objects in database.
+
+        @see: L{aggregate}
+        """
+        return self.aggregate(cls, 'avg', attr, query)
 
 
     def add(self, obj):
@@ -601,10 +2356,81 @@ class Bazaar(object):
         self.brokers[obj.__class__].add(obj)
 
 
+    def addMany(self, objects, batchsize = None):
+        """
+        Add objects to database.
+
+        Objects are grouped by class and every group is inserted with
+        batch queries, which is much faster than adding objects one by one,
+        i.e.::
+
+            items = [OrderItem(pos = i, quantity = 1, article = apple)
+                for i in range(10000)]
+            bazaar.addMany(items)
+
+        Objects get primary key values before any object is inserted, so
+        references between added objects are resolved. Primary key values
+        set by application are kept. Groups are inserted in order of
+        foreign key dependencies of their classes (see L{sortClasses}), so
+        referenced objects are inserted before objects referencing them. If
+        insertion of a group fails, then primary key values assigned to
+        objects of the group and of groups not inserted yet are set to
+        C{None}.
+
+        @param objects: Iterable of objects to add.
+        @param batchsize: Amount of objects inserted at once, see
+            C{batchsize} configuration parameter.
+
+        @see: L{bazaar.core.Bazaar.add} L{bazaar.motor.Convertor.addMany}
+        """
+        order, groups = groupByClass(objects)
+        order = sortClasses(order)
+
+        # assign primary key values first, so foreign keys of objects
+        # referencing other added objects are set
+        assigned = {}
+        for cls in order:
+            convertor = self.brokers[cls].convertor
+            assigned[cls] = [obj for obj in groups[cls] if obj.uuid is None]
+            for obj in assigned[cls]:
+                obj.uuid = convertor.getId()
+
+        # move references to objects, which got primary key values, from
+        # reference buffers to foreign keys
+        resolved = []
+        for cls in order:
+            for col in self.brokers[cls].convertor.oto_ascs:
+                asc = getattr(cls, col.attr)
+                for obj in groups[cls]:
+                    if obj in asc.ref_buf:
+                        value = asc.ref_buf[obj]
+                        asc.save(obj, value)
+                        resolved.append((asc, obj, value))
+
+        for i, cls in enumerate(order):
+            try:
+                self.brokers[cls].addMany(groups[cls], batchsize)
+            except:
+                for c in order[i:]:
+                    for obj in assigned[c]:
+                        obj.uuid = None
+
+                # put references to objects without primary key values
+                # back into reference buffers
+                for asc, obj, value in resolved:
+                    if value.uuid is None:
+                        asc.save(obj, value)
+                raise
+
+
     def update(self, obj):
         """
         Update object in database.
 
+        Only modified columns are written. Object is not updated at all
+        if it is not modified since it was loaded from database (or added
+        or updated).
+
         @param obj: Object to update.
         """
         self.brokers[obj.__class__].update(obj)
@@ -621,15 +2447,207 @@ class Bazaar(object):
         self.brokers[obj.__class__].delete(obj)
 
 
+    def updateMany(self, objects, batchsize = None):
+        """
+        Update objects in database.
+
+        Objects are grouped by class and every group is updated with batch
+        queries.
+
+        @param objects: Iterable of objects to update.
+        @param batchsize: Amount of objects updated at once, see
+            C{batchsize} configuration parameter.
+
+        @see: L{bazaar.core.Bazaar.update} L{bazaar.motor.Convertor.updateMany}
+        """
+        order, groups = groupByClass(objects)
+        for cls in order:
+            self.brokers[cls].updateMany(groups[cls], batchsize)
+
+
+    def deleteMany(self, objects, batchsize = None):
+        """
+        Delete objects from database.
+
+        Objects are grouped by class and every group is deleted with
+        C{delete ... where uuid in (...)} queries. Deleted objects are
+        removed from object caches and association data caches.
+
+        Objects' primary key values are set to C{None}.
+
+        @param objects: Iterable of objects to delete.
+        @param batchsize: Amount of objects deleted at once, see
+            C{batchsize} configuration parameter.
+
+        @see: L{bazaar.core.Bazaar.delete} L{bazaar.motor.Convertor.deleteMany}
+        """
+        order, groups = groupByClass(objects)
+        for cls in order:
+            self.brokers[cls].deleteMany(groups[cls], batchsize)
+
+
+    def flush(self):
+        """
+        Send deferred database modifications to database.
+
+        Method does nothing if database modifications are not deferred.
+        Flush before finding objects with queries, which should see
+        deferred modifications.
+
+        @see: L{UnitOfWork}
+        """
+        if self.uow is not None:
+            self.uow.flush()
+
+
+    def flushDirty(self, batchsize = None):
+        """
+        Update all modified objects in database.
+
+        Brokers track objects modified since they were loaded from
+        database (or added or updated), so there is no need to call
+        L{update} method for every modified object, i.e.::
+
+            for oi in order.items:
+                oi.quantity = 2
+            bazaar.flushDirty()
+
+        Modified objects of every class are updated with batch queries.
+        Not modified objects are not sent to database. Deferred database
+        modifications are flushed before the objects are updated. Modified
+        objects, which are referenced neither by application nor by cache,
+        are forgotten.
+
+        @param batchsize: Amount of objects updated at once, see
+            C{batchsize} configuration parameter.
+
+        @return: Tuple of amount of updated objects and amount of checked
+            objects skipped, because none of their relation columns was
+            modified.
+
+        @see: L{flush} L{Broker.flushDirty}
+        """
+        self.flush()
+
+        updated = skipped = 0
+        for cls in self.cls_list:
+            u, s = self.brokers[cls].flushDirty(batchsize)
+            updated += u
+            skipped += s
+
+        log.info('modified objects updated: %d, objects without modified' \
+            ' columns skipped: %d' % (updated, skipped))
+        return updated, skipped
+
+
     def commit(self):
         """
         Commit pending database transactions.
+
+        Deferred database modifications are flushed before commit. If
+        C{autoupdate} is set, then all modified objects are updated in
+        database, too.
+
+        If connection pool is used, then database connection of current
+        thread is returned to the pool.
+
+        @see: L{flush} L{flushDirty}
         """
+        if self.autoupdate:
+            self.flushDirty()
+        else:
+            self.flush()
         self.motor.commit()
+        if self.bus is not None:
+            self.bus.publish()
 
 
     def rollback(self):
         """
         Rollback database transactions.
+
+        Deferred database modifications are discarded. Objects, which were
+        going to be added, are removed from cache and their primary key
+        values are set to C{None}.
+
+        If connection pool is used, then database connection of current
+        thread is returned to the pool.
         """
+        if self.uow is not None:
+            self.uow.discardAll()
+        if self.bus is not None:
+            self.bus.discard()
         self.motor.rollback()
+
+
+    def release(self):
+        """
+        Finish reading data from database.
+
+        If connection pool is used, then database connection is kept
+        checked out by current thread until end of transaction. Threads,
+        which only read data, should call the method when they are done,
+        so the connection is returned to the pool::
+
+            def report():
+                try:
+                    for order in bzr.getObjects(Order):
+                        ...
+                finally:
+                    bzr.release()
+
+        Read transaction is rolled back, so database modifications should
+        be committed before. Deferred database modifications are kept, see
+        L{flush}.
+
+        @see: L{bazaar.motor.PooledMotor.release}
+        """
+        self.motor.release()
+
+
+    def setBus(self, bus):
+        """
+        Set cache invalidation bus.
+
+        Database modifications are published with the bus on commit.
+
+        @param bus: Cache invalidation bus or C{None}.
+
+        @see: L{sync} L{bazaar.bus}
+        """
+        self.bus = bus
+        for broker in self.brokers.values():
+            broker.bus = bus
+
+
+    def sync(self):
+        """
+        Apply database modifications published by other processes with
+        cache invalidation bus.
+
+        Received events are grouped by class and operation, so objects are
+        reloaded with one query per batch of objects.
+
+        @return: Amount of received events.
+
+        @see: L{setBus} L{bazaar.core.Broker.invalidate}
+        """
+        if self.bus is None:
+            return 0
+
+        classes = dict([(c.__module__ + '.' + c.__name__, c)
+            for c in self.cls_list])
+
+        events = self.bus.receive()
+        groups = {}
+        for name, key, op in events:
+            if name in classes:
+                groups.setdefault((classes[name], op), []).append(key)
+
+        # apply additions and updates first, deletions last
+        order = {'add': 0, 'update': 1, 'delete': 3}
+        for cls, op in sorted(groups,
+                key = lambda (cls, op): order.get(op, 2)):
+            self.brokers[cls].invalidate(op, groups[cls, op])
+
+        return len(events)
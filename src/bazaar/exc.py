@@ -102,3 +102,46 @@ class AssociationError(BazaarError):
         self.asc = asc
         self.obj = obj
         self.value = value
+
+
+class ConnectionPoolError(BazaarError):
+    """
+    Database connection pool exception.
+
+    Exception is thrown when connection cannot be checked out from the
+    pool, i.e. pool is exhausted and no connection is returned within
+    timeout.
+
+    @ivar pool: Connection pool.
+    """
+    def __init__(self, msg, pool):
+        """
+        Create connection pool exception.
+
+        @param msg: Exception message.
+        @param pool: Connection pool.
+        """
+        BazaarError.__init__(self, msg)
+        self.pool = pool
+
+
+class ObjectNotFoundError(BazaarError):
+    """
+    Object not found exception.
+
+    Exception is thrown when requested objects do not exist.
+
+    @ivar cls: Application class.
+    @ivar keys: List of primary key values of not found objects.
+    """
+    def __init__(self, msg, cls, keys):
+        """
+        Create object not found exception.
+
+        @param msg: Exception message.
+        @param cls: Application class.
+        @param keys: List of primary key values of not found objects.
+        """
+        BazaarError.__init__(self, msg)
+        self.cls = cls
+        self.keys = keys
@@ -23,16 +23,104 @@
 Data convertor and database access classes.
 """
 
+import itertools
 import uuid
 import re
+import threading
+import time
 
 import bazaar.core   # it is required to check if objects are
                      # PersistentObject class' instances
+import bazaar.cache
+import bazaar.exc
+import bazaar.query
 
 
 log = bazaar.Log('bazaar.motor')
 
 
+# regular expressions converting queries between named and pyformat
+# parameters
+NAMED_RE = re.compile(r':([^ ,)]+)')
+PYFORMAT_RE = re.compile(r'%\(([^)]+)\)[sdf]')
+
+
+class QueryCache(bazaar.cache.LRU):
+    """
+    Bounded cache of SQL queries.
+
+    Least recently used query is removed from the cache when amount of
+    cached queries exceeds cache size. Amount of cache hits and misses is
+    counted, so cache size can be tuned.
+
+    @ivar hits: Amount of queries found in cache.
+    @ivar misses: Amount of queries not found in cache.
+    @ivar lock: Lock synchronizing threads accessing the cache.
+
+    @see: L{bazaar.cache.LRU}
+    """
+    def __init__(self, size = 128):
+        """
+        Create cache of SQL queries.
+
+        @param size: Maximum amount of cached queries.
+        """
+        bazaar.cache.LRU.__init__(self, size)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+
+    def get(self, key):
+        """
+        Get cached query.
+
+        @param key: Cache key.
+
+        @return: SQL query or C{None} if query is not cached.
+        """
+        self.lock.acquire()
+        try:
+            query = bazaar.cache.LRU.get(self, key)
+            if query is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return query
+        finally:
+            self.lock.release()
+
+
+    def __setitem__(self, key, query):
+        """
+        Put query into cache.
+
+        Least recently used queries are removed if cache is full.
+
+        @param key: Cache key.
+        @param query: SQL query.
+        """
+        self.lock.acquire()
+        try:
+            self.put(key, query)
+        finally:
+            self.lock.release()
+
+
+    def clear(self):
+        """
+        Remove all queries from cache and reset hit and miss counters.
+        """
+        self.lock.acquire()
+        try:
+            bazaar.cache.LRU.clear(self)
+            self.hits = 0
+            self.misses = 0
+        finally:
+            self.lock.release()
+
+
+
 class Convertor(object):
     """
     Relational and object data convertor.
@@ -43,42 +131,46 @@ class Convertor(object):
     L{Motor} class is used to connect and execute commands in database.
 
     @ivar queries: Queries to modify data in database.
+    @ivar in_queries: Cache of queries with list of parameters.
+    @ivar update_queries: Cache of update queries per set of modified
+        columns.
     @ivar cls: Application class, which objects are converted.
     @ivar motor: Database access object.
+    @ivar mapping: Mapping of application class.
     @ivar columns: List of columns used with database queries.
+    @ivar modified: Set of modified objects tracked by the convertor.
     """
-    def __init__(self, cls, mtr):
+    def __init__(self, cls, mtr, modified = None):
         """
         Create data convertor object.
 
         @param cls: Application class.
         @param mtr: L{Motor} class object.
+        @param modified: Set of modified objects, usually shared with
+            class broker.
         """
         self.queries = {}
+        self.in_queries = {}
+        self.update_queries = {}
         self.cls = cls
         self.motor = mtr
+        if modified is None:
+            modified = bazaar.cache.ObjectSet()
+        self.modified = modified
 
-        cls_columns = self.cls.getColumns().values()
-
-        self.columns = \
-            [col for col in cls_columns if col.association is None]
+        self.mapping = mapping = self.cls.getMapping()
 
-        self.oto_ascs = [col for col in cls_columns if col.is_one_to_one]
-        for col in self.oto_ascs:
-            self.columns.append(col)
+        self.columns = mapping.data
+        self.oto_ascs = mapping.one_to_one
 
         if __debug__:
             log.debug('class %s columns: %s' \
                 % (self.cls, [col.col for col in self.columns]))
 
-        self.masc = [col for col in cls_columns if col.is_many]
-
-        self.load_cols = ['uuid'] \
-            + [col.col for col in self.columns if col.readable]
-        self.save_cols = [col.col for col in self.columns if col.writable]
+        self.masc = mapping.many
 
-        # used to get values of object's loaded data
-        self.itercols = range(len(self.load_cols))
+        self.load_cols = mapping.load_cols
+        self.save_cols = mapping.save_cols
 
         #
         # prepare queries
@@ -90,12 +182,26 @@ class Convertor(object):
         if __debug__:
             log.debug('get objects query: "%s"' % self.queries[self.getObjects])
 
+        self.queries[self.getPages] = self.pageQueries(self.load_cols,
+            self.cls.relation, ('uuid', ), ':%s')
+
+        if __debug__:
+            log.debug('get objects page queries: "%s", "%s"' \
+                % self.queries[self.getPages])
+
         self.queries[self.get] = self.queries[self.getObjects] \
             + ' where "uuid" = :uuid'
 
         if __debug__:
             log.debug('get single object query: "%s"' % self.queries[self.get])
 
+        self.queries[self.getMany] = self.queries[self.getObjects] \
+            + ' where "uuid" in (%s)'
+
+        if __debug__:
+            log.debug('get many objects query: "%s"' \
+                % self.queries[self.getMany])
+
         self.queries[self.add] = \
             'insert into "%s" ("uuid", %s) values (:uuid, %s)' \
             % (self.cls.relation,
@@ -116,9 +222,16 @@ class Convertor(object):
         self.queries[self.delete] = \
             'delete from "%s" where "uuid" = :uuid' % self.cls.relation
 
+        self.queries[self.deleteMany] = \
+            'delete from "%s" where "uuid" in (%%s)' % self.cls.relation
+
         if __debug__:
             log.debug('delete object query: "%s"' % self.queries[self.delete])
 
+        if __debug__:
+            log.debug('delete objects query: "%s"' \
+                % self.queries[self.deleteMany])
+
         self.asc_cols = {}
 
         for col in self.masc:
@@ -136,6 +249,15 @@ class Convertor(object):
                     (self.asc_cols[asc][1], relation, \
                     self.asc_cols[asc][0])
 
+                self.queries[asc][self.getManyAscData] = \
+                    'select "%s", "%s" from "%s" where "%s" in (%%s)' % \
+                    (self.asc_cols[asc][0], self.asc_cols[asc][1], relation,
+                    self.asc_cols[asc][0])
+
+                self.queries[asc][self.countAscData] = \
+                    'select count(*) from "%s" where "%s" = %%(key)s' % \
+                    (relation, self.asc_cols[asc][0])
+
             elif col.is_one_to_many:
                 self.asc_cols[asc] = ('uuid', col.vcol)
                 relation = col.vcls.relation
@@ -144,6 +266,15 @@ class Convertor(object):
                     'select "%s" from "%s" where "%s" = %%(key)s' % \
                     (self.asc_cols[asc][0], relation, \
                     self.asc_cols[asc][1])
+
+                self.queries[asc][self.getManyAscData] = \
+                    'select "%s", "%s" from "%s" where "%s" in (%%s)' % \
+                    (self.asc_cols[asc][1], self.asc_cols[asc][0], relation,
+                    self.asc_cols[asc][1])
+
+                self.queries[asc][self.countAscData] = \
+                    'select count(*) from "%s" where "%s" = %%(key)s' % \
+                    (relation, self.asc_cols[asc][1])
             else:
                 assert False
 
@@ -161,14 +292,34 @@ class Convertor(object):
                 % (', '.join(['"%s"' % c for c in self.asc_cols[asc]]),
                 relation)
 
+            if col.is_many_to_many:
+                keys = self.asc_cols[asc]
+            else:
+                keys = ('uuid', )
+
+            self.queries[asc][self.getPages] = self.pageQueries(
+                self.asc_cols[asc], relation, keys, '%%(%s)s')
+
             if __debug__:
                 log.debug('association load query: "%s"' \
                     % self.queries[asc][self.getAllAscData])
 
+            if __debug__:
+                log.debug('association page queries: "%s", "%s"' \
+                    % self.queries[asc][self.getPages])
+
             if __debug__:
                 log.debug('association load query: "%s"' \
                     % self.queries[asc][self.getAscData])
 
+            if __debug__:
+                log.debug('association batch load query: "%s"' \
+                    % self.queries[asc][self.getManyAscData])
+
+            if __debug__:
+                log.debug('association count query: "%s"' \
+                    % self.queries[asc][self.countAscData])
+
             if __debug__:
                 log.debug('association insert query: "%s"' \
                     % self.queries[asc][self.addAscData])
@@ -177,20 +328,86 @@ class Convertor(object):
                 log.debug('association delete query: "%s"' \
                     % self.queries[asc][self.delAscData])
 
+        self.queries[self.getKeys] = \
+            'select "uuid" from "%s"' % self.cls.relation
+
+        if __debug__:
+            log.debug('get primary keys query: "%s"' \
+                % self.queries[self.getKeys])
+
+        if self.cls.marker is not None:
+            self.queries[self.getMark] = 'select max("%s") from "%s"' \
+                % (self.cls.marker, self.cls.relation)
+            self.queries[self.getDelta] = self.queries[self.getObjects] \
+                + ' where "%s" > :mark' % self.cls.marker
+
+            if __debug__:
+                log.debug('get change mark query: "%s"' \
+                    % self.queries[self.getMark])
+                log.debug('get changed objects query: "%s"' \
+                    % self.queries[self.getDelta])
+
         self.queries[self.find] = \
             'select uuid from "%s" where %%s' % self.cls.relation
 
         if __debug__:
             log.debug('object OO find query: "%s"' % self.queries[self.find])
 
+        self.queries[self.findObjects] = \
+            self.queries[self.getObjects] + ' where %s'
+
+        if __debug__:
+            log.debug('object OO full row find query: "%s"' \
+                % self.queries[self.findObjects])
+
 
         if mtr.dbmod.paramstyle == 'pyformat':
             # convert all queries from named parameters to pyformat if
             # necessary
-            cps_re = re.compile(r':([^ ,)]+)')
             for k, q in self.queries.items():
                 if isinstance(q, basestring):
-                    self.queries[k] = cps_re.sub(r'%(\1)s', q)
+                    self.queries[k] = NAMED_RE.sub(r'%(\1)s', q)
+                elif isinstance(q, tuple):
+                    self.queries[k] = tuple([NAMED_RE.sub(r'%(\1)s', i) \
+                        for i in q])
+
+        self.update_queries[self.save_cols] = self.queries[self.update]
+
+
+    def pageQueries(self, cols, relation, keys, pattern):
+        """
+        Create queries to read relation in pages with keyset pagination.
+
+        First query reads first page of relation rows. Second one reads
+        next page of rows, which keys are greater than keys of last row of
+        previous page. Both queries order relation rows by key columns and
+        have C{limit} parameter.
+
+        Key column values are query parameters named C{k0}, C{k1}, etc.
+
+        @param cols: Relation columns to read.
+        @param relation: Relation name.
+        @param keys: Relation key columns, subset of C{cols}.
+        @param pattern: Query parameter pattern, i.e. C{:%s}.
+
+        @return: Tuple of first and next page queries.
+
+        @see: L{getPages}
+        """
+        select = 'select %s from "%s"' \
+            % (', '.join(['"%s"' % col for col in cols]), relation)
+        order = ' order by %s limit %s' \
+            % (', '.join(['"%s"' % col for col in keys]), pattern % 'limit')
+
+        # (k0 > :k0) or (k0 = :k0 and k1 > :k1) or ...
+        cond = []
+        for i, key in enumerate(keys):
+            eq = ['"%s" = %s' % (keys[j], pattern % ('k%d' % j)) \
+                for j in range(i)]
+            eq.append('"%s" > %s' % (key, pattern % ('k%d' % i)))
+            cond.append('(%s)' % ' and '.join(eq))
+
+        return select + order, select + ' where ' + ' or '.join(cond) + order
 
 
     def getData(self, obj):
@@ -202,7 +419,12 @@ class Convertor(object):
         @return: Dictionary of object's relational data.
         """
         # get attribute values
-        data = obj.__dict__.copy()
+        slots = self.mapping.slots
+        if slots is None:
+            data = obj.__dict__.copy()
+            data.pop('__dirty__', None)
+        else:
+            data = dict([(name, getattr(obj, name)) for name in slots])
 
         # get one-to-one association foreign key values
         for col in self.oto_ascs:
@@ -214,6 +436,26 @@ class Convertor(object):
         return data
 
 
+    def getRow(self, obj):
+        """
+        Extract relation row from application object.
+
+        The method is inverse of object loader, see
+        L{bazaar.conf.createLoader}. Values of relation columns are taken
+        from object's state, so modifications of the object, which are
+        not stored in database, are included in the row.
+
+        @param obj: Application object.
+
+        @return: Tuple of values of loaded relation columns.
+        """
+        if self.mapping.slots is None:
+            state = obj.__dict__
+            return tuple([state.get(col) for col in self.load_cols])
+        else:
+            return tuple([getattr(obj, col) for col in self.load_cols])
+
+
     def dictToSQL(self, param):
         """
         Convert dictionary into C{WHERE} SQL clause.
@@ -222,9 +464,9 @@ class Convertor(object):
 
         @see: L{bazaar.core.Bazaar.find}
         """
-        cols = self.cls.getColumns()
+        cols = self.mapping.columns
         cond = []
-        
+
         pattern = '"%s" = :%s'
         for attr in param:
             if attr in cols:
@@ -305,9 +547,20 @@ class Convertor(object):
         """
         Get all association data from database.
 
+        If association data streaming is requested, then the data are
+        read with L{streamData} method.
+
         @param asc: Association object.
         """
-        for data in self.motor.getData(self.queries[asc][self.getAllAscData]):
+        if asc.col.stream:
+            rows = self.streamData(self.queries[asc][self.getAllAscData],
+                self.queries[asc][self.getPages], self.asc_cols[asc],
+                asc.col.arraysize)
+        else:
+            rows = self.motor.getData(self.queries[asc][self.getAllAscData],
+                arraysize = asc.col.arraysize)
+
+        for data in rows:
             yield data[0], data[1]
 
 
@@ -319,10 +572,51 @@ class Convertor(object):
         @param obj: Application object.
         """
         for data in self.motor.getData(self.queries[asc][self.getAscData],
-                { 'key': obj.uuid }):
+                { 'key': obj.uuid }, asc.col.arraysize):
             yield data[0]
 
 
+    def countAscData(self, asc, obj):
+        """
+        Count association relational data of the application object.
+
+        @param asc: Association object.
+        @param obj: Application object.
+
+        @return: Amount of objects referenced by application object.
+        """
+        if obj.uuid is None:
+            return 0
+        return self.motor.getData(self.queries[asc][self.countAscData],
+            { 'key': obj.uuid }).next()[0]
+
+
+    def getManyAscData(self, asc, keys, batchsize = None):
+        """
+        Get association relational data for many application objects.
+
+        Data are loaded with C{select ... where ... in (...)} query per
+        C{batchsize} primary key values of application objects.
+
+        @param asc: Association object.
+        @param keys: List of application objects' primary key values.
+        @param batchsize: Amount of application objects, which data are
+            loaded at once, L{Motor.batchsize} is used if C{None}.
+
+        @return: Iterator of pairs of application object's and referenced
+            object's primary key values.
+        """
+        if batchsize is None:
+            batchsize = self.motor.batchsize
+
+        for i in xrange(0, len(keys), batchsize):
+            batch = keys[i:i + batchsize]
+            query = self.inQuery(self.queries[asc][self.getManyAscData],
+                len(batch))
+            for data in self.motor.getData(query, batch, asc.col.arraysize):
+                yield data[0], data[1]
+
+
     def find(self, query, param = None, field = 0):
         """
         Find objects in database.
@@ -332,8 +626,147 @@ class Convertor(object):
         @param field: SQL column number which describes found objects' primary
             key values.
 
-        @see: L{bazaar.core.Bazaar.find}
+        @return: Iterator of found objects' primary key values.
+
+        @see: L{bazaar.core.Bazaar.find} L{findObjects}
+        """
+        query, param = self.findQuery(query, param, self.queries[self.find])
+        assert isinstance(field, int)
+
+        # get primary key values which denote objects
+        for data in self.motor.getData(query, param, self.cls.arraysize):
+            yield data[field]
+
+
+    def findObjects(self, query, param = None):
+        """
+        Find objects in database loading their relation rows.
+
+        SQL query should return found objects' primary key values in one
+        column. It is used as subquery of query loading relation rows, so
+        order of returned rows is not preserved.
+
+        @param query: SQL query or dictionary.
+        @param param: SQL query parameters.
+
+        @return: Iterator of created objects.
+
+        @see: L{bazaar.core.Bazaar.find} L{find}
+        """
+        if not isinstance(query, dict):
+            query = self.queries[self.getMany] % query
+        query, param = self.findQuery(query, param,
+            self.queries[self.findObjects])
+
+        for data in self.motor.getData(query, param, self.cls.arraysize):
+            yield self.createObject(data)
+
+
+    def select(self, where = None, order = (), limit = None, offset = None):
+        """
+        Find objects in database with query expression.
+
+        SQL query is compiled once per shape of query expression and
+        cached in L{Motor.queries} query cache.
+
+        @param where: Query expression or C{None}.
+        @param order: List of orders.
+        @param limit: Maximum amount of objects or C{None}.
+        @param offset: Amount of objects to skip or C{None}.
+
+        @return: Iterator of created objects.
+
+        @see: L{bazaar.query} L{bazaar.core.Bazaar.select}
+        """
+        order = bazaar.query.getOrder(order)
+        key = (self.cls, bazaar.query.shape(where, order, limit, offset))
+        query = self.motor.queries.get(key)
+        if query is None:
+            if self.motor.dbmod.paramstyle == 'pyformat':
+                pattern = '%%(%s)s'
+            else:
+                pattern = ':%s'
+            query = bazaar.query.compileQuery(self.cls, self.load_cols,
+                where, order, limit, offset, pattern)
+            self.motor.queries[key] = query
+
+        param = bazaar.query.params(where, limit, offset)
+        for data in self.motor.getData(query, param, self.cls.arraysize):
+            yield self.createObject(data)
+
+
+    def aggregate(self, expr, query = None, suffix = ''):
+        """
+        Compute value of SQL expression over relation rows of objects
+        matching the query.
+
+        Query is a dictionary like the one used with L{find} method. All
+        relation rows are used if query is empty.
+
+        @param expr: SQL expression, i.e. C{count(*)}.
+        @param query: Dictionary query.
+        @param suffix: Suffix of SQL query, i.e. C{limit 1}.
+
+        @return: Value of first column of first row, C{None} if there are
+            no rows.
+
+        @raise ValueError: If query is not a dictionary.
+
+        @see: L{count} L{exists}
+        """
+        if query and not isinstance(query, dict):
+            raise ValueError('dictionary query expected, got %r' % (query, ))
+
+        select = 'select %s from "%s"' % (expr, self.cls.relation)
+        if query:
+            query, param = self.findQuery(query, None,
+                select + ' where %s' + suffix)
+        else:
+            query, param = select + suffix, {}
+
+        for data in self.motor.getData(query, param):
+            return data[0]
+        return None
+
+
+    def count(self, query = None):
+        """
+        Count objects matching the query in database.
+
+        @param query: Dictionary query.
+
+        @see: L{aggregate}
+        """
+        return self.aggregate('count(*)', query)
+
+
+    def exists(self, query = None):
+        """
+        Check if any object matching the query exists in database.
+
+        @param query: Dictionary query.
+
+        @see: L{aggregate}
+        """
+        return self.aggregate('1', query, ' limit 1') is not None
+
+
+    def findQuery(self, query, param, template):
+        """
+        Create find query and its parameters.
+
+        SQL queries translated to parameter style of DB API module are
+        cached in L{Motor.queries} query cache with key created from SQL
+        query or set of dictionary keys.
+
+        @param query: SQL query or dictionary.
+        @param param: SQL query parameters.
+        @param template: Query template used when query is a dictionary.
+
+        @return: Tuple of SQL query and its parameters.
         """
+        paramstyle = self.motor.dbmod.paramstyle
+
         # parameter mangling, part 1
         # two cases:
         # - when query argument is SQL query (string) then do nothing
@@ -341,59 +774,164 @@ class Convertor(object):
         #   magic - query argument specifies SQL query parametrs then
         if isinstance(query, dict):
             param = query
+            key = (tuple(sorted(query)), template, paramstyle)
+        else:
+            key = (query, None, paramstyle)
 
         param = self.objToData(param)
 
-        # parameter mangling, part 2
-        # - create SQL query
-        if isinstance(query, dict):
-            query = self.queries[self.find] % self.dictToSQL(param)
+        # translated queries are cached
+        sql = self.motor.queries.get(key)
+        if sql is None:
+            # parameter mangling, part 2
+            # - create SQL query
+            if isinstance(query, dict):
+                sql = template % self.dictToSQL(param)
+            else:
+                sql = query
 
-        assert isinstance(query, str) and isinstance(param, dict) \
-            and isinstance(field, int)
+            assert isinstance(sql, str)
 
-        if __debug__:
-            log.debug('find objects with query: \'%s\', params %s, field %d' \
-                % (query, param, field))
+            if paramstyle == 'pyformat':
+                # convert all queries from named parameters to pyformat if
+                # necessary
+                sql = NAMED_RE.sub(r'%(\1)s', sql)
+            else:
+                # from pyformat to named parameters
+                sql = PYFORMAT_RE.sub(r':\1', sql)
 
-        if self.motor.dbmod.paramstyle == 'pyformat':
-            # fixme: code duplication
-            # convert all queries from named parameters to pyformat if
-            # necessary
-            cps_re = re.compile(r':([^ ,)]+)')
-            query = cps_re.sub(r'%(\1)s', query)
-        else:
-            # from pyformat to named parameters
-            cps_re = re.compile(r'%\(([^)]+)\)[sdf]')
-            query = cps_re.sub(r':\1', query)
+            self.motor.queries[key] = sql
 
-        # get primary key values which denote objects
-        for data in self.motor.getData(query, param):
-            yield data[field]
+        assert isinstance(param, dict)
+
+        if __debug__:
+            log.debug('find objects with query: \'%s\', params %s' \
+                % (sql, param))
+
+        return sql, param
 
 
-    def createObject(self, data):
+    def createObject(self, data, tracked = True):
         """
         Create object from relational data.
 
+        Object is created with loader function generated for application
+        class, see L{bazaar.conf.createLoader}.
+
         @param data: Relational data.
+        @param tracked: Track modifications of created object.
 
         @return: Created object.
         """
-        obj = self.cls()              # create object instance
-        for i in self.itercols:       # set values of object's attributes
-            setattr(obj, self.load_cols[i], data[i])
+        obj = self.mapping.load(data)
+        if tracked:
+            self.setClean(obj)
         return obj
 
 
     def getObjects(self):
         """
         Load objects from database.
+
+        @see: L{getRows}
         """
-        for data in self.motor.getData(self.queries[self.getObjects]):
+        for data in self.getRows():
             yield self.createObject(data)
 
 
+    def getRows(self):
+        """
+        Load relation rows of all objects from database.
+
+        If objects streaming is requested, then relation rows are read with
+        L{streamData} method.
+
+        @return: Iterator of relation rows.
+        """
+        if self.cls.stream:
+            return self.streamData(self.queries[self.getObjects],
+                self.queries[self.getPages], ('uuid', ), self.cls.arraysize)
+        else:
+            return self.motor.getData(self.queries[self.getObjects],
+                arraysize = self.cls.arraysize)
+
+
+    def streamData(self, query, pages, keys, arraysize = None):
+        """
+        Read relation rows in bounded chunks.
+
+        Server-side cursor is used if DB API module supports them.
+        Otherwise, relation is read in pages with keyset pagination (see
+        L{getPages}). Either way, database client does not buffer all
+        relation rows at once.
+
+        @param query: Query reading all relation rows.
+        @param pages: Tuple of first and next page queries.
+        @param keys: Relation key columns, which are first columns of
+            relation rows.
+        @param arraysize: Amount of rows fetched at once.
+        """
+        dbc = self.motor.getServerCursor()
+        if dbc is None:
+            rows = self.getPages(pages, len(keys), arraysize)
+        else:
+            rows = self.motor.streamData(dbc, query, arraysize = arraysize)
+        return rows
+
+
+    def getPages(self, pages, nkeys, arraysize = None):
+        """
+        Read relation rows page by page with keyset pagination.
+
+        @param pages: Tuple of first and next page queries.
+        @param nkeys: Amount of key columns, which are first columns of
+            relation rows.
+        @param arraysize: Amount of rows per page.
+
+        @see: L{pageQueries}
+        """
+        if arraysize is None:
+            arraysize = self.motor.arraysize
+
+        query, next_query = pages
+        param = {'limit': arraysize}
+
+        while True:
+            size = 0
+            for row in self.motor.getData(query, param, arraysize):
+                size += 1
+                yield row
+
+            if size < arraysize:
+                break
+
+            # keys of last row denote start of next page
+            for i in range(nkeys):
+                param['k%d' % i] = row[i]
+            query = next_query
+
+
+    def iterObjects(self, arraysize = None, tracked = True):
+        """
+        Load objects from database page by page.
+
+        Relation is read with keyset pagination, so database client and
+        database server do not keep more than one page of rows.
+
+        @param arraysize: Amount of objects per page.
+        @param tracked: Track modifications of created objects.
+
+        @return: Iterator of created objects.
+
+        @see: L{getPages}
+        """
+        if arraysize is None:
+            arraysize = self.cls.arraysize
+
+        for data in self.getPages(self.queries[self.getPages], 1, arraysize):
+            yield self.createObject(data, tracked)
+
+
     def get(self, key):
         """
         Load object from database.
@@ -403,59 +941,354 @@ class Convertor(object):
         @param key: Primary key value of object to load.
         """
         try:
-            obj = self.createObject( \
-                self.motor.getData(self.queries[self.get], (key, )).next())
+            obj = self.createObject(self.motor.getData(
+                self.queries[self.get], {'uuid': key}).next())
         except StopIteration:
             obj = None
         return obj
 
 
-    def getId(self):
+    def getMany(self, keys, batchsize = None):
         """
-        Create new object identifier value using UUID.
+        Load objects from database.
 
-        See http://en.wikipedia.org/wiki/UUID for details.
-        """
-        return str(uuid.uuid4())
+        Objects are loaded with C{select ... where uuid in (...)} query per
+        C{batchsize} primary key values. Objects, which do not exist in
+        database, are skipped.
 
+        @param keys: List of primary key values of objects to load.
+        @param batchsize: Amount of objects loaded at once,
+            L{Motor.batchsize} is used if C{None}.
 
-    def add(self, obj):
-        """
-        Add object to database.
+        @return: Iterator of loaded objects.
 
-        @param obj: Object to add.
+        @see: L{getManyRows}
         """
-        data = self.getData(obj)
-        id = self.getId()       # create new id for a new object
-        data['uuid'] = id
-        self.motor.add(self.queries[self.add], data)
-        obj.uuid = id           # assign uuid
- 
+        for data in self.getManyRows(keys, batchsize):
+            yield self.createObject(data)
 
-    def update(self, obj):
-        """
-        Update object in database.
 
-        @param obj: Object to update.
+    def getManyRows(self, keys, batchsize = None):
         """
-        data = self.getData(obj)
-        
-        self.motor.update(self.queries[self.update], data, obj.uuid)
-        #    [data[col] for col in self.save_cols],
-        #    obj.uuid)
+        Load relation rows of objects from database.
 
+        Rows are loaded with C{select ... where uuid in (...)} query per
+        C{batchsize} primary key values.
 
-    def delete(self, obj):
-        """
-        Delete object from database.
+        @param keys: List of primary key values of objects to load.
+        @param batchsize: Amount of rows loaded at once,
+            L{Motor.batchsize} is used if C{None}.
 
-        @param obj: Object to delete.
+        @return: Iterator of relation rows.
         """
-        self.motor.delete(self.queries[self.delete], obj.uuid)
+        if batchsize is None:
+            batchsize = self.motor.batchsize
 
+        for i in xrange(0, len(keys), batchsize):
+            batch = keys[i:i + batchsize]
+            query = self.inQuery(self.queries[self.getMany], len(batch))
+            for data in self.motor.getData(query, batch, self.cls.arraysize):
+                yield data
 
 
-class Motor(object):
+    def updateObject(self, obj, data):
+        """
+        Update attributes of existing object with relational data.
+
+        Object is updated with updater function generated for application
+        class, see L{bazaar.conf.createUpdater}. Object is marked as not
+        modified.
+
+        @param obj: Application object.
+        @param data: Relational data.
+        """
+        self.mapping.update(obj, data)
+        self.setClean(obj)
+
+
+    def getKeys(self):
+        """
+        Load primary key values of all objects from database.
+
+        @return: Iterator of primary key values.
+        """
+        for data in self.motor.getData(self.queries[self.getKeys], None,
+                self.cls.arraysize):
+            yield data[0]
+
+
+    def getMark(self):
+        """
+        Get high-water mark of application class relation changes - maximum
+        value of change marker column.
+
+        @see: L{bazaar.conf.Persistence}
+        """
+        return self.motor.getData(self.queries[self.getMark]).next()[0]
+
+
+    def getDelta(self, mark):
+        """
+        Load relational data of objects changed since high-water mark.
+
+        All relation rows are loaded if C{mark} is C{None}.
+
+        @param mark: High-water mark of relation changes.
+
+        @return: Iterator of relation rows.
+
+        @see: L{getMark} L{getRows}
+        """
+        if mark is None:
+            return self.getRows()
+        else:
+            return self.motor.getData(self.queries[self.getDelta],
+                {'mark': mark}, self.cls.arraysize)
+
+
+    def getId(self):
+        """
+        Create new object identifier value using UUID.
+
+        See http://en.wikipedia.org/wiki/UUID for details.
+        """
+        return str(uuid.uuid4())
+
+
+    def add(self, obj):
+        """
+        Add object to database.
+
+        @param obj: Object to add.
+        """
+        data = self.getData(obj)
+        id = self.getId()       # create new id for a new object
+        data['uuid'] = id
+        self.motor.add(self.queries[self.add], data)
+        obj.uuid = id           # assign uuid
+        self.setClean(obj)
+ 
+
+    def addMany(self, objects, batchsize = None):
+        """
+        Add objects to database.
+
+        Objects are inserted with L{Motor.executeMany} method in batches of
+        C{batchsize} rows. Objects without primary key value get new
+        identifier.
+
+        If insertion of a batch fails, then primary key values assigned to
+        objects not added to database are set to C{None}.
+
+        @param objects: List of objects to add.
+        @param batchsize: Amount of rows inserted at once,
+            L{Motor.batchsize} is used if C{None}.
+        """
+        if batchsize is None:
+            batchsize = self.motor.batchsize
+
+        assigned = [obj.uuid is None for obj in objects]
+        for obj in objects:
+            if obj.uuid is None:
+                obj.uuid = self.getId()
+
+        query = self.queries[self.add]
+        for i in xrange(0, len(objects), batchsize):
+            batch = objects[i:i + batchsize]
+            try:
+                rows = []
+                for obj in batch:
+                    data = self.getData(obj)
+                    data['uuid'] = obj.uuid
+                    rows.append(data)
+
+                self.motor.executeMany(query, rows)
+            except:
+                for obj, reset in zip(objects[i:], assigned[i:]):
+                    if reset:
+                        obj.uuid = None
+                raise
+
+            for obj in batch:
+                self.setClean(obj)
+
+
+    def getChanged(self, obj):
+        """
+        Get writable columns modified since object was loaded from
+        database (or added or updated).
+
+        All writable columns are returned for objects, which modifications
+        are not tracked (see L{bazaar.conf.Persistence.setTracked}).
+
+        @param obj: Application object.
+
+        @return: Tuple of modified columns' names.
+
+        @see: L{bazaar.core.PersistentObject}
+        """
+        dirty = obj.__dirty__
+        if dirty is None or not self.cls.tracked:
+            cols = self.save_cols
+        else:
+            cols = tuple([col for col in self.save_cols if col in dirty])
+        return cols
+
+
+    def setClean(self, obj):
+        """
+        Mark object as not modified and start tracking its modifications
+        with the convertor if modifications of objects of application
+        class are tracked.
+
+        @param obj: Application object.
+        """
+        dirty = obj.__dirty__
+        if dirty is not None:
+            dirty.modified.discard(obj)
+        if self.cls.tracked:
+            object.__setattr__(obj, '__dirty__',
+                bazaar.core.DirtySet(self.modified))
+        elif dirty is not None:
+            object.__setattr__(obj, '__dirty__', None)
+
+
+    def updateQuery(self, cols):
+        """
+        Get query updating given columns of relation row.
+
+        Created queries are cached.
+
+        @param cols: Tuple of columns' names.
+        """
+        if cols not in self.update_queries:
+            query = 'update "%s" set %s where "uuid" = :uuid' \
+                % (self.cls.relation,
+                    ', '.join(['"%s" = :%s' % (col, col) for col in cols]))
+
+            if self.motor.dbmod.paramstyle == 'pyformat':
+                query = NAMED_RE.sub(r'%(\1)s', query)
+
+            if __debug__:
+                log.debug('update object query: "%s"' % query)
+
+            self.update_queries[cols] = query
+
+        return self.update_queries[cols]
+
+
+    def update(self, obj):
+        """
+        Update object in database.
+
+        Only modified columns are updated. If object is not modified, then
+        database is not accessed at all.
+
+        @param obj: Object to update.
+
+        @return: True if object was updated.
+
+        @see: L{getChanged}
+        """
+        cols = self.getChanged(obj)
+        if not cols:
+            return False
+
+        data = self.getData(obj)
+        self.motor.update(self.updateQuery(cols), data, obj.uuid)
+        self.setClean(obj)
+        return True
+
+
+    def delete(self, obj):
+        """
+        Delete object from database.
+
+        @param obj: Object to delete.
+        """
+        self.motor.delete(self.queries[self.delete], obj.uuid)
+
+
+    def updateMany(self, objects, batchsize = None):
+        """
+        Update objects in database.
+
+        Objects are grouped by sets of modified columns and every group is
+        updated with L{Motor.executeMany} method in batches of C{batchsize}
+        rows. Not modified objects are skipped.
+
+        @param objects: List of objects to update.
+        @param batchsize: Amount of rows updated at once,
+            L{Motor.batchsize} is used if C{None}.
+
+        @return: Amount of updated objects.
+
+        @see: L{update}
+        """
+        if batchsize is None:
+            batchsize = self.motor.batchsize
+
+        groups = {}
+        for obj in objects:
+            cols = self.getChanged(obj)
+            if cols:
+                groups.setdefault(cols, []).append(obj)
+
+        count = 0
+        for cols, group in groups.items():
+            query = self.updateQuery(cols)
+            for i in xrange(0, len(group), batchsize):
+                batch = group[i:i + batchsize]
+                self.motor.executeMany(query,
+                    [self.getData(obj) for obj in batch])
+                for obj in batch:
+                    self.setClean(obj)
+            count += len(group)
+
+        return count
+
+
+    def deleteMany(self, keys, batchsize = None):
+        """
+        Delete objects from database.
+
+        Objects are deleted with C{delete ... where uuid in (...)} query
+        per C{batchsize} primary key values.
+
+        @param keys: List of primary key values of objects to delete.
+        @param batchsize: Amount of objects deleted at once,
+            L{Motor.batchsize} is used if C{None}.
+        """
+        if batchsize is None:
+            batchsize = self.motor.batchsize
+
+        for i in xrange(0, len(keys), batchsize):
+            batch = keys[i:i + batchsize]
+            query = self.inQuery(self.queries[self.deleteMany], len(batch))
+            self.motor.execute(query, batch)
+
+
+    def inQuery(self, query, size):
+        """
+        Create query with list of C{size} parameters from query template.
+
+        The list replaces C{%s} placeholder of the template, i.e. for size
+        equal to 3, query C{delete from article where uuid in (%s)} is
+        converted to C{delete from article where uuid in (%s, %s, %s)}.
+
+        Created queries are cached.
+
+        @param query: Query template.
+        @param size: Amount of parameters.
+        """
+        key = (query, size)
+        if key not in self.in_queries:
+            self.in_queries[key] = query % ', '.join(('%s', ) * size)
+        return self.in_queries[key]
+
+
+
+class Motor(object):
     """
     Database access object.
 
@@ -464,6 +1297,14 @@ class Motor(object):
 
     @ivar dbmod: Python DB API module.
     @ivar conn: Python DB API connection object.
+    @ivar arraysize: Default amount of rows fetched from database at once.
+    @ivar batchsize: Default amount of rows sent to database with one batch
+        query.
+    @ivar server_cursors: True if DB API module supports server-side
+        cursors, C{None} if not known yet.
+    @ivar cursor_no: Generator of server-side cursor names.
+    @ivar queries: Cache of translated find queries and of queries compiled
+        from query expressions.
     """
     def __init__(self, dbmod):
         """
@@ -473,6 +1314,11 @@ class Motor(object):
         """
         self.dbmod = dbmod
         self.conn = None
+        self.arraysize = 1000
+        self.batchsize = 1000
+        self.server_cursors = None
+        self.cursor_no = itertools.count()
+        self.queries = QueryCache()
         log.info('Motor object initialized')
 
 
@@ -503,7 +1349,7 @@ class Motor(object):
             log.debug('close database connection')
 
 
-    def getData(self, query, param = None):
+    def getData(self, query, param = None, arraysize = None):
         """
         Get list of rows from database.
 
@@ -511,7 +1357,14 @@ class Motor(object):
         dictionary keys are relation column names and dictionary values
         are column values of the relation row.
 
+        Rows are fetched from database in chunks of C{arraysize} rows, so
+        there is one DB API call per chunk instead of one call per row and
+        only one chunk of rows is kept in memory at once.
+
         @param query: Database SQL query.
+        @param param: Database SQL query parameters.
+        @param arraysize: Amount of rows fetched at once, L{Motor.arraysize}
+            is used if C{None}.
         """
         if __debug__:
             log.debug('query "%s", params %s: executing' % (query, param))
@@ -519,22 +1372,89 @@ class Motor(object):
         if param is None:
             param = {}
 
+        if arraysize is None:
+            arraysize = self.arraysize
+
         dbc = self.conn.cursor()
+        dbc.arraysize = arraysize
         dbc.execute(query, param)
 
         if __debug__:
             log.debug('query "%s": executed, rows = %d' % (query, dbc.rowcount))
 
-        row = dbc.fetchone()
-        while row:
-            yield row
-            row = dbc.fetchone()
+        rows = dbc.fetchmany(arraysize)
+        while rows:
+            for row in rows:
+                yield row
+            rows = dbc.fetchmany(arraysize)
 
         if __debug__:
             log.debug('query "%s": got all data, len = %d' \
                 % (query, dbc.rowcount))
 
 
+    def getServerCursor(self):
+        """
+        Create server-side (named) cursor.
+
+        Named cursors are created with C{cursor(name)} method of connection
+        object, which is DB API extension, i.e. supported by psycopg 2.
+
+        @return: Server-side cursor or C{None} if DB API module does not
+            support them.
+        """
+        dbc = None
+        if self.server_cursors is not False:
+            name = 'bazaar_cursor_%d' % self.cursor_no.next()
+            try:
+                dbc = self.conn.cursor(name)
+                self.server_cursors = True
+            except TypeError:
+                self.server_cursors = False
+                log.info('server-side cursors are not supported')
+        return dbc
+
+
+    def streamData(self, dbc, query, param = None, arraysize = None):
+        """
+        Get list of rows from database with server-side cursor.
+
+        Only C{arraysize} rows are transferred from database server at once.
+        The cursor is closed when all rows are read.
+
+        @param dbc: Server-side cursor.
+        @param query: Database SQL query.
+        @param param: Database SQL query parameters.
+        @param arraysize: Amount of rows fetched at once, L{Motor.arraysize}
+            is used if C{None}.
+
+        @see: L{getServerCursor} L{getData}
+        """
+        if __debug__:
+            log.debug('query "%s", params %s: streaming' % (query, param))
+
+        if param is None:
+            param = {}
+
+        if arraysize is None:
+            arraysize = self.arraysize
+
+        try:
+            dbc.arraysize = arraysize
+            dbc.execute(query, param)
+
+            rows = dbc.fetchmany(arraysize)
+            while rows:
+                for row in rows:
+                    yield row
+                rows = dbc.fetchmany(arraysize)
+        finally:
+            dbc.close()
+
+        if __debug__:
+            log.debug('query "%s": streamed' % query)
+
+
     def add(self, query, data):
         """
         Insert row into database relation.
@@ -589,6 +1509,30 @@ class Motor(object):
             log.debug('query "%s", key = %s: executed' % (query, key))
 
 
+    def execute(self, query, param = None):
+        """
+        Execute query.
+
+        @param query: Query to execute.
+        @param param: Query parameters.
+
+        @return: Amount of rows affected by the query.
+        """
+        if __debug__:
+            log.debug('query "%s", params %s: executing' % (query, param))
+
+        if param is None:
+            param = {}
+
+        dbc = self.conn.cursor()
+        dbc.execute(query, param)
+
+        if __debug__:
+            log.debug('query "%s": executed, rows = %d' % (query, dbc.rowcount))
+
+        return dbc.rowcount
+
+
     def executeMany(self, query, data_list):
         """
         Execute batch query with list of data parameters.
@@ -618,3 +1562,388 @@ class Motor(object):
         Rollback database transactions.
         """
         self.conn.rollback()
+
+
+    def release(self):
+        """
+        Finish reading data from database.
+
+        Nothing is done, single database connection is kept open until
+        L{closeDBConn} method is called.
+
+        @see: L{bazaar.motor.PooledMotor.release}
+        """
+        pass
+
+
+
+class ConnectionPool(object):
+    """
+    Pool of database connections.
+
+    Connections are created on demand, but there are never more than
+    C{maxsize} of them. When all connections are checked out, then
+    L{checkout} method waits for returned connection. If the connection is
+    not returned within C{timeout} seconds, then
+    L{bazaar.exc.ConnectionPoolError} exception is raised.
+
+    Connections, which are not used longer than C{idle} seconds, are
+    closed, but pool keeps at least C{minsize} connections open.
+
+    @ivar dbmod: Python DB API module.
+    @ivar dsn: Data source name.
+    @ivar minsize: Minimal amount of open connections.
+    @ivar maxsize: Maximal amount of open connections.
+    @ivar idle: Amount of seconds after which idle connection is closed.
+    @ivar timeout: Amount of seconds to wait for connection, wait forever
+        if C{None}.
+    @ivar size: Amount of open connections.
+    @ivar free: List of pairs of idle connection and time of its checkin.
+    @ivar cond: Condition variable guarding pool state.
+    """
+    def __init__(self, dbmod, dsn, minsize = 1, maxsize = 10, idle = 300,
+            timeout = None):
+        """
+        Create pool of database connections.
+
+        Pool is filled with C{minsize} connections.
+
+        @param dbmod: Python DB API module.
+        @param dsn: Data source name.
+        @param minsize: Minimal amount of open connections.
+        @param maxsize: Maximal amount of open connections.
+        @param idle: Amount of seconds after which idle connection is closed.
+        @param timeout: Amount of seconds to wait for connection.
+        """
+        if minsize < 0 or maxsize < 1 or minsize > maxsize:
+            raise ValueError('wrong pool size: min = %s, max = %s' \
+                % (minsize, maxsize))
+
+        self.dbmod = dbmod
+        self.dsn = dsn
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.idle = idle
+        self.timeout = timeout
+
+        self.size = 0
+        self.free = []
+        self.cond = threading.Condition()
+        self.closed = False
+
+        for i in range(self.minsize):
+            self.free.append((self.dbmod.connect(self.dsn), time.time()))
+            self.size += 1
+
+        log.info('connection pool created: min = %d, max = %d' \
+            % (self.minsize, self.maxsize))
+
+
+    def checkout(self):
+        """
+        Get connection from the pool.
+
+        Most recently returned connection is reused first, so rarely used
+        connections become idle and can be reaped.
+
+        @return: Python DB API connection object.
+        """
+        self.cond.acquire()
+        try:
+            if self.timeout is not None:
+                deadline = time.time() + self.timeout
+
+            while True:
+                if self.closed:
+                    raise bazaar.exc.ConnectionPoolError('pool is closed',
+                        self)
+
+                self.reap()
+                if self.free:
+                    conn, ts = self.free.pop()
+                    return conn
+
+                if self.size < self.maxsize:
+                    # reserve connection, then connect without lock
+                    self.size += 1
+                    break
+
+                if self.timeout is None:
+                    self.cond.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise bazaar.exc.ConnectionPoolError(
+                            'pool exhausted, no connection within %s s' \
+                                % self.timeout, self)
+                    self.cond.wait(remaining)
+        finally:
+            self.cond.release()
+
+        try:
+            conn = self.dbmod.connect(self.dsn)
+        except:
+            self.cond.acquire()
+            try:
+                self.size -= 1
+                self.cond.notify()
+            finally:
+                self.cond.release()
+            raise
+
+        if __debug__:
+            log.debug('new pool connection, size = %d' % self.size)
+
+        return conn
+
+
+    def checkin(self, conn):
+        """
+        Return connection to the pool.
+
+        @param conn: Python DB API connection object.
+        """
+        self.cond.acquire()
+        try:
+            if self.closed:
+                self.size -= 1
+                conn.close()
+            else:
+                self.free.append((conn, time.time()))
+                self.reap()
+            self.cond.notify()
+        finally:
+            self.cond.release()
+
+
+    def discard(self, conn):
+        """
+        Close connection, which cannot be reused, i.e. its transaction
+        failed, instead of returning it to the pool.
+
+        @param conn: Python DB API connection object.
+        """
+        self.cond.acquire()
+        try:
+            self.size -= 1
+            self.cond.notify()
+        finally:
+            self.cond.release()
+
+        try:
+            conn.close()
+        except self.dbmod.Error:
+            log.warning('failed to close discarded pool connection')
+
+        if __debug__:
+            log.debug('pool connection discarded, size = %d' % self.size)
+
+
+    def reap(self):
+        """
+        Close connections idle longer than C{idle} seconds.
+
+        Pool lock should be acquired before calling the method.
+        """
+        if self.idle is None:
+            return
+
+        limit = time.time() - self.idle
+        # free list is ordered by checkin time, oldest connections first
+        while self.free and self.size > self.minsize \
+                and self.free[0][1] < limit:
+            conn, ts = self.free.pop(0)
+            self.size -= 1
+            conn.close()
+
+            if __debug__:
+                log.debug('idle pool connection closed, size = %d' \
+                    % self.size)
+
+
+    def close(self):
+        """
+        Close all idle connections.
+
+        Connections, which are checked out, are closed on checkin.
+        """
+        self.cond.acquire()
+        try:
+            self.closed = True
+            for conn, ts in self.free:
+                conn.close()
+            self.size -= len(self.free)
+            self.free = []
+            self.cond.notifyAll()
+        finally:
+            self.cond.release()
+
+        log.info('connection pool closed')
+
+
+
+class PooledMotor(Motor):
+    """
+    Database access object sharing pool of database connections between
+    threads.
+
+    Every thread checks out its own connection on first database access
+    and keeps it until end of transaction, then the connection is returned
+    to the pool with L{commit} or L{rollback} method. Therefore, reads and
+    writes from many threads run at the same time.
+
+    Threads, which only read data, do not commit, so they should call
+    L{release} method when they are done. Otherwise, their connections
+    are never returned to the pool and the pool is exhausted.
+
+    Data iterators (i.e. returned by L{getData}) should be consumed
+    before end of transaction.
+
+    @ivar pool: Connection pool.
+    @ivar poolconf: Connection pool parameters.
+    @ivar local: Thread local data, i.e. checked out connection.
+
+    @see: L{bazaar.motor.ConnectionPool}
+    """
+    def __init__(self, dbmod, **poolconf):
+        """
+        Initialize database access object.
+
+        @param dbmod: DB-API 2.0 module.
+        @param poolconf: Connection pool parameters.
+
+        @see: L{bazaar.motor.ConnectionPool.__init__}
+        """
+        self.pool = None
+        self.poolconf = poolconf
+        self.local = threading.local()
+        super(PooledMotor, self).__init__(dbmod)
+
+
+    def getConn(self):
+        """
+        Return database connection of current thread.
+
+        The connection is checked out from the pool if necessary.
+        """
+        if self.pool is None:
+            return None
+
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = self.pool.checkout()
+        return conn
+
+
+    def setConn(self, conn):
+        """
+        Connection is managed by the pool, so only reset is allowed.
+        """
+        assert conn is None
+
+
+    conn = property(getConn, setConn)
+
+
+    def checkin(self):
+        """
+        Return connection of current thread to the pool.
+        """
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            self.local.conn = None
+            self.pool.checkin(conn)
+
+
+    def discard(self):
+        """
+        Close connection of current thread without returning it to the
+        pool.
+
+        @see: L{bazaar.motor.ConnectionPool.discard}
+        """
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            self.local.conn = None
+            self.pool.discard(conn)
+
+
+    def connectDB(self, dsn):
+        """
+        Create connection pool.
+
+        @param dsn: Data source name.
+
+        @see: L{bazaar.motor.PooledMotor.closeDBConn}
+        """
+        if self.pool is not None:
+            self.closeDBConn()
+        self.pool = ConnectionPool(self.dbmod, dsn, **self.poolconf)
+
+
+    def closeDBConn(self):
+        """
+        Close connection pool.
+
+        Nothing is done if connection pool is not created.
+
+        @see: L{bazaar.motor.PooledMotor.connectDB}
+        """
+        if self.pool is None:
+            return
+        self.checkin()
+        self.pool.close()
+        self.pool = None
+        if __debug__:
+            log.debug('close connection pool')
+
+
+    def commit(self):
+        """
+        Commit pending database transactions and return connection to the
+        pool.
+
+        Nothing is done if current thread has not checked out connection.
+        If commit fails, then the connection is closed and not returned to
+        the pool, so other threads never get connection in failed
+        transaction.
+        """
+        if getattr(self.local, 'conn', None) is not None:
+            try:
+                super(PooledMotor, self).commit()
+            except:
+                self.discard()
+                raise
+            self.checkin()
+
+
+    def rollback(self):
+        """
+        Rollback database transactions and return connection to the pool.
+
+        Nothing is done if current thread has not checked out connection.
+        If rollback fails, then the connection is closed and not returned
+        to the pool.
+        """
+        if getattr(self.local, 'conn', None) is not None:
+            try:
+                super(PooledMotor, self).rollback()
+            except:
+                self.discard()
+                raise
+            self.checkin()
+
+
+    def release(self):
+        """
+        Finish reading data from database and return connection of current
+        thread to the pool.
+
+        Read transaction is rolled back, so database modifications of
+        current thread, which are not committed, are lost.
+
+        Nothing is done if current thread has not checked out connection.
+
+        @see: L{rollback}
+        """
+        self.rollback()
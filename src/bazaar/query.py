@@ -0,0 +1,555 @@
+# $Id$
+#
+# Bazaar ORM - an easy to use and powerful abstraction layer between
+# relational database and object oriented application.
+#
+# Copyright (C) 2000-2005 by Artur Wroblewski <wrobell@pld-linux.org>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+"""
+Query expressions.
+
+Query expressions are built with attributes of application classes
+(L{Attr} class) and compiled into SQL queries, i.e.::
+
+    from bazaar.query import Attr
+
+    # find 10 order items of apples with quantity greater than 5
+    items = bzr.select(OrderItem,
+        (Attr('quantity') > 5) & Attr('article.name').like('apple%'),
+        order = [Attr('pos').desc()], limit = 10)
+
+Supported expressions are
+    - comparison: C{==}, C{!=}, C{<}, C{<=}, C{>}, C{>=}
+    - C{Attr('a').in_(values)}, C{Attr('a').between(low, high)},
+      C{Attr('a').like(pattern)}, C{Attr('a').isNull()},
+      C{Attr('a').notNull()}
+    - logical operators: C{&} (and), C{|} (or), C{~} (not)
+
+Attribute names can be paths of one-to-one associations, i.e.
+C{article.name}. Associations are followed with outer joins.
+
+Query is compiled once per its shape (expression structure without
+parameter values) and the SQL query is cached in bounded query cache of
+database access object (see L{bazaar.motor.QueryCache}). Values are passed
+to database as query parameters.
+
+@see: L{bazaar.core.Bazaar.select} L{bazaar.motor.Convertor.select}
+"""
+
+import bazaar.core
+
+log = bazaar.Log('bazaar.query')
+
+
+def getValue(value):
+    """
+    Convert query value to relational data.
+
+    Persistent objects are converted to their primary key values.
+
+    @param value: Query value.
+    """
+    if isinstance(value, bazaar.core.PersistentObject):
+        value = value.uuid
+    return value
+
+
+
+class Compiler(object):
+    """
+    Query compiler.
+
+    Compiler resolves attribute paths into relation columns, creates joins
+    for one-to-one associations and creates names of query parameters.
+
+    @ivar cls: Application class.
+    @ivar pattern: Query parameter pattern, i.e. C{%%(%s)s}.
+    @ivar joins: List of join clauses.
+    @ivar aliases: Relation aliases per association path.
+    @ivar count: Amount of query parameters.
+    """
+    def __init__(self, cls, pattern):
+        """
+        Create query compiler.
+
+        @param cls: Application class.
+        @param pattern: Query parameter pattern.
+        """
+        self.cls = cls
+        self.pattern = pattern
+        self.joins = []
+        self.aliases = {'': 'T0'}
+        self.count = 0
+
+
+    def column(self, path):
+        """
+        Get relation column of attribute path.
+
+        @param path: Attribute path, i.e. C{article.name}.
+
+        @return: Relation column with relation alias.
+        """
+        cls = self.cls
+        alias = self.aliases['']
+        attrs = path.split('.')
+        for i, attr in enumerate(attrs[:-1]):
+            col = cls.getMapping().columns.get(attr)
+            if col is None or not col.is_one_to_one:
+                raise ValueError('%s has no one-to-one association %s' \
+                    % (cls, attr))
+
+            prefix = '.'.join(attrs[:i + 1])
+            if prefix not in self.aliases:
+                self.aliases[prefix] = 'T%d' % len(self.aliases)
+                self.joins.append('left outer join "%s" %s' \
+                    ' on %s."%s" = %s."uuid"' % (col.vcls.relation,
+                        self.aliases[prefix], alias, col.col,
+                        self.aliases[prefix]))
+            alias = self.aliases[prefix]
+            cls = col.vcls
+
+        attr = attrs[-1]
+        if attr == 'uuid':
+            name = attr
+        else:
+            col = cls.getMapping().columns.get(attr)
+            if col is None or col.is_many:
+                raise ValueError('%s has no column for attribute %s' \
+                    % (cls, attr))
+            name = col.col
+
+        return '%s."%s"' % (alias, name)
+
+
+    def param(self):
+        """
+        Create next query parameter placeholder.
+        """
+        name = 'p%d' % self.count
+        self.count += 1
+        return self.pattern % name
+
+
+
+class Expression(object):
+    """
+    Abstract, basic class of query expressions.
+
+    Expressions are combined with C{&}, C{|} and C{~} operators.
+    """
+    def __and__(self, other):
+        return And(self, other)
+
+
+    def __or__(self, other):
+        return Or(self, other)
+
+
+    def __invert__(self):
+        return Not(self)
+
+
+    def shape(self):
+        """
+        Return hashable shape of expression, which identifies compiled
+        SQL query.
+        """
+        raise NotImplementedError
+
+
+    def compile(self, compiler):
+        """
+        Compile expression into SQL condition.
+
+        @param compiler: Query compiler.
+        """
+        raise NotImplementedError
+
+
+    def params(self, values):
+        """
+        Append expression parameter values to list of values.
+
+        Values are appended in order of parameters created on compilation.
+
+        @param values: List of values.
+        """
+        raise NotImplementedError
+
+
+
+class Attr(object):
+    """
+    Application class attribute used in query expressions.
+
+    @ivar path: Attribute path, i.e. C{article.name}.
+    """
+    def __init__(self, path):
+        """
+        Create attribute of query expression.
+
+        @param path: Attribute path.
+        """
+        self.path = path
+
+
+    def __eq__(self, value):
+        if value is None:
+            return IsNull(self)
+        return Compare(self, '=', value)
+
+
+    def __ne__(self, value):
+        if value is None:
+            return IsNull(self, True)
+        return Compare(self, '<>', value)
+
+
+    def __lt__(self, value):
+        return Compare(self, '<', value)
+
+
+    def __le__(self, value):
+        return Compare(self, '<=', value)
+
+
+    def __gt__(self, value):
+        return Compare(self, '>', value)
+
+
+    def __ge__(self, value):
+        return Compare(self, '>=', value)
+
+
+    def in_(self, values):
+        """
+        Check if attribute value is in the list of values.
+        """
+        return In(self, list(values))
+
+
+    def between(self, low, high):
+        """
+        Check if attribute value is in the range of values.
+        """
+        return Between(self, low, high)
+
+
+    def like(self, pattern):
+        """
+        Check if attribute value matches SQL C{like} pattern.
+        """
+        return Compare(self, 'like', pattern)
+
+
+    def isNull(self):
+        """
+        Check if attribute value is null.
+        """
+        return IsNull(self)
+
+
+    def notNull(self):
+        """
+        Check if attribute value is not null.
+        """
+        return IsNull(self, True)
+
+
+    def asc(self):
+        """
+        Order query results ascending by attribute value.
+        """
+        return Order(self)
+
+
+    def desc(self):
+        """
+        Order query results descending by attribute value.
+        """
+        return Order(self, True)
+
+
+
+class Compare(Expression):
+    """
+    Comparison of attribute value with a value or other attribute.
+    """
+    def __init__(self, attr, op, value):
+        self.attr = attr
+        self.op = op
+        self.value = value
+
+
+    def shape(self):
+        if isinstance(self.value, Attr):
+            return ('cmp', self.attr.path, self.op, self.value.path)
+        else:
+            return ('cmp', self.attr.path, self.op)
+
+
+    def compile(self, compiler):
+        if isinstance(self.value, Attr):
+            value = compiler.column(self.value.path)
+        else:
+            value = compiler.param()
+        return '%s %s %s' % (compiler.column(self.attr.path), self.op, value)
+
+
+    def params(self, values):
+        if not isinstance(self.value, Attr):
+            values.append(getValue(self.value))
+
+
+
+class In(Expression):
+    """
+    Check if attribute value is in the list of values.
+    """
+    def __init__(self, attr, values):
+        self.attr = attr
+        self.values = values
+
+
+    def shape(self):
+        return ('in', self.attr.path, len(self.values))
+
+
+    def compile(self, compiler):
+        if not self.values:
+            return '1 = 0'
+        return '%s in (%s)' % (compiler.column(self.attr.path),
+            ', '.join([compiler.param() for value in self.values]))
+
+
+    def params(self, values):
+        values.extend([getValue(value) for value in self.values])
+
+
+
+class Between(Expression):
+    """
+    Check if attribute value is in the range of values.
+    """
+    def __init__(self, attr, low, high):
+        self.attr = attr
+        self.low = low
+        self.high = high
+
+
+    def shape(self):
+        return ('between', self.attr.path)
+
+
+    def compile(self, compiler):
+        return '%s between %s and %s' % (compiler.column(self.attr.path),
+            compiler.param(), compiler.param())
+
+
+    def params(self, values):
+        values.append(getValue(self.low))
+        values.append(getValue(self.high))
+
+
+
+class IsNull(Expression):
+    """
+    Check if attribute value is null (or not null).
+    """
+    def __init__(self, attr, negate = False):
+        self.attr = attr
+        self.negate = negate
+
+
+    def shape(self):
+        return ('null', self.attr.path, self.negate)
+
+
+    def compile(self, compiler):
+        if self.negate:
+            return '%s is not null' % compiler.column(self.attr.path)
+        else:
+            return '%s is null' % compiler.column(self.attr.path)
+
+
+    def params(self, values):
+        pass
+
+
+
+class And(Expression):
+    """
+    Conjunction of expressions.
+    """
+    op = 'and'
+
+    def __init__(self, *exprs):
+        self.exprs = exprs
+
+
+    def shape(self):
+        return (self.op, ) + tuple([expr.shape() for expr in self.exprs])
+
+
+    def compile(self, compiler):
+        return '(%s)' % (' %s ' % self.op).join(
+            [expr.compile(compiler) for expr in self.exprs])
+
+
+    def params(self, values):
+        for expr in self.exprs:
+            expr.params(values)
+
+
+
+class Or(And):
+    """
+    Disjunction of expressions.
+    """
+    op = 'or'
+
+
+
+class Not(Expression):
+    """
+    Negation of expression.
+    """
+    def __init__(self, expr):
+        self.expr = expr
+
+
+    def shape(self):
+        return ('not', self.expr.shape())
+
+
+    def compile(self, compiler):
+        return 'not (%s)' % self.expr.compile(compiler)
+
+
+    def params(self, values):
+        self.expr.params(values)
+
+
+
+class Order(object):
+    """
+    Order of query results.
+
+    @ivar attr: Attribute.
+    @ivar descending: If true, then results are ordered descending.
+    """
+    def __init__(self, attr, descending = False):
+        self.attr = attr
+        self.descending = descending
+
+
+    def shape(self):
+        return (self.attr.path, self.descending)
+
+
+    def compile(self, compiler):
+        if self.descending:
+            return '%s desc' % compiler.column(self.attr.path)
+        else:
+            return '%s asc' % compiler.column(self.attr.path)
+
+
+
+def getOrder(order):
+    """
+    Convert list of attributes and orders into list of orders.
+
+    @param order: List of L{Attr} and L{Order} objects.
+    """
+    return [isinstance(item, Attr) and Order(item) or item for item in order]
+
+
+def shape(where, order, limit, offset):
+    """
+    Return shape of query, which identifies compiled SQL query.
+
+    @param where: Query expression or C{None}.
+    @param order: List of orders.
+    @param limit: Maximum amount of rows or C{None}.
+    @param offset: Amount of rows to skip or C{None}.
+    """
+    if where is None:
+        wshape = None
+    else:
+        wshape = where.shape()
+    return (wshape, tuple([item.shape() for item in order]),
+        limit is not None, offset is not None)
+
+
+def compileQuery(cls, cols, where, order, limit, offset, pattern):
+    """
+    Compile query into SQL query.
+
+    @param cls: Application class.
+    @param cols: List of relation columns to select.
+    @param where: Query expression or C{None}.
+    @param order: List of orders.
+    @param limit: Maximum amount of rows or C{None}.
+    @param offset: Amount of rows to skip or C{None}.
+    @param pattern: Query parameter pattern, i.e. C{%%(%s)s}.
+
+    @return: SQL query.
+    """
+    compiler = Compiler(cls, pattern)
+
+    query = []
+    if where is not None:
+        query.append('where %s' % where.compile(compiler))
+    if order:
+        query.append('order by %s' \
+            % ', '.join([item.compile(compiler) for item in order]))
+    if limit is not None:
+        query.append('limit %s' % (pattern % 'limit'))
+    if offset is not None:
+        query.append('offset %s' % (pattern % 'offset'))
+
+    query = ['select %s from "%s" T0' \
+        % (', '.join(['T0."%s"' % col for col in cols]), cls.relation)] \
+        + compiler.joins + query
+    query = ' '.join(query)
+
+    if __debug__:
+        log.debug('compiled query: "%s"' % query)
+
+    return query
+
+
+def params(where, limit, offset):
+    """
+    Return dictionary of query parameters.
+
+    @param where: Query expression or C{None}.
+    @param limit: Maximum amount of rows or C{None}.
+    @param offset: Amount of rows to skip or C{None}.
+    """
+    values = []
+    if where is not None:
+        where.params(values)
+
+    param = dict([('p%d' % i, value) for i, value in enumerate(values)])
+    if limit is not None:
+        param['limit'] = limit
+    if offset is not None:
+        param['offset'] = offset
+    return param
@@ -0,0 +1,229 @@
+# $Id: cache.py,v 1.5 2005/05/12 18:29:58 wrobell Exp $
+#
+# Bazaar ORM - an easy to use and powerful abstraction layer between
+# relational database and object oriented application.
+#
+# Copyright (C) 2000-2005 by Artur Wroblewski <wrobell@pld-linux.org>
+# 
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+# 
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+import os
+import tempfile
+import threading
+from decimal import Decimal
+
+import bazaar.bus
+import bazaar.core
+
+import bazaar.test.bzr
+import bazaar.test.app
+
+"""
+Test cache invalidation bus.
+"""
+
+class BusTestCase(bazaar.test.bzr.TestCase):
+    """
+    Test cache invalidation bus.
+
+    Other process is emulated with second bus using the same file and with
+    database modifications made with database cursor.
+    """
+    def setUp(self):
+        super(BusTestCase, self).setUp()
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.bus = bazaar.bus.Bus(bazaar.bus.FileTransport(self.path))
+        self.other = bazaar.bus.Bus(bazaar.bus.FileTransport(self.path))
+        self.bazaar.setBus(self.bus)
+
+
+    def tearDown(self):
+        self.bus.close()
+        self.other.close()
+        for path in (self.path, self.path + '.old'):
+            if os.path.exists(path):
+                os.remove(path)
+        super(BusTestCase, self).tearDown()
+
+
+    def testTransport(self):
+        """Test file transport of cache invalidation bus"""
+        t1 = bazaar.bus.FileTransport(self.path)
+        t2 = bazaar.bus.FileTransport(self.path)
+
+        t1.send(['a', 'b'])
+        t2.send(['c'])
+        self.assertEqual(t1.receive(), ['a', 'b', 'c'])
+        self.assertEqual(t2.receive(), ['a', 'b', 'c'])
+        self.assertEqual(t1.receive(), [])
+
+        # truncated file is read from its beginning
+        open(self.path, 'w').close()
+        t1.send(['d'])
+        self.assertEqual(t2.receive(), ['d'])
+
+        t1.close()
+        t2.close()
+
+
+    def testTransportWrite(self):
+        """Test appending messages with partial writes"""
+        t1 = bazaar.bus.FileTransport(self.path)
+        t2 = bazaar.bus.FileTransport(self.path)
+
+        write = os.write
+        os.write = lambda fd, data: write(fd, data[:1])
+        try:
+            t1.send(['abc', 'd'])
+        finally:
+            os.write = write
+        self.assertEqual(t2.receive(), ['abc', 'd'])
+
+        t1.close()
+        t2.close()
+
+
+    def testTransportRotation(self):
+        """Test rotation of file of cache invalidation bus"""
+        t1 = bazaar.bus.FileTransport(self.path, maxsize = 50)
+        t2 = bazaar.bus.FileTransport(self.path)
+        msg = 'x' * 20
+
+        # rest of rotated file is read before new file
+        t1.send([msg])
+        self.assert_(os.path.exists(self.path + '.old'))
+        self.assert_(not os.path.exists(self.path))
+        self.assertEqual(t2.receive(), [msg])
+        t1.send(['a'])
+        self.assertEqual(t2.receive(), ['a'])
+
+        t2.send(['b'])
+        t1.send([msg])
+        t1.send(['c'])
+        self.assertEqual(t2.receive(), ['b', msg, 'c'])
+        self.assertEqual(t2.receive(), [])
+
+        # messages are lost if file is rotated twice between reads
+        t1.send([msg])
+        t1.send([msg, msg])
+        t1.send(['d'])
+        self.assertEqual(t2.receive(), ['d'])
+
+        t1.close()
+        t2.close()
+
+
+    def testThreadEvents(self):
+        """Test publishing events recorded per thread"""
+        cls = bazaar.test.app.Article
+        self.bus.record(cls, 'k1', 'update')
+
+        def record():
+            self.bus.record(cls, 'k2', 'update')
+            self.bus.discard()
+            self.bus.record(cls, 'k3', 'delete')
+
+        t = threading.Thread(target = record)
+        t.start()
+        t.join()
+
+        # events of other thread are neither published nor discarded
+        self.bus.publish()
+        self.assertEqual(self.other.receive(),
+            [('bazaar.test.app.Article', 'k1', 'update')])
+
+
+    def testKeyTypes(self):
+        """Test keeping types of primary key values of events"""
+        cls = bazaar.test.app.Article
+        keys = [1, 2L ** 70, 'k 1%', u'k\u0105']
+        for key in keys:
+            self.other.record(cls, key, 'update')
+        self.other.publish()
+
+        events = self.bus.receive()
+        self.assertEqual(events, [('bazaar.test.app.Article', key, 'update')
+            for key in keys])
+        self.assertEqual([type(key) for name, key, op in events],
+            [type(key) for key in keys])
+
+        self.assertRaises(TypeError, self.bus.record, cls, 1.5, 'update')
+
+
+    def testPublish(self):
+        """Test publishing of committed database modifications"""
+        art = bazaar.test.app.Article(name = 'bus', price = Decimal('1.00'))
+        self.bazaar.add(art)
+        self.bazaar.rollback()
+        self.assertEqual(self.other.receive(), [])
+
+        art = bazaar.test.app.Article(name = 'bus', price = Decimal('1.00'))
+        self.bazaar.add(art)
+        art.price = Decimal('2.00')
+        self.bazaar.update(art)
+        self.bazaar.commit()
+
+        name = 'bazaar.test.app.Article'
+        self.assertEqual(self.other.receive(), [(name, art.uuid, 'add'),
+            (name, art.uuid, 'update')])
+
+        # own events are not received
+        self.assertEqual(self.bus.receive(), [])
+
+        # update of not modified object is not published
+        self.bazaar.update(art)
+        self.bazaar.commit()
+        self.assertEqual(self.other.receive(), [])
+
+        self.bazaar.delete(art)
+        self.bazaar.commit()
+
+
+    def testSync(self):
+        """Test applying database modifications of other process"""
+        art1 = list(self.bazaar.getObjects(bazaar.test.app.Article))[0]
+        # article not referenced by order items can be deleted
+        art2 = bazaar.test.app.Article(name = 'sync', price = Decimal('1.00'))
+        self.bazaar.add(art2)
+
+        dbc = self.bazaar.motor.conn.cursor()
+        dbc.execute('update article set price = price + 1 where uuid = %s',
+            (art1.uuid, ))
+        dbc.execute('delete from article where uuid = %s', (art2.uuid, ))
+
+        price = art1.price
+        key = art2.uuid
+        self.other.record(bazaar.test.app.Article, art1.uuid, 'update')
+        self.other.record(bazaar.test.app.Article, key, 'delete')
+        self.other.publish()
+
+        self.assertEqual(self.bazaar.sync(), 2)
+
+        # updated object is reloaded in place, deleted object is evicted
+        self.assertEqual(art1.price, price + 1)
+        self.assert_(self.bazaar.get(bazaar.test.app.Article, art1.uuid)
+            is art1)
+        self.assert_(art2.uuid is None)
+        self.assert_(key not in self.bazaar.brokers[
+            bazaar.test.app.Article].cache)
+
+        self.bazaar.rollback()
+
+
+
+if __name__ == '__main__':
+    bazaar.test.main()
@@ -241,6 +241,7 @@ class TestCase(bazaar.test.DBTestCase):
 
 
 if __name__ == '__main__':
-    bazaar.test.main(('bazaar.test.assoc', 'bazaar.test.cache',
-        'bazaar.test.conf', 'bazaar.test.config', 'bazaar.test.connection',
-        'bazaar.test.core', 'bazaar.test.find', 'bazaar.test.init'))
+    bazaar.test.main(('bazaar.test.assoc', 'bazaar.test.bus',
+        'bazaar.test.cache', 'bazaar.test.conf', 'bazaar.test.config',
+        'bazaar.test.connection', 'bazaar.test.core', 'bazaar.test.find',
+        'bazaar.test.init'))
@@ -21,8 +21,11 @@
 #
 
 import gc
+import time
+from decimal import Decimal
 from ConfigParser import ConfigParser
 
+import bazaar.cache
 import bazaar.core
 import bazaar.config
 
@@ -69,6 +72,81 @@ class LazyTestCase(bazaar.test.bzr.TestCase):
         self.checkObjects(bazaar.test.app.Article, len(list(self.bazaar.getObjects(bazaar.test.app.Article))))
 
 
+    def testObjectBatchLoading(self):
+        """Test loading many objects into lazy cache at once"""
+        self.config.add_section('bazaar.cls')
+        self.config.set('bazaar.cls', 'bazaar.test.app.OrderItem.cache',
+            'bazaar.cache.LazyObject')
+
+        self.bazaar.setConfig(bazaar.config.CPConfig(self.config))
+        self.bazaar.connectDB()
+        self.config.remove_section('bazaar.cls')
+
+        dbc = self.bazaar.motor.conn.cursor()
+        dbc.execute('select uuid from "order_item"')
+        keys = [row[0] for row in dbc.fetchall()]
+
+        oibroker = self.bazaar.brokers[bazaar.test.app.OrderItem]
+        items = oibroker.getMany(keys + ['no such key'])
+        self.assertEqual([oi.uuid for oi in items[:-1]], keys)
+        self.assertEqual(items[-1], None)
+        self.assertEqual(len(oibroker.cache), len(keys))
+
+        # objects existing in cache are not reloaded
+        self.assertEqual(oibroker.getMany(keys[:2]), items[:2])
+
+        del items
+        gc.collect()
+
+        # referenced objects are loaded at once
+        order = list(self.bazaar.getObjects(bazaar.test.app.Order))[0]
+        dbc.execute('select uuid from "order_item" where order_fkey = %s',
+            [order.uuid])
+        dbkeys = [row[0] for row in dbc.fetchall()]
+        dbkeys.sort()
+        oikeys = [oi.uuid for oi in order.items]
+        oikeys.sort()
+        self.assertEqual(oikeys, dbkeys)
+
+
+    def testPreloading(self):
+        """Test preloading association data into lazy cache"""
+        self.config.add_section('bazaar.cls')
+        self.config.set('bazaar.cls', 'bazaar.test.app.OrderItem.cache',
+            'bazaar.cache.LazyObject')
+        self.config.set('bazaar.cls', 'bazaar.test.app.Article.cache',
+            'bazaar.cache.LazyObject')
+        self.config.add_section('bazaar.asc')
+        self.config.set('bazaar.asc', 'bazaar.test.app.Order.items.cache',
+            'bazaar.cache.LazyAssociation')
+
+        self.bazaar.setConfig(bazaar.config.CPConfig(self.config))
+        self.bazaar.connectDB()
+        self.config.remove_section('bazaar.cls')
+        self.config.remove_section('bazaar.asc')
+
+        orders = list(self.bazaar.getObjects(bazaar.test.app.Order))
+        loaded = self.bazaar.preload(orders, ['items', 'items.article'])
+
+        asc = bazaar.test.app.Order.items
+        oibroker = self.bazaar.brokers[bazaar.test.app.OrderItem]
+        abroker = self.bazaar.brokers[bazaar.test.app.Article]
+        for ord in orders:
+            self.assert_(asc.cache.dicttype.__contains__(asc.cache, ord),
+                'order items not preloaded')
+            for key in asc.cache[ord]:
+                self.assert_(key in oibroker.cache, 'order item not preloaded')
+
+        self.assertEqual(len(loaded['items']), len(oibroker.cache))
+        for oi in loaded['items']:
+            self.assert_(oi.article_fkey in abroker.cache,
+                'article not preloaded')
+
+        dbc = self.bazaar.motor.conn.cursor()
+        dbc.execute('select count(*) from "order_item"')
+        self.assertEqual(len(loaded['items']), dbc.fetchone()[0])
+
+
     def testAscLoading(self):
         """Test association data lazy cache"""
 #        config.add_section('bazaar.cls')
@@ -84,6 +162,13 @@ class LazyTestCase(bazaar.test.bzr.TestCase):
         self.config.remove_section('bazaar.asc')
 
         order = list(self.bazaar.getObjects(bazaar.test.app.Order))[0]
+
+        # association data are counted without loading
+        size = len(order.items)
+        self.assert_(order not in bazaar.test.app.Order.items.cache,
+            'association data loaded on counting')
+        self.assertEqual(size, len(list(order.items)))
+
         oikeys = [oi.__key__ for oi in order.items]
         oikeys.sort()
 
@@ -148,6 +233,143 @@ class LazyTestCase(bazaar.test.bzr.TestCase):
             
 
 
+class LRUTestCase(bazaar.test.bzr.TestCase):
+    """
+    Test LRU cache.
+    """
+    def testObjectLoading(self):
+        """Test object LRU cache"""
+        self.config.add_section('bazaar.cls')
+        self.config.set('bazaar.cls', 'bazaar.test.app.Article.cache',
+            'bazaar.cache.LRUObject 2')
+
+        self.bazaar.setConfig(bazaar.config.CPConfig(self.config))
+        self.bazaar.connectDB()
+        self.config.remove_section('bazaar.cls')
+        bazaar.test.app.Article.cachesize = None
+
+        abroker = self.bazaar.brokers[bazaar.test.app.Article]
+        self.assert_(isinstance(abroker.cache, bazaar.cache.LRUObject))
+
+        articles = list(self.bazaar.getObjects(bazaar.test.app.Article))
+        self.assert_(len(articles) > 2)
+        keys = [art.uuid for art in articles]
+        first = articles[0]
+
+        # strong references are kept to two most recently used objects...
+        del articles
+        del art
+        gc.collect()
+        self.assertEqual(len(abroker.cache.lru), 2)
+        self.assertEqual(len(abroker.cache), 3)
+        for key in keys[-2:]:
+            self.assert_(key in abroker.cache.lru)
+
+        # ... evicted object, which is still referenced, is found in cache
+        self.assert_(abroker.get(first.uuid) is first)
+        self.assert_(first.uuid in abroker.cache.lru)
+        self.assert_(keys[-2] not in abroker.cache.lru)
+
+        del first
+        gc.collect()
+        self.assertEqual(len(abroker.cache), 2)
+
+        # test objects integrity
+        self.checkObjects(bazaar.test.app.Article, len(keys))
+
+        # strong references are kept to objects added at once
+        added = [bazaar.test.app.Article(name = 'lru %d' % i,
+            price = Decimal('1.00')) for i in range(2)]
+        self.bazaar.addMany(added)
+        keys = [art.uuid for art in added]
+        del added
+        del art
+        gc.collect()
+        for key in keys:
+            self.assert_(key in abroker.cache.lru)
+            self.assert_(key in abroker.cache)
+
+
+    def testAscLoading(self):
+        """Test association LRU cache"""
+        self.config.add_section('bazaar.asc')
+        self.config.set('bazaar.asc', 'bazaar.test.app.Order.items.cache',
+            'bazaar.cache.LRUAssociation 1')
+
+        self.bazaar.setConfig(bazaar.config.CPConfig(self.config))
+        self.bazaar.connectDB()
+        self.config.remove_section('bazaar.asc')
+        bazaar.test.app.Order.items.col.cachesize = None
+
+        orders = list(self.bazaar.getObjects(bazaar.test.app.Order))
+        self.assert_(len(orders) > 1)
+
+        # only data of most recently used order are kept in cache
+        cache = bazaar.test.app.Order.items.cache
+        for order in orders:
+            list(order.items)
+            self.assert_(order in cache)
+            self.assertEqual(len(cache), 1)
+
+        self.checkOrdAsc()
+
+
+
+class TTLTestCase(bazaar.test.bzr.TestCase):
+    """
+    Test expiring cache.
+    """
+    def testObjectRefresh(self):
+        """Test object expiring cache"""
+        self.config.add_section('bazaar.cls')
+        self.config.set('bazaar.cls', 'bazaar.test.app.Article.cache',
+            'bazaar.cache.TTLObject')
+        self.config.set('bazaar.cls', 'bazaar.test.app.Article.ttl', '0.1')
+
+        self.bazaar.setConfig(bazaar.config.CPConfig(self.config))
+        self.bazaar.connectDB()
+        self.config.remove_section('bazaar.cls')
+        bazaar.test.app.Article.ttl = None
+
+        abroker = self.bazaar.brokers[bazaar.test.app.Article]
+        self.assert_(isinstance(abroker.cache, bazaar.cache.TTLObject))
+
+        articles = list(self.bazaar.getObjects(bazaar.test.app.Article))
+        art = articles[0]
+        price = art.price
+
+        dbc = self.bazaar.motor.conn.cursor()
+        dbc.execute('update article set price = price + 1 where uuid = %s',
+            (art.uuid, ))
+
+        # object is not stale yet
+        self.assertEqual(abroker.get(art.uuid).price, price)
+
+        # stale object is reloaded in place
+        time.sleep(0.2)
+        self.assert_(abroker.get(art.uuid) is art)
+        self.assertEqual(art.price, price + 1)
+
+        # other stale objects are reloaded with the same query
+        for obj in articles[1:]:
+            self.assert_(abroker.cache.stamps[obj.uuid] \
+                == abroker.cache.stamps[art.uuid])
+
+        # loading times of garbage collected objects are forgotten
+        key = art.uuid
+        del articles
+        del art
+        del obj
+        gc.collect()
+        self.assertEqual(len(abroker.cache.stamps), 0)
+        self.assertEqual(len(abroker.cache.refs), 0)
+        abroker.get(key)
+        self.assertEqual(len(abroker.cache.queue), 1)
+
+        self.bazaar.rollback()
+
+
+
 class FullTestCase(bazaar.test.bzr.TestCase):
     """
     Test full cache.
@@ -23,6 +23,8 @@
 import unittest
 
 import bazaar.conf
+import bazaar.core
+import bazaar.exc
 import bazaar.assoc
 
 import bazaar.test.app
@@ -206,6 +208,79 @@ class ConfTestCase(unittest.TestCase):
         self.assert_(not col.readable and col.writable)
 
 
+    def testMapping(self):
+        """Test class mapping creation and invalidation"""
+        A = bazaar.conf.Persistence('A', 'a', globals())
+        A.addColumn('a1')
+        A.addColumn('a2', writable = False)
+
+        B = bazaar.conf.Persistence('B', 'b', globals(), bases = (A, ))
+        B.addColumn('b1', 'b1_fkey', A)
+
+        mapping = B.getMapping()
+        self.assert_(mapping is B.getMapping(), 'mapping is not reused')
+        self.assertEqual(mapping.load_cols[0], 'uuid')
+        self.assertEqual(len(mapping.load_cols), 4)
+        self.assert_('a2' not in mapping.save_cols)
+        self.assertEqual([col.attr for col in mapping.one_to_one], ['b1'])
+        self.assertEqual(mapping.index['b1_fkey'],
+            list(mapping.load_cols).index('b1_fkey'))
+        self.assertRaises(AttributeError, setattr, mapping, 'load_cols', ())
+
+        # columns of mapping are not modified by caller
+        B.getColumns().clear()
+        self.assertEqual(len(mapping.columns), 3)
+
+        # adding column to base class resets mapping of subclass
+        A.addColumn('a3')
+        self.assert_(mapping is not B.getMapping(), 'mapping is not reset')
+        self.assert_('a3' in B.getMapping().load_cols)
+
+        # objects are created from relation rows without constructor
+        mapping = B.getMapping()
+        obj = mapping.load(mapping.load_cols)
+        self.assert_(isinstance(obj, B))
+        for col in mapping.load_cols:
+            self.assertEqual(getattr(obj, col), col)
+        self.assert_('__dirty__' not in obj.__dict__)
+
+
+    def testCompactClass(self):
+        """Test compact class definition"""
+        A = bazaar.conf.Persistence('A', 'a', globals())
+        A.addColumn('a1')
+
+        b2 = bazaar.conf.Column('b2', 'b2_fkey')
+        b2.vcls = A
+
+        class B(bazaar.core.PersistentObject):
+            __metaclass__ = bazaar.conf.Persistence
+            relation      = 'b'
+            slots         = True
+            columns       = {
+                'b1': bazaar.conf.Column('b1', 'b1_col'),
+                'b2': b2,
+            }
+
+        slots = list(B.__slots__)
+        slots.sort()
+        self.assertEqual(slots, ['__dirty__', '__weakref__', 'b1', 'b1_col',
+            'b2_fkey', 'uuid'])
+        self.assertRaises(bazaar.exc.ColumnMappingError, B.addColumn, 'b3')
+
+        obj = B(b1 = 1)
+        self.assert_(not hasattr(obj, '__dict__'))
+        self.assertEqual((obj.uuid, obj.b1, obj.b1_col), (None, 1, None))
+        self.assertRaises(AttributeError, setattr, obj, 'b3', 1)
+
+        mapping = B.getMapping()
+        obj = mapping.load(mapping.load_cols)
+        for col in mapping.load_cols:
+            self.assertEqual(getattr(obj, col), col)
+        self.assertEqual(obj.b1, None)
+        self.assertEqual(obj.__dirty__, None)
+
+
 
 class AssociationTestCase(unittest.TestCase):
     """
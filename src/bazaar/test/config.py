@@ -84,5 +84,111 @@ class ConfigTestCase(bazaar.test.TestCase):
 
 
 
+    def testCustomConfig(self):
+        """Test configuration with custom configuration class"""
+        class Config(bazaar.config.Config):
+            def getDBModule(self):
+                return None
+
+            def getSeqPattern(self):
+                return None
+
+            def getDSN(self):
+                return 'dbname = ord'
+
+            def getObjectCache(self, cls):
+                return None
+
+            def getClassSequencer(self, cls):
+                return None
+
+            def getClassRelation(self, cls):
+                return None
+
+            def getAssociationCache(self, attr):
+                return None
+
+        # optional parameters are not configured
+        b = bazaar.core.Bazaar(self.cls_list, dbmod = self.bazaar.dbmod)
+        b.setConfig(Config())
+
+        self.assertEqual(b.dsn, 'dbname = ord')
+        self.assertEqual(b.pool, None)
+        self.assertEqual(b.deferred, False)
+        self.assertEqual(b.autoupdate, False)
+        self.assertEqual(b.bus, None)
+        self.assertEqual(bazaar.test.app.Order.marker, None)
+        self.assertEqual(bazaar.test.app.Order.stream, False)
+
+
+
+    def testArraySize(self):
+        """Test configuration of amount of rows fetched at once"""
+        config = ConfigParser()
+        config.add_section('bazaar')
+        config.set('bazaar', 'arraysize', '50')
+        config.add_section('bazaar.cls')
+        config.set('bazaar.cls', 'bazaar.test.app.Article.arraysize', '10')
+        config.add_section('bazaar.asc')
+        config.set('bazaar.asc', 'bazaar.test.app.Order.items.arraysize', '20')
+
+        # values declared in class are kept if not configured
+        bazaar.test.app.Order.arraysize = 30
+        bazaar.test.app.Order.stream = True
+
+        try:
+            b = bazaar.core.Bazaar(self.cls_list, dbmod = self.bazaar.dbmod)
+            b.setConfig(bazaar.config.CPConfig(config))
+
+            self.assertEqual(b.motor.arraysize, 50)
+            self.assertEqual(bazaar.test.app.Article.arraysize, 10)
+            self.assertEqual(bazaar.test.app.Order.arraysize, 30)
+            self.assertEqual(bazaar.test.app.Order.stream, True)
+            self.assertEqual(bazaar.test.app.Employee.arraysize, None)
+            self.assertEqual(bazaar.test.app.Order.items.col.arraysize, 20)
+        finally:
+            # restore default conf to process in the rest of tests
+            bazaar.test.app.Article.arraysize = None
+            bazaar.test.app.Order.arraysize = None
+            bazaar.test.app.Order.stream = False
+            bazaar.test.app.Order.items.col.arraysize = None
+
+
+
+    def testCacheLimit(self):
+        """Test configuration of cache limits"""
+        config = ConfigParser()
+        config.add_section('bazaar.cls')
+        config.set('bazaar.cls', 'bazaar.test.app.Article.cache',
+            'bazaar.cache.LRUObject 100 2M')
+        config.add_section('bazaar.asc')
+        config.set('bazaar.asc', 'bazaar.test.app.Order.items.cache',
+            'bazaar.cache.LRUAssociation 64k')
+
+        col = bazaar.test.app.Order.items.col
+        try:
+            b = bazaar.core.Bazaar(self.cls_list, dbmod = self.bazaar.dbmod)
+            b.setConfig(bazaar.config.CPConfig(config))
+
+            self.assertEqual(bazaar.test.app.Article.cache,
+                bazaar.cache.LRUObject)
+            self.assertEqual(bazaar.test.app.Article.cachesize, 100)
+            self.assertEqual(bazaar.test.app.Article.cachebudget,
+                2 * 1024 ** 2)
+            self.assertEqual(bazaar.test.app.Order.cachesize, None)
+
+            self.assertEqual(col.cache, bazaar.cache.LRUAssociation)
+            self.assertEqual(col.cachesize, None)
+            self.assertEqual(col.cachebudget, 64 * 1024)
+        finally:
+            # restore default conf to process in the rest of tests
+            bazaar.test.app.Article.cache = bazaar.cache.FullObject
+            bazaar.test.app.Article.cachesize = None
+            bazaar.test.app.Article.cachebudget = None
+            col.cache = bazaar.cache.FullAssociation
+            col.cachebudget = None
+
+
+
 if __name__ == '__main__':
     bazaar.test.main()
@@ -20,8 +20,12 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 #
 
+import threading
+
 import bazaar.core
 import bazaar.config
+import bazaar.exc
+import bazaar.motor
 
 import bazaar.test.app
 import bazaar.test.bzr
@@ -54,5 +58,149 @@ class ConnTestCase(bazaar.test.TestCase):
         self.assert_(not self.bazaar.motor.conn, 'db connection should not be set')
 
 
+
+class PoolTestCase(bazaar.test.TestCase):
+    """
+    Test database connection pool.
+    """
+    def setUp(self):
+        """
+        Create Bazaar ORM layer object using connection pool.
+        """
+        super(PoolTestCase, self).setUp()
+        self.config.set('bazaar', 'pool.minsize', '1')
+        self.config.set('bazaar', 'pool.maxsize', '2')
+        self.config.set('bazaar', 'pool.timeout', '0.5')
+        self.bazaar.setConfig(bazaar.config.CPConfig(self.config))
+        self.bazaar.connectDB()
+
+
+    def tearDown(self):
+        """
+        Close connection pool.
+        """
+        self.bazaar.closeDBConn()
+        for param in ('minsize', 'maxsize', 'timeout'):
+            self.config.remove_option('bazaar', 'pool.%s' % param)
+
+
+    def testPoolConfig(self):
+        """Test connection pool configuration"""
+        self.assert_(isinstance(self.bazaar.motor, bazaar.motor.PooledMotor))
+        self.assertEqual(self.bazaar.pool,
+            {'minsize': 1, 'maxsize': 2, 'timeout': 0.5})
+        self.assertEqual(self.bazaar.motor.pool.size, 1)
+
+
+    def testThreadConnections(self):
+        """Test connection checkout per thread"""
+        conns = []
+        def run():
+            conns.append(self.bazaar.motor.conn)
+            self.bazaar.motor.conn.cursor().execute('select 1')
+            # keep connection checked out until main thread checks it
+            event.wait()
+            self.bazaar.rollback()
+
+        event = threading.Event()
+        thread = threading.Thread(target = run)
+        thread.start()
+
+        conn = self.bazaar.motor.conn
+        while not conns:
+            thread.join(0.01)
+        self.assert_(conn is not conns[0],
+            'threads should use different connections')
+
+        # current thread uses the same connection until end of transaction
+        self.assert_(conn is self.bazaar.motor.conn)
+
+        # pool is exhausted
+        self.assertEqual(self.bazaar.motor.pool.size, 2)
+        self.assertRaises(bazaar.exc.ConnectionPoolError,
+            self.bazaar.motor.pool.checkout)
+
+        event.set()
+        thread.join()
+
+        # connection of finished transaction is reused
+        self.bazaar.rollback()
+        self.assert_(self.bazaar.motor.conn in conns + [conn])
+
+
+    def testReaderRelease(self):
+        """Test returning connection of reading thread to the pool"""
+        pool = self.bazaar.motor.pool
+        def run():
+            list(self.bazaar.getObjects(bazaar.test.app.Article))
+            self.bazaar.release()
+
+        # more reading threads than pool connections
+        for i in range(pool.maxsize + 1):
+            thread = threading.Thread(target = run)
+            thread.start()
+            thread.join()
+
+        self.assertEqual(len(pool.free), pool.size)
+        # connection is checked out without waiting
+        pool.checkin(pool.checkout())
+
+
+    def testFailedCommit(self):
+        """Test discarding connection of failed transaction"""
+        motor = self.bazaar.motor
+        pool = motor.pool
+        dbmod = self.bazaar.dbmod
+
+        class FailingConn(object):
+            def __init__(self, conn):
+                self.conn = conn
+                self.closed = False
+
+            def commit(self):
+                raise dbmod.Error('commit failed')
+
+            def close(self):
+                self.closed = True
+                self.conn.close()
+
+        conn = motor.local.conn = FailingConn(pool.checkout())
+        self.assertRaises(dbmod.Error, self.bazaar.commit)
+
+        # connection is closed and not returned to the pool
+        self.assert_(conn.closed)
+        self.assertEqual(pool.size, 0)
+        self.assertEqual(pool.free, [])
+        self.assertEqual(motor.local.conn, None)
+
+        # new connection is checked out on next database access
+        motor.conn.cursor().execute('select 1')
+        self.bazaar.rollback()
+        self.assertEqual(pool.size, 1)
+
+
+    def testPoolClosing(self):
+        """Test closing connection pool more than once"""
+        self.bazaar.closeDBConn()
+        self.assertEqual(self.bazaar.motor.pool, None)
+        self.bazaar.closeDBConn()
+
+
+    def testIdleReaping(self):
+        """Test closing of idle pool connections"""
+        pool = self.bazaar.motor.pool
+        c1 = pool.checkout()
+        c2 = pool.checkout()
+        self.assertEqual(pool.size, 2)
+
+        pool.idle = -1
+        pool.checkin(c1)
+        pool.checkin(c2)
+        # minimal amount of connections is kept
+        self.assertEqual(pool.size, 1)
+        self.assertEqual(len(pool.free), 1)
+
+
+
 if __name__ == '__main__':
     bazaar.test.main()
@@ -20,9 +20,15 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 #
 
+import marshal
+import os
+import tempfile
+import threading
 from decimal import Decimal
 
+import bazaar.config
 import bazaar.core
+import bazaar.exc
 
 import bazaar.test.app
 import bazaar.test.bzr
@@ -101,6 +107,221 @@ class ObjectLoadTestCase(bazaar.test.bzr.TestCase):
             self.checkObjects(cls, len(self.bazaar.brokers[cls].cache))
 
 
+    def testObjectReloadInPlace(self):
+        """Test application objects reloading in place"""
+        items = list(self.bazaar.getObjects(bazaar.test.app.OrderItem))
+        orders = list(self.bazaar.getObjects(bazaar.test.app.Order))
+        data = dict([(o, set(o.items)) for o in orders])
+
+        # move item to order without item at the same position
+        item, order = [(i, o) for i in items for o in orders
+            if o is not i.order and i.pos not in [j.pos for j in data[o]]][0]
+
+        dbc = self.bazaar.motor.conn.cursor()
+        dbc.execute('update order_item set quantity = quantity * 2')
+        dbc.execute('update order_item set order_fkey = %s where uuid = %s',
+            (order.uuid, item.uuid))
+
+        old = item.order
+        reloaded = list(self.bazaar.reloadObjects(bazaar.test.app.OrderItem,
+            refresh = True))
+
+        # objects are updated in place
+        self.assertEqual(set(reloaded), set(items))
+        self.assert_(item.order is order)
+        self.checkObjects(bazaar.test.app.OrderItem, len(items))
+
+        # association data are updated only for changed foreign key
+        data[old].remove(item)
+        data[order].add(item)
+        for o in orders:
+            self.assertEqual(set(o.items), data[o])
+
+        self.bazaar.rollback()
+
+
+    def testObjectRefresh(self):
+        """Test application objects incremental refresh"""
+        self.config.add_section('bazaar.cls')
+        self.config.set('bazaar.cls', 'bazaar.test.app.Order.marker',
+            'created')
+
+        self.bazaar.setConfig(bazaar.config.CPConfig(self.config))
+        self.bazaar.connectDB()
+        self.config.remove_section('bazaar.cls')
+
+        try:
+            self.bazaar.add(bazaar.test.app.Order(no = 4000, finished = False))
+            orders = dict([(order.no, order)
+                for order in self.bazaar.getObjects(bazaar.test.app.Order)])
+            no1, no2 = min(orders), 4000
+
+            dbc = self.bazaar.motor.conn.cursor()
+            dbc.execute('update "order" set finished = not finished,' \
+                ' created = now() + interval \'1 day\' where no = %s', (no1, ))
+            dbc.execute('delete from "order" where no = %s', (no2, ))
+
+            updated, added, removed = self.bazaar.refreshObjects(
+                bazaar.test.app.Order)
+
+            # changed object is updated in place
+            self.assertEqual(updated, [orders[no1]])
+            self.assertEqual(added, [])
+            self.assertEqual(removed, [orders[no2]])
+            self.assert_(orders[no2].uuid is None)
+
+            self.checkObjects(bazaar.test.app.Order,
+                len(self.bazaar.brokers[bazaar.test.app.Order].cache))
+
+            # nothing changed since last refresh
+            self.assertEqual(self.bazaar.refreshObjects(bazaar.test.app.Order),
+                ([], [], []))
+
+            self.bazaar.rollback()
+        finally:
+            # restore default conf to process in the rest of tests
+            bazaar.test.app.Order.marker = None
+
+
+    def testSnapshot(self):
+        """Test saving and loading cache snapshot"""
+        self.config.add_section('bazaar.cls')
+        self.config.set('bazaar.cls', 'bazaar.test.app.Order.marker',
+            'created')
+
+        self.bazaar.setConfig(bazaar.config.CPConfig(self.config))
+        self.bazaar.connectDB()
+        self.config.remove_section('bazaar.cls')
+
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            orders = list(self.bazaar.getObjects(bazaar.test.app.Order))
+            items = dict([(order.uuid, set([oi.uuid for oi in order.items]))
+                for order in orders])
+            self.assertEqual(self.bazaar.saveSnapshot(path),
+                [bazaar.test.app.Order])
+
+            # objects are restored from fresh snapshot
+            self.assertEqual(self.bazaar.loadSnapshot(path),
+                [bazaar.test.app.Order])
+            self.checkObjects(bazaar.test.app.Order, len(orders))
+            self.assert_(not self.bazaar.brokers[
+                bazaar.test.app.Order].reload)
+
+            # association data of restored objects are reloaded
+            for order in self.bazaar.getObjects(bazaar.test.app.Order):
+                self.assertEqual(set([oi.uuid for oi in order.items]),
+                    items[order.uuid])
+
+            # stale snapshot is ignored
+            dbc = self.bazaar.motor.conn.cursor()
+            dbc.execute('update "order" set created = now()' \
+                ' + interval \'1 day\' where no = %s', (orders[0].no, ))
+            self.assertEqual(self.bazaar.loadSnapshot(path), [])
+            self.assert_(self.bazaar.brokers[bazaar.test.app.Order].reload)
+            self.checkObjects(bazaar.test.app.Order, len(orders))
+            self.bazaar.rollback()
+
+            # snapshot with values of unknown types is ignored
+            f = open(path, 'wb')
+            marshal.dump((bazaar.core.SNAPSHOT_VERSION,
+                {'bazaar.test.app.Order': ('order',
+                    bazaar.test.app.Order.getMapping().load_cols,
+                    ('object', ('os', 'system')), [])}, {}), f)
+            f.close()
+            self.assertEqual(self.bazaar.loadSnapshot(path), [])
+
+            # file, which is not snapshot, is ignored
+            f = open(path, 'wb')
+            f.write('not a snapshot')
+            f.close()
+            self.assertEqual(self.bazaar.loadSnapshot(path), [])
+        finally:
+            os.remove(path)
+            # restore default conf to process in the rest of tests
+            bazaar.test.app.Order.marker = None
+
+
+
+    def testObjectMultiGetting(self):
+        """Test getting many objects at once"""
+        articles = list(self.bazaar.getObjects(bazaar.test.app.Article))[:3]
+        keys = [art.uuid for art in articles]
+        keys.reverse()
+        articles.reverse()
+
+        self.assertEqual(self.bazaar.getMany(bazaar.test.app.Article, keys),
+            articles)
+
+        keys.insert(1, 'no such key')
+        self.assertEqual(self.bazaar.getMany(bazaar.test.app.Article, keys),
+            articles[:1] + [None] + articles[1:])
+        self.assertEqual(self.bazaar.getMany(bazaar.test.app.Article, keys,
+            missing = 'skip'), articles)
+
+        try:
+            self.bazaar.getMany(bazaar.test.app.Article, keys,
+                missing = 'error')
+            self.fail('objects not found exception expected')
+        except bazaar.exc.ObjectNotFoundError, ex:
+            self.assertEqual(ex.keys, ['no such key'])
+
+
+    def testObjectStreaming(self):
+        """Test application objects and association data streaming"""
+        cls = bazaar.test.app.OrderItem
+        col = bazaar.test.app.Employee.orders.col
+        try:
+            cls.stream = col.stream = True
+            cls.arraysize = col.arraysize = 3
+
+            objects = list(self.bazaar.reloadObjects(cls, True))
+            self.checkObjects(cls, len(objects))
+
+            bazaar.test.app.Employee.orders.reloadData()
+            self.checkEmpAsc()
+
+            # force keyset pagination
+            self.bazaar.motor.server_cursors = False
+            objects = list(self.bazaar.reloadObjects(cls, True))
+            self.checkObjects(cls, len(objects))
+
+            bazaar.test.app.Employee.orders.reloadData()
+            self.checkEmpAsc()
+        finally:
+            cls.stream = col.stream = False
+            cls.arraysize = col.arraysize = None
+
+
+    def testObjectIterating(self):
+        """Test iterating over objects loaded page by page"""
+        cls = bazaar.test.app.OrderItem
+        cache = self.getCache(cls)
+
+        objects = list(self.bazaar.iterObjects(cls, arraysize = 3))
+        self.assertEqual(len(cache), 0)
+        for obj in objects:
+            self.assert_('__dirty__' not in obj.__dict__,
+                'modifications of not cached object are tracked')
+
+        keys = [obj.uuid for obj in objects]
+        self.assertEqual(len(set(keys)), len(keys))
+        self.checkObjects(cls, len(objects))
+
+        # cached objects are returned
+        cached = list(self.bazaar.getObjects(cls))
+        objects = list(self.bazaar.iterObjects(cls, arraysize = 3))
+        self.assertEqual(set(objects), set(cached))
+
+        self.bazaar.reloadObjects(bazaar.test.app.Article)
+        objects = list(self.bazaar.iterObjects(bazaar.test.app.Article,
+            arraysize = 2, cached = True))
+        for obj in objects:
+            self.assertEqual(self.getCache(bazaar.test.app.Article)[obj.uuid],
+                obj)
+
+
 
 class CreateObjectTestCase(bazaar.test.bzr.TestCase):
     """
@@ -217,6 +438,59 @@ class ModifyObjectTestCase(bazaar.test.bzr.TestCase):
 
 
 
+    def testObjectBulkAdding(self):
+        """Test adding many objects into database at once"""
+        for cls in self.cls_list:
+            list(self.bazaar.getObjects(cls))
+
+        article = bazaar.test.app.Article(name = 'bulk apple',
+            price = Decimal('1.23'))
+        order = bazaar.test.app.Order(no = 2000, finished = False)
+
+        items = []
+        for i in range(10):
+            oi = bazaar.test.app.OrderItem(pos = i, quantity = Decimal(i))
+            oi.article = article
+            oi.order = order
+            items.append(oi)
+
+        # referenced objects are added after order items
+        self.bazaar.addMany(items + [article, order], batchsize = 3)
+
+        for obj in items + [article, order]:
+            self.assert_(obj.uuid is not None, 'object has no primary key')
+            self.assertEqual(self.getCache(obj.__class__)[obj.uuid], obj,
+                'cache object mismatch')
+
+        for oi in items:
+            self.assertEqual(oi.article_fkey, article.uuid)
+            self.assertEqual(oi.order_fkey, order.uuid)
+            self.checkObjects(bazaar.test.app.OrderItem, key = oi.uuid)
+        self.checkObjects(bazaar.test.app.Article, key = article.uuid)
+        self.checkObjects(bazaar.test.app.Order, key = order.uuid)
+
+        # primary key values set by application are kept
+        convertor = self.bazaar.brokers[bazaar.test.app.Article].convertor
+        article = bazaar.test.app.Article(name = 'bulk pear',
+            price = Decimal('1.23'))
+        key = article.uuid = convertor.getId()
+        self.bazaar.addMany([article])
+        self.assertEqual(article.uuid, key)
+        self.checkObjects(bazaar.test.app.Article, key = key)
+
+        # primary key values are not assigned if insertion fails
+        duplicate = bazaar.test.app.Article(name = 'bulk duplicate',
+            price = Decimal('1.23'))
+        duplicate.uuid = key
+        article = bazaar.test.app.Article(name = 'bulk plum',
+            price = Decimal('1.23'))
+        self.assertRaises(self.bazaar.dbmod.Error, self.bazaar.addMany,
+            [duplicate, article])
+        self.assertEqual(duplicate.uuid, key)
+        self.assertEqual(article.uuid, None)
+        self.bazaar.rollback()
+
+
     def testObjectUpdating(self):
         """Test updating objects in database"""
 
@@ -247,6 +521,150 @@ class ModifyObjectTestCase(bazaar.test.bzr.TestCase):
         self.checkObjects(bazaar.test.app.EmployeeAlt, key = emp.__key__)
         
 
+    def testObjectModificationTracking(self):
+        """Test updating only modified objects' columns"""
+        convertor = self.bazaar.brokers[bazaar.test.app.Article].convertor
+
+        article = list(self.bazaar.getObjects(bazaar.test.app.Article))[0]
+        self.assertEqual(article.__dirty__, set())
+        self.assertEqual(convertor.getChanged(article), ())
+
+        # not modified object is not updated
+        self.assert_(not convertor.update(article))
+
+        article.price = Decimal('3.21')
+        self.assertEqual(convertor.getChanged(article), ('price', ))
+        self.assert_(convertor.update(article))
+        self.assertEqual(article.__dirty__, set())
+        self.checkObjects(bazaar.test.app.Article, key = article.uuid)
+
+        # foreign key column is modified with association
+        order_item = list(self.bazaar.getObjects(bazaar.test.app.OrderItem))[0]
+        order_item.article = article
+        self.assertEqual(self.bazaar.brokers[bazaar.test.app.OrderItem] \
+            .convertor.getChanged(order_item), ('article_fkey', ))
+
+        # modifications of new object are not tracked
+        article = bazaar.test.app.Article(name = 'new', price = 1)
+        self.assertEqual(convertor.getChanged(article),
+            tuple(convertor.save_cols))
+        self.bazaar.add(article)
+        self.assertEqual(convertor.getChanged(article), ())
+
+
+    def testObjectNotTracked(self):
+        """Test updating objects of class without modification tracking"""
+        cls = bazaar.test.app.Article
+        convertor = self.bazaar.brokers[cls].convertor
+        article = list(self.bazaar.getObjects(cls))[0]
+
+        cls.setTracked(False)
+        try:
+            # plain attribute assignment is used
+            self.assert_(cls.__setattr__ is object.__setattr__)
+
+            article.price = Decimal('3.21')
+            self.assertEqual(convertor.getChanged(article),
+                tuple(convertor.save_cols))
+            self.assert_(convertor.update(article))
+            self.assertEqual(article.__dirty__, None)
+            self.checkObjects(cls, key = article.uuid)
+            self.assertEqual(self.bazaar.flushDirty()[0], 0)
+        finally:
+            cls.setTracked(True)
+            self.bazaar.rollback()
+
+
+    def testObjectBulkUpdating(self):
+        """Test updating many objects in database at once"""
+        items = list(self.bazaar.getObjects(bazaar.test.app.OrderItem))[:10]
+        for oi in items:
+            oi.quantity = Decimal('7.5')
+        self.bazaar.updateMany(items, batchsize = 3)
+        for oi in items:
+            self.checkObjects(bazaar.test.app.OrderItem, key = oi.uuid)
+
+
+    def testObjectDirtyFlushing(self):
+        """Test updating all modified objects in database"""
+        broker = self.bazaar.brokers[bazaar.test.app.OrderItem]
+        items = list(self.bazaar.getObjects(bazaar.test.app.OrderItem))[:5]
+        article, other = list(self.bazaar.getObjects(
+            bazaar.test.app.Article))[:2]
+        self.assertEqual(set(broker.modified), set())
+
+        for oi in items:
+            oi.quantity = Decimal('9.5')
+        article.price = Decimal('2.5')
+        self.assertEqual(set(broker.modified), set(items))
+
+        # object modified only in attribute not stored in relation is
+        # checked and skipped
+        other.note = 'not stored'
+
+        self.assertEqual(self.bazaar.flushDirty(), (6, 1))
+        self.assertEqual(set(broker.modified), set())
+
+        for oi in items:
+            self.checkObjects(bazaar.test.app.OrderItem, key = oi.uuid)
+        self.checkObjects(bazaar.test.app.Article, key = article.uuid)
+
+        # nothing to update
+        self.assertEqual(self.bazaar.flushDirty(), (0, 0))
+
+
+    def testObjectDirtyTrackingInstances(self):
+        """Test tracking modified objects per Bazaar ORM layer instance"""
+        article = list(self.bazaar.getObjects(bazaar.test.app.Article))[0]
+
+        # second instance does not take over tracking of the first one
+        bzr = bazaar.core.Bazaar(self.cls_list,
+            bazaar.config.CPConfig(self.config))
+        bzr.connectDB()
+        try:
+            other = list(bzr.getObjects(bazaar.test.app.Article))[0]
+
+            article.price = Decimal('4.5')
+            b1 = self.bazaar.brokers[bazaar.test.app.Article]
+            b2 = bzr.brokers[bazaar.test.app.Article]
+            self.assertEqual(set(b1.modified), set([article]))
+            self.assertEqual(set(b2.modified), set())
+
+            other.price = Decimal('5.5')
+            self.assertEqual(set(b1.modified), set([article]))
+            self.assertEqual(set(b2.modified), set([other]))
+
+            bzr.rollback()
+        finally:
+            bzr.closeDBConn()
+
+        self.assertEqual(self.bazaar.flushDirty()[0], 1)
+        self.checkObjects(bazaar.test.app.Article, key = article.uuid)
+
+
+    def testObjectBulkDeleting(self):
+        """Test deleting many objects from database at once"""
+        for cls in self.cls_list:
+            list(self.bazaar.getObjects(cls))
+
+        order = [ord for ord in self.bazaar.getObjects(bazaar.test.app.Order)
+            if len(ord.items) > 3][0]
+        items = list(order.items)
+        keys = [oi.uuid for oi in items]
+
+        self.bazaar.deleteMany(items, batchsize = 2)
+
+        cache = self.getCache(bazaar.test.app.OrderItem)
+        for key, oi in zip(keys, items):
+            self.assert_(key not in cache,
+                'order item found in cache <- error, it is deleted')
+            self.assertEqual(oi.uuid, None)
+
+        # association data are updated, too
+        self.assertEqual(len(order.items), 0)
+        self.checkOrdAsc()
+
+
     def testObjectDeleting(self):
         """Test deleting objects from database"""
 
@@ -312,5 +730,131 @@ class TransactionsTestCase(bazaar.test.bzr.TestCase):
 
 
 
+class DeferredModificationTestCase(bazaar.test.bzr.TestCase):
+    """
+    Test deferring database modifications until flush.
+    """
+    def setUp(self):
+        """
+        Reinitialize Bazaar ORM layer to defer database modifications.
+        """
+        super(DeferredModificationTestCase, self).setUp()
+        self.bazaar.closeDBConn()
+        self.bazaar.deferred = True
+        self.bazaar.init()
+        self.bazaar.connectDB()
+
+
+    def testClassSorting(self):
+        """Test sorting classes by foreign key dependencies"""
+        order = bazaar.core.sortClasses(self.cls_list)
+        self.assertEqual(len(order), len(self.cls_list))
+        self.assert_(order.index(bazaar.test.app.Article)
+            < order.index(bazaar.test.app.OrderItem))
+        self.assert_(order.index(bazaar.test.app.Order)
+            < order.index(bazaar.test.app.OrderItem))
+
+
+    def testDeferredAdding(self):
+        """Test deferred adding of objects"""
+        for cls in self.cls_list:
+            list(self.bazaar.getObjects(cls))
+
+        article = bazaar.test.app.Article(name = 'deferred apple',
+            price = Decimal('1.23'))
+        order = bazaar.test.app.Order(no = 3000, finished = False)
+        self.bazaar.add(order)
+
+        # order items are added with association update before referenced
+        # article is added
+        for i in range(5):
+            oi = bazaar.test.app.OrderItem(pos = i, quantity = Decimal(i))
+            oi.article = article
+            order.items.append(oi)
+        order.items.update()
+        self.bazaar.add(article)
+
+        self.assert_(order.uuid is not None, 'object has no primary key')
+        self.assertEqual(self.getCache(bazaar.test.app.Order)[order.uuid],
+            order, 'cache object mismatch')
+
+        self.bazaar.flush()
+
+        self.checkObjects(bazaar.test.app.Order, key = order.uuid)
+        self.checkObjects(bazaar.test.app.Article, key = article.uuid)
+        for oi in order.items:
+            self.checkObjects(bazaar.test.app.OrderItem, key = oi.uuid)
+        self.checkOrdAsc()
+
+
+    def testDeferredUpdating(self):
+        """Test deferred updating of objects"""
+        items = list(self.bazaar.getObjects(bazaar.test.app.OrderItem))[:10]
+        for oi in items:
+            oi.quantity = Decimal('8.5')
+            self.bazaar.update(oi)
+
+        self.bazaar.flush()
+        for oi in items:
+            self.assertEqual(oi.__dirty__, set())
+            self.checkObjects(bazaar.test.app.OrderItem, key = oi.uuid)
+
+
+    def testDeferredDeleting(self):
+        """Test deferred deleting of objects"""
+        for cls in self.cls_list:
+            list(self.bazaar.getObjects(cls))
+
+        order = [ord for ord in self.bazaar.getObjects(bazaar.test.app.Order)
+            if len(ord.items) > 3][0]
+        items = list(order.items)
+        for oi in items:
+            self.bazaar.delete(oi)
+            self.assert_(oi.uuid is not None, 'object deleted before flush')
+
+        self.bazaar.flush()
+        for oi in items:
+            self.assertEqual(oi.uuid, None)
+        self.assertEqual(len(order.items), 0)
+        self.checkOrdAsc()
+
+
+    def testDeferredRollback(self):
+        """Test discarding deferred modifications on rollback"""
+        article = bazaar.test.app.Article(name = 'rollback apple',
+            price = Decimal('1.23'))
+        self.bazaar.add(article)
+        key = article.uuid
+
+        self.bazaar.rollback()
+        self.assertEqual(article.uuid, None)
+        self.assert_(key not in self.getCache(bazaar.test.app.Article),
+            'article found in cache <- error, its addition is discarded')
+
+
+    def testThreadRollback(self):
+        """Test discarding deferred modifications of one thread"""
+        article = bazaar.test.app.Article(name = 'thread apple',
+            price = Decimal('1.23'))
+        self.bazaar.add(article)
+        key = article.uuid
+
+        def rollback():
+            self.bazaar.rollback()
+
+        t = threading.Thread(target = rollback)
+        t.start()
+        t.join()
+
+        # modifications of other thread are not discarded
+        self.assertEqual(article.uuid, key)
+        self.assert_(key in self.getCache(bazaar.test.app.Article),
+            'article not found in cache')
+
+        self.bazaar.flush()
+        self.checkObjects(bazaar.test.app.Article, key = key)
+
+
+
 if __name__ == '__main__':
     bazaar.test.main()
@@ -20,6 +20,9 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 #
 
+import bazaar.config
+from bazaar.query import Attr
+
 import bazaar.test.app
 import bazaar.test.bzr
 
@@ -138,5 +141,135 @@ class FindTestCase(bazaar.test.bzr.TestCase):
 
 
 
+    def testFullRowFind(self):
+        """Test searching with loading of relation rows"""
+        self.config.add_section('bazaar.cls')
+        self.config.set('bazaar.cls', 'bazaar.test.app.OrderItem.cache',
+            'bazaar.cache.LazyObject')
+        self.bazaar.setConfig(bazaar.config.CPConfig(self.config))
+        self.bazaar.connectDB()
+        self.config.remove_section('bazaar.cls')
+
+        query = 'select uuid from order_item where quantity > %(quantity)s'
+        ois = list(self.bazaar.find(bazaar.test.app.OrderItem, query,
+            {'quantity': 5}, full = True))
+        keys = [oi.uuid for oi in ois]
+        keys.sort()
+
+        dbc = self.bazaar.motor.conn.cursor()
+        dbc.execute(query, {'quantity': 5})
+        dbkeys = [row[0] for row in dbc.fetchall()]
+        dbkeys.sort()
+        self.assertEqual(keys, dbkeys)
+
+        # objects existing in cache are reused
+        found = list(self.bazaar.find(bazaar.test.app.OrderItem,
+            {'pos': ois[0].pos, 'order': ois[0].order}, full = True))
+        self.assert_(ois[0] in found, 'cached object is not reused')
+
+        for oi in ois:
+            self.checkObjects(bazaar.test.app.OrderItem, key = oi.uuid)
+
+
+    def testSelect(self):
+        """Test searching with query expressions"""
+        cls = bazaar.test.app.OrderItem
+        dbc = self.bazaar.motor.conn.cursor()
+
+        ois = list(self.bazaar.select(cls, (Attr('quantity') > 5)
+            & Attr('article.name').like('art 0%'),
+            order = [Attr('pos').desc(), Attr('uuid')]))
+        dbc.execute('select OI.uuid from order_item OI'
+            ' left outer join article A on OI.article_fkey = A.uuid'
+            ' where OI.quantity > 5 and A.name like \'art 0%%\''
+            ' order by OI.pos desc, OI.uuid asc')
+        self.assertEqual([oi.uuid for oi in ois],
+            [row[0] for row in dbc.fetchall()])
+
+        # query is compiled once per its shape
+        queries = self.bazaar.motor.queries
+        misses = queries.misses
+        ois = list(self.bazaar.select(cls, Attr('quantity').between(1, 3)
+            | (Attr('pos') == None), limit = 2, offset = 1))
+        list(self.bazaar.select(cls, Attr('quantity').between(4, 6)
+            | (Attr('pos') == None), limit = 3, offset = 2))
+        self.assertEqual(queries.misses, misses + 1)
+        self.assert_(len(ois) <= 2)
+
+        order = list(self.bazaar.getObjects(bazaar.test.app.Order))[0]
+        ois = list(self.bazaar.select(cls, (Attr('order') == order)
+            & ~Attr('pos').in_([-1, -2])))
+        self.assertEqual(len(ois), len(order.items))
+        self.assertEqual(list(self.bazaar.select(cls, Attr('pos').in_([]))),
+            [])
+
+        self.assertRaises(ValueError, list, self.bazaar.select(cls,
+            Attr('order.items') == 1))
+        self.assertRaises(ValueError, list, self.bazaar.select(cls,
+            Attr('pos.name') == 1))
+
+
+    def testQueryCache(self):
+        """Test caching of translated find queries"""
+        queries = self.bazaar.motor.queries
+        queries.clear()
+
+        list(self.bazaar.find(bazaar.test.app.Article, {'name': 'art 00'}))
+        self.assertEqual((queries.hits, queries.misses), (0, 1))
+        list(self.bazaar.find(bazaar.test.app.Article, {'name': 'art 01'}))
+        self.assertEqual((queries.hits, queries.misses), (1, 1))
+
+        # the same keys of dictionary query, but different class
+        list(self.bazaar.find(bazaar.test.app.Employee, {'name': 'x'}))
+        self.assertEqual((queries.hits, queries.misses), (1, 2))
+
+        query = 'select uuid from article where name = %(name)s'
+        list(self.bazaar.find(bazaar.test.app.Article, query, {'name': 'a'}))
+        list(self.bazaar.find(bazaar.test.app.Article, query, {'name': 'b'}))
+        self.assertEqual((queries.hits, queries.misses), (2, 3))
+
+        # least recently used queries are removed from cache
+        queries.size = 2
+        list(self.bazaar.find(bazaar.test.app.Article, {'name': 'art 00'}))
+        list(self.bazaar.find(bazaar.test.app.Article, {'price': 1}))
+        self.assertEqual(len(queries), 2)
+        list(self.bazaar.find(bazaar.test.app.Article, query, {'name': 'a'}))
+        self.assertEqual((queries.hits, queries.misses), (3, 5))
+
+
+    def testAggregates(self):
+        """Test counting objects and aggregate functions"""
+        cls = bazaar.test.app.OrderItem
+        dbc = self.bazaar.motor.conn.cursor()
+        dbc.execute('select count(*) from order_item')
+        self.assertEqual(self.bazaar.count(cls), dbc.fetchone()[0])
+
+        order = list(self.bazaar.getObjects(bazaar.test.app.Order))[0]
+        self.assertEqual(self.bazaar.count(cls, {'order': order}),
+            len(order.items))
+
+        self.assert_(self.bazaar.exists(cls, {'order': order}))
+        self.assert_(not self.bazaar.exists(cls, {'pos': -1}))
+
+        dbc.execute('select sum(quantity), min(pos), max(pos)'
+            ' from order_item where order_fkey = %s', [order.uuid])
+        total, pos_min, pos_max = dbc.fetchone()
+        self.assertEqual(self.bazaar.sum(cls, 'quantity', {'order': order}),
+            total)
+        self.assertEqual(self.bazaar.min(cls, 'pos', {'order': order}),
+            pos_min)
+        self.assertEqual(self.bazaar.max(cls, 'pos', {'order': order}),
+            pos_max)
+        self.assertEqual(self.bazaar.avg(cls, 'pos', {'pos': -1}), None)
+
+        self.assertRaises(ValueError, self.bazaar.aggregate, cls,
+            'median', 'pos')
+        self.assertRaises(ValueError, self.bazaar.sum,
+            bazaar.test.app.Order, 'items')
+        self.assertRaises(ValueError, self.bazaar.count, cls,
+            'select uuid from order_item')
+
+
+
 if __name__ == '__main__':
     bazaar.test.main()
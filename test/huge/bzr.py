@@ -37,6 +37,8 @@ opt_parser.add_option('-c', dest = 'commit', action = 'store_true', \
             help = 'commit instead of rollback')
 opt_parser.add_option('-o', dest = 'opers', default = 'add, load, update, delete', \
             help = 'operation to run')
+opt_parser.add_option('-b', dest = 'bulk', action = 'store_true', \
+            help = 'use bulk operations')
 (options, args) = opt_parser.parse_args()
 
 if len(sys.argv) < 3:
@@ -69,6 +71,7 @@ def go(opers):
         # add
         ts = time.time()
         pos = 0
+        objects = []
         for i in range(options.amount):
             obj = OrderItem()
             obj.order = ord
@@ -76,7 +79,12 @@ def go(opers):
             obj.quantity = 10
             pos += 1
             obj.pos = pos
-            bzr.add(obj)
+            if options.bulk:
+                objects.append(obj)
+            else:
+                bzr.add(obj)
+        if options.bulk:
+            bzr.addMany(objects)
         te = time.time()
         print 'add: %0.2f' % (te - ts)
 
@@ -90,16 +98,22 @@ def go(opers):
     if 'update' in opers:
         # update
         ts = time.time()
-        for obj in obj_list:
-            bzr.update(obj)
+        if options.bulk:
+            bzr.updateMany(obj_list)
+        else:
+            for obj in obj_list:
+                bzr.update(obj)
         te = time.time()
         print 'update: %0.2f' % (te - ts)
 
     if 'delete' in opers:
         # del
         ts = time.time()
-        for obj in obj_list:
-            bzr.delete(obj)
+        if options.bulk:
+            bzr.deleteMany(obj_list)
+        else:
+            for obj in obj_list:
+                bzr.delete(obj)
         te = time.time()
         print 'del: %0.2f' % (te - ts)
 
@@ -0,0 +1,104 @@
+#!/usr/bin/python
+#
+# $Id$
+#
+# Bazaar - an easy to use and powerful abstraction layer between relational
+# database and object oriented application.
+#
+# Copyright (C) 2000-2005 by Artur Wroblewski <wrobell@pld-linux.org>
+# 
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+# 
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# 
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+"""
+Measure speed of application objects creation from relation rows.
+
+Order item relation rows are fetched from database once. Then objects are
+created with object constructor and attribute setting loop (the old way)
+and with loader function generated for application class.
+
+The old constructor and attribute setting did not track modifications, so
+the baseline sets attributes with C{object.__setattr__} and is comparable
+with loader creating not tracked objects.
+
+Usage::
+
+    python -O load.py psycopg "dbname = ord port = 5433" 1000000
+"""
+
+import sys
+import time
+
+import bazaar.core
+
+import bazaar.test.app
+
+Order     = bazaar.test.app.Order
+OrderItem = bazaar.test.app.OrderItem
+Article   = bazaar.test.app.Article
+Employee  = bazaar.test.app.Employee
+
+mod = __import__(sys.argv[1])
+dsn = sys.argv[2]
+amount = int(sys.argv[3])
+
+bzr = bazaar.core.Bazaar((Order, OrderItem, Article, Employee),
+    dbmod = mod, dsn = dsn,
+    seqpattern = 'select nextval(\'%s\')')
+
+convertor = bzr.brokers[OrderItem].convertor
+
+# create order items if there is not enough of them
+count = bzr.count(OrderItem)
+if count < amount:
+    art = Article(name = 'load apple', price = 2.22)
+    bzr.add(art)
+    ord = Order(no = -1, finished = False)
+    bzr.add(ord)
+    bzr.addMany([OrderItem(order = ord, article = art, quantity = 10,
+        pos = i) for i in xrange(amount - count)])
+    bzr.commit()
+
+rows = list(convertor.motor.getData(convertor.queries[convertor.getObjects]))
+rows = rows[:amount]
+
+
+def construct(data):
+    """
+    Create object like the old constructor and attribute setting loop,
+    without modification tracking.
+    """
+    obj = object.__new__(OrderItem)
+    obj.__dict__.update(OrderItem.defaults)
+    for i in range(len(convertor.load_cols)):
+        object.__setattr__(obj, convertor.load_cols[i], data[i])
+    return obj
+
+
+def measure(name, create):
+    ts = time.time()
+    for data in rows:
+        create(data)
+    te = time.time()
+    print '%s: %d rows, %0.2fs, %d rows/s' \
+        % (name, len(rows), te - ts, len(rows) / (te - ts))
+
+
+measure('constructor', construct)
+measure('loader', convertor.createObject)
+measure('loader (not tracked)',
+    lambda data: convertor.createObject(data, False))
+
+bzr.rollback()